@@ -4,18 +4,21 @@ import os
 import logging
 from flask import Flask
 from app.blueprints.main import main
-from app.database import db
+from app.database import db, enable_sqlite_savepoints, enable_incremental_vacuum, upgrade_schema, run_data_migration, backfill_statistics, backfill_numeric_values, backfill_extra_series
+from app.instrumentation import init_instrumentation
+from app.compression import init_compression
+from app.profiling import init_profiling
+from app.health import init_health
+from app.logging_config import configure_logging
+from app.watch_folder import ingest_command
+from app.commands import delete_command, maintain_command
 
 def create_app():
     app = Flask(__name__)
     app.secret_key = 'your_secret_key'
 
-    # Centralized Logging Configuration
-    logging.basicConfig(
-        level=logging.DEBUG,  # Set to DEBUG for detailed logs; change to INFO or WARNING in production
-        format='%(asctime)s %(levelname)s:%(name)s:%(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S'
-    )
+    # Centralized Logging Configuration (LOG_LEVEL, LOG_FILE, ... see app/logging_config.py)
+    configure_logging()
     logger = logging.getLogger(__name__)
     logger.info("Starting Flask application.")
 
@@ -41,15 +44,48 @@ def create_app():
     db_path = db_path.replace('\\', '/')
 
     app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{db_path}'
+    app.config['DEFAULT_DATABASE_PATH'] = db_path
+
+    # Project catalog and per-project shards live next to the default database unless configured
+    db_dir = os.path.dirname(db_path)
+    catalog_path = os.getenv('CATALOG_PATH', os.path.join(db_dir, 'catalog.db')).replace('\\', '/')
+    app.config['SQLALCHEMY_BINDS'] = {'catalog': f'sqlite:///{catalog_path}'}
+    app.config['PROJECTS_PATH'] = os.getenv('PROJECTS_PATH', os.path.join(db_dir, 'projects'))
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
     db.init_app(app)
 
     # Register blueprints
     app.register_blueprint(main)
+    init_profiling(app)  # Opt-in cProfile/stack-sampler capture, see app/profiling.py
+    init_instrumentation(app)  # Server-Timing header and /metrics histograms
+    init_compression(app)  # gzip/br/zstd for large JSON responses, see app/compression.py
+    app.cli.add_command(ingest_command)  # flask ingest <folder>, see app/watch_folder.py
+    app.cli.add_command(delete_command)  # flask delete-spreadsheets, see app/commands.py
+    app.cli.add_command(maintain_command)  # flask maintain-db
 
     with app.app_context():
+        enable_sqlite_savepoints(db.engine)  # Uploads commit in groups with a SAVEPOINT per file
+        enable_incremental_vacuum(db.engine)  # New databases give freed pages back, see maintenance.py
         db.create_all()  # Create tables if they don't exist
+        upgrade_schema()  # Add columns introduced since the tables were created
+        try:
+            # Custom columns stored as per-row JSON before extra series existed
+            run_data_migration('extra_series', backfill_extra_series)
+        except Exception as e:
+            db.session.rollback()
+            logger.exception(f"Failed to move extra_data into extra series: {e}")
+        try:
+            backfill_statistics()  # One-off summary of spreadsheets stored before statistics existed
+        except Exception as e:
+            db.session.rollback()
+            logger.exception(f"Failed to backfill spreadsheet statistics: {e}")
+        try:
+            # Instances stored before numeric range filters existed; new ones get it on insert
+            run_data_migration('numeric_values', backfill_numeric_values)
+        except Exception as e:
+            db.session.rollback()
+            logger.exception(f"Failed to backfill numeric instance values: {e}")
             # Integrity Check
         try:
             from sqlalchemy import text
@@ -61,5 +97,8 @@ def create_app():
         except Exception as e:
             logger.exception(f"Failed to perform database integrity check: {e}")
 
+    # Probes the database from a background thread, so only once it has been set up
+    init_health(app)  # /healthz and /readyz for the container healthcheck, see app/health.py
+
     return app
 
@@ -1,22 +1,43 @@
 # app/blueprints/main.py
 
 import logging
-from flask import Blueprint, render_template, request, jsonify, flash, redirect, url_for, current_app, session
+from flask import Blueprint, render_template, request, jsonify, flash, redirect, url_for, current_app, session, stream_with_context, g
 from app.database import (
-    data_extractor,
-    insert_data_to_db,
-    find_instances,
-    insert_instances_to_db,
+    prepare_rows,
+    append_extra_series,
+    rebuild_series,
+    load_spreadsheet_frame,
     get_tables,
     get_instances,
+    list_tables,
+    list_instance_values,
+    list_instances,
+    PAGE_SIZE,
+    MAX_PAGE_SIZE,
+    TABLE_GROUPS,
+    activate_project,
+    create_project,
+    current_project,
+    get_projects,
+    get_project_summaries,
+    project_lockfile,
+    get_instance_ranges,
+    parse_instance_filters,
+    find_instance_ids,
     get_columns,
+    refresh_statistics,
+    parse_predicates,
+    filter_by_statistics,
+    get_statistics,
+    get_statistic_names,
+    get_key_ring,
+    remove_spreadsheets,
     Instance,
     SpreadsheetInstance,
     Spreadsheet,
     SpreadsheetRow,
     db
 )
-from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 from cryptography.hazmat.primitives import hashes, serialization
 from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
 from cryptography.hazmat.primitives.padding import PKCS7
@@ -33,115 +54,130 @@ import hashlib
 
 import numpy as np
 from sqlalchemy import and_, or_
+from app.plotting import (
+    COLORS, resolve_axes, spreadsheet_series, build_spreadsheet_traces, axis_titles, figure_layout, webgl_threshold, as_webgl
+)
+from app.ensemble import clean_series, common_grid, resample, envelopes, ensemble_traces, parse_grid_points, parse_percentiles, parse_x_range
+from app.ingestion import upload_group_size, commit_upload_group, ingest_workbook
+from app.instrumentation import span, record_lock_wait, render_metrics, PLOT_POINTS
 
 
 # Set LOCKFILE_PATH from environment variable with a default value
 LOCKFILE_PATH = os.getenv('LOCKFILE_PATH', '/mnt/irds/lock.lock')  
+# Seconds a request waits for the lock before it is answered with 423
+LOCK_TIMEOUT = float(os.getenv('LOCK_TIMEOUT', 30))
 
-# Set up basic logging configuration if not already configured
-if not logging.getLogger(__name__).hasHandlers():
-    logging.basicConfig(
-        level=logging.DEBUG,
-        format='%(asctime)s %(levelname)s:%(name)s:%(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S'
-    )
 logger = logging.getLogger(__name__)
 
 main = Blueprint('main', __name__)
 
+@main.before_request
+def select_project():
+    """Route the request to the shard of the project named in the request, or remembered in the session."""
+    requested = request.values.get('project')
+    try:
+        activate_project(requested or session.get('project'))
+    except LookupError as e:
+        if requested:
+            return jsonify({'success': False, 'error': str(e)}), 404
+        session.pop('project', None)  # The remembered project no longer exists
+        activate_project(None)
+
+@main.teardown_request
+def persist_rewrapped_keys(exc):
+    """Commit the keys of legacy encrypted spreadsheets that this request re-wrapped while unlocking them.
+
+    Read-only routes (/plot, /view-data) unlock through the same KeyRing, so the
+    commit happens here once for all of them. Runs after a streamed response has
+    been sent in full, since stream_with_context holds the request open until then.
+    """
+    key_ring = g.get('key_ring')
+    if exc is not None or key_ring is None or not key_ring.dirty:
+        return
+    try:
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()  # They are re-wrapped again on the next unlock
+        logger.error(f"Failed to store re-wrapped keys: {e}")
+
 ALLOWED_EXTENSIONS = {'xlsx'}
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def derive_key(password, salt):
-    # Use PBKDF2HMAC to derive a key from the password
-    kdf = PBKDF2HMAC(
-        algorithm=hashes.SHA256(),
-        length=32,  # AES-256 key size
-        salt=salt,
-        iterations=100000,
-    )
-    return kdf.derive(password.encode())
-
-def hash_password(password, salt=None):
-    if not salt:
-        salt = os.urandom(16)
-    pwd_hash = hashlib.pbkdf2_hmac('sha256', password.encode(), salt, 100000)
-    return salt, pwd_hash
-
-def verify_password(stored_salt, stored_hash, password_attempt):
-    pwd_hash = hashlib.pbkdf2_hmac('sha256', password_attempt.encode(), stored_salt, 100000)
-    return pwd_hash == stored_hash
-
-def acquire_lock(timeout=30, max_lock_age=300, check_interval=1):
+def acquire_lock(timeout=LOCK_TIMEOUT, max_lock_age=300, check_interval=1):
     """Attempt to acquire a lock by creating a lockfile.
-       If the lockfile is older than max_lock_age seconds, override it."""
-    os.makedirs(os.path.dirname(LOCKFILE_PATH), exist_ok=True)  # Ensure directory exists
+       If the lockfile is older than max_lock_age seconds, override it.
+       Each project has its own lockfile, see project_lockfile."""
+    lockfile = project_lockfile(LOCKFILE_PATH)
+    os.makedirs(os.path.dirname(lockfile), exist_ok=True)  # Ensure directory exists
     start_time = time.time()
-    logger.debug(f"Attempting to acquire lock. Lockfile path: {LOCKFILE_PATH}")
+    logger.debug("Attempting to acquire lock. Lockfile path: %s", lockfile)
     while True:
         try:
             # Attempt to create the lock file exclusively
-            fd = os.open(LOCKFILE_PATH, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            fd = os.open(lockfile, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
             # Write the current timestamp to the lock file
             with os.fdopen(fd, 'w') as f:
                 f.write(str(time.time()))
             # Lock acquired
-            logger.info(f"Lock acquired successfully. Lockfile created at: {LOCKFILE_PATH}")
+            record_lock_wait(time.time() - start_time, 'acquired')
+            logger.info("Lock acquired successfully. Lockfile created at: %s", lockfile)
             return True
         except FileExistsError:
             # Lock file exists, check its age
             try:
-                lock_age = time.time() - os.path.getmtime(LOCKFILE_PATH)
-                logger.debug(f"Existing lockfile age: {lock_age} seconds.")
+                lock_age = time.time() - os.path.getmtime(lockfile)
+                logger.debug("Existing lockfile age: %.1f seconds.", lock_age)
             except Exception as e:
-                logger.error(f"Error accessing lockfile '{LOCKFILE_PATH}': {e}")
+                logger.error("Error accessing lockfile '%s': %s", lockfile, e)
                 raise
 
             if lock_age > max_lock_age:
                 # Assume the lock is stale and override it
-                logger.warning(f"Stale lock detected. Lockfile is {lock_age} seconds old and will be overridden.")
+                logger.warning("Stale lock detected. Lockfile is %.1f seconds old and will be overridden.", lock_age)
                 try:
-                    os.remove(LOCKFILE_PATH)
-                    logger.info(f"Stale lockfile '{LOCKFILE_PATH}' removed.")
+                    os.remove(lockfile)
+                    logger.info("Stale lockfile '%s' removed.", lockfile)
                 except FileNotFoundError:
-                    logger.warning(f"Lockfile '{LOCKFILE_PATH}' was already removed by another process.")
+                    logger.warning("Lockfile '%s' was already removed by another process.", lockfile)
                     continue  # Another process might have removed it
                 except PermissionError as e:
-                    logger.error(f"Permission denied while removing stale lockfile '{LOCKFILE_PATH}': {e}")
+                    logger.error("Permission denied while removing stale lockfile '%s': %s", lockfile, e)
                     raise
                 except Exception as e:
-                    logger.exception(f"Unexpected error while removing stale lockfile '{LOCKFILE_PATH}': {e}")
+                    logger.exception("Unexpected error while removing stale lockfile '%s': %s", lockfile, e)
                     raise
             else:
                 # Check if timeout has been reached
                 elapsed_time = time.time() - start_time
-                logger.debug(f"Lockfile '{LOCKFILE_PATH}' is currently held. Elapsed time: {elapsed_time} seconds.")
+                logger.debug("Lockfile '%s' is currently held. Elapsed time: %.1f seconds.", lockfile, elapsed_time)
                 if elapsed_time > timeout:
-                    logger.error(f"Failed to acquire lock within {timeout} seconds.")
+                    logger.error("Failed to acquire lock within %s seconds.", timeout)
+                    record_lock_wait(elapsed_time, 'timeout')
                     return False
                 time.sleep(check_interval)
         except PermissionError as e:
-            logger.error(f"Permission denied while creating lockfile '{LOCKFILE_PATH}': {e}")
+            logger.error("Permission denied while creating lockfile '%s': %s", lockfile, e)
             raise  # Re-raise the exception for higher-level handling
         except Exception as e:
-            logger.exception(f"Unexpected error while acquiring lock: {e}")
+            logger.exception("Unexpected error while acquiring lock: %s", e)
             raise  # Re-raise the exception for higher-level handling
 
 def release_lock():
     """Release the lock by deleting the lockfile."""
+    lockfile = project_lockfile(LOCKFILE_PATH)
     try:
-        if os.path.exists(LOCKFILE_PATH):
-            os.remove(LOCKFILE_PATH)
-            logger.info(f"Lock released successfully. Lockfile '{LOCKFILE_PATH}' deleted.")
+        if os.path.exists(lockfile):
+            os.remove(lockfile)
+            logger.info("Lock released successfully. Lockfile '%s' deleted.", lockfile)
         else:
-            logger.warning(f"Attempted to release lock, but lockfile '{LOCKFILE_PATH}' does not exist.")
+            logger.warning("Attempted to release lock, but lockfile '%s' does not exist.", lockfile)
     except PermissionError as e:
-        logger.error(f"Permission denied while deleting lockfile '{LOCKFILE_PATH}': {e}")
+        logger.error("Permission denied while deleting lockfile '%s': %s", lockfile, e)
         raise  # Re-raise the exception for higher-level handling
     except Exception as e:
-        logger.exception(f"Unexpected error while releasing lockfile '{LOCKFILE_PATH}': {e}")
+        logger.exception("Unexpected error while releasing lockfile '%s': %s", lockfile, e)
         raise  # Re-raise the exception for higher-level handling
 
 
@@ -162,7 +198,9 @@ def upload_file():
     try:
         password = request.form.get('encrypt_password')
         encrypt_data = bool(password)
+        update_existing = request.form.get('update_existing') in ('true', 'on', '1')
         logger.debug(f"Encryption password provided: {'Yes' if encrypt_data else 'No'}")
+        logger.debug(f"Incremental update of existing spreadsheets: {'Yes' if update_existing else 'No'}")
 
         if 'excel_files' not in request.files:
             logger.error("No 'excel_files' part in the request.")
@@ -177,75 +215,50 @@ def upload_file():
 
         success_files = []
         failed_files = []
+        skipped_files = []
 
-        # Begin a transaction for each file individually
+        # One outer transaction for the batch, a SAVEPOINT per file and a commit every few files
+        group_size = upload_group_size()
+        pending = []  # Files written since the last commit: (spreadsheet, df, seconds)
         for idx, file in enumerate(files, start=1):
-            if allowed_file(file.filename):
-                filename = secure_filename(file.filename)
-                logger.info(f"Processing file {idx}/{len(files)}: {filename}")
-
-                sheet_name = '03 - Shearing'  # Adjust as necessary
-                df = data_extractor(file, sheet_name)
-
-                if df.empty:
-                    logger.warning(f"No valid data extracted from file: {filename}")
-                    failed_files.append({'filename': filename, 'reason': 'No valid data extracted.'})
-                    continue  # Skip to the next file
-
-                name = filename.rsplit('.', 1)[0]
-                logger.debug(f"Spreadsheet name derived: {name}")
-
-                if encrypt_data:
-                    logger.debug("Encryption enabled for this file.")
-                    # Encryption logic here
-                    salt = os.urandom(16)
-                    iv = os.urandom(16)
-                    key = derive_key(password, salt)
-                    password_salt, password_hash = hash_password(password)
-
-                    spreadsheet = Spreadsheet(
-                        spreadsheet_name=name,
-                        public=False,
-                        encrypted=True,
-                        key_salt=salt,
-                        iv=iv,
-                        password_salt=password_salt,
-                        password_hash=password_hash
-                    )
-                    db.session.add(spreadsheet)
-                    db.session.commit()
-                    logger.debug(f"Added Spreadsheet object for {name} to the session.")
-
-                    result = insert_data_to_db(
-                        name, df, spreadsheet=spreadsheet, encrypt=True, encryption_key=key, iv=iv
-                    )
-                else:
-                    logger.debug("Encryption not enabled for this file.")
-                    result = insert_data_to_db(name, df)
-
-                if not result['success']:
-                    logger.error(f"Failed to insert data for file: {filename}. Reason: {result['message']}")
-                    failed_files.append({'filename': filename, 'reason': result['message']})
-                    db.session.rollback()  # Rollback current file's transaction
-                else:
-                    logger.info(f"Successfully inserted data for file: {filename}")
-                    success_files.append(filename)
-
-                # Reset file pointer to read again for instance extraction
-                file.seek(0)
-                instances = find_instances(file)
-                logger.debug(f"Found {len(instances)} instances in file: {filename}")
-
-                if instances:
-                    try:
-                        insert_instances_to_db(name, instances)
-                        logger.info(f"Inserted instances for file: {filename}")
-                    except Exception as e:
-                        logger.error(f"Failed to insert instances for file: {filename}. Reason: {str(e)}")
-                        failed_files.append({'filename': filename, 'reason': 'Failed to insert instances.'})
-                        db.session.rollback()  # Rollback current file's transaction
-
-                db.session.commit()  # Commit after each file
+            if not allowed_file(file.filename):
+                continue
+            filename = secure_filename(file.filename)
+            logger.info(f"Processing file {idx}/{len(files)}: {filename}")
+            name = filename.rsplit('.', 1)[0]
+            logger.debug(f"Spreadsheet name derived: {name}")
+            file_start = time.perf_counter()
+            savepoint = db.session.begin_nested()
+            try:
+                outcome = ingest_workbook(file, name, password, update_existing)
+            except Exception as e:
+                logger.exception(f"Unexpected error while processing file {filename}: {e}")
+                outcome = {'status': 'failed', 'reason': 'An unexpected error occurred.'}
+
+            if outcome['status'] == 'failed':
+                savepoint.rollback()  # Only this file's changes
+                failed_files.append({'filename': filename, 'reason': outcome['reason']})
+                continue
+            savepoint.commit()  # RELEASE SAVEPOINT, the data is committed with its group
+
+            if outcome['status'] == 'skipped':
+                skipped_files.append({'filename': filename, 'duplicate_of': outcome['duplicate_of']})
+                continue
+            if outcome['status'] == 'updated':
+                logger.info(f"Successfully updated data for file: {filename}")
+                success_files.append(f"{filename} ({outcome['message']})")
+            else:
+                logger.info(f"Successfully inserted data for file: {filename}")
+                success_files.append(filename)
+
+            pending.append((outcome['spreadsheet'], outcome['df'], time.perf_counter() - file_start))
+            if group_size and len(pending) >= group_size:
+                commit_upload_group(pending)
+
+        commit_upload_group(pending)
+
+        if skipped_files:
+            success_files += [f"{f['filename']} (already stored as '{f['duplicate_of']}')" for f in skipped_files]
 
         if success_files and not failed_files:
             message = f"All files uploaded and processed successfully: {', '.join(success_files)}."
@@ -277,10 +290,14 @@ def upload_file():
 @main.route('/')
 def home():
     try:
-        # Get all available tables from the database
-        tables = get_tables()
-        instances = get_instances()
+        # Only the first page of each list; the page fetches the rest as it is scrolled
+        public_tables, public_cursor = list_tables(group='public')
+        encrypted_tables, encrypted_cursor = list_tables(group='encrypted')
+        instances, instance_cursors = list_instances()
+        instance_ranges = get_instance_ranges()
         columns = get_columns()
+        statistic_names = get_statistic_names()
+        projects = get_projects()
 
         x_axis_options = [col for col in columns if col != "spreadsheet_id"]
         y_axis_options = [col for col in columns if col not in ["spreadsheet_id", "time_start_of_stage", "id"]]
@@ -292,21 +309,239 @@ def home():
         # logger.debug(f"Y-axis options: {y_axis_options}")
     except Exception as e:
         flash('Unable to connect to the database. Please ensure the NAS is mounted.', 'error')
-        tables = []
-        instances = {}
+        public_tables, public_cursor = [], None
+        encrypted_tables, encrypted_cursor = [], None
+        instances, instance_cursors = {}, {}
+        instance_ranges = {}
         x_axis_options = []
         y_axis_options = []
+        statistic_names = []
+        projects = [current_project()]
         logger.error(f"Error loading home page data: {e}")
-    return render_template('home.html', tables=tables, instances=instances, x_axis_options=x_axis_options, y_axis_options=y_axis_options)
+    return render_template('home.html', public_tables=public_tables, public_cursor=public_cursor,
+                           encrypted_tables=encrypted_tables, encrypted_cursor=encrypted_cursor,
+                           instances=instances, instance_cursors=instance_cursors, instance_ranges=instance_ranges,
+                           x_axis_options=x_axis_options, y_axis_options=y_axis_options,
+                           statistic_names=statistic_names, projects=projects,
+                           current_project=current_project())
+
+
+def select_spreadsheet_ids(selected_tables, instances_json, decrypt_password, stats_json=None,
+                           table_groups=None, excluded_tables=None):
+    """Resolve the spreadsheets selected in the filter form to a set of spreadsheet IDs.
+
+    table_groups are whole spreadsheet lists ('public', 'encrypted'), less the
+    excluded_tables unchecked in them. Statistics predicates (see parse_predicates)
+    narrow the selection down; a malformed predicate or unknown list raises ValueError.
+    """
+    spreadsheet_ids = set()
+
+    # If 'Select Individual Spreadsheets' is checked, 'table_name[]' and/or 'table_group[]' will be present
+    # Else, plot all public (and encrypted if password is provided) spreadsheets
+    if selected_tables or table_groups:
+        # Get spreadsheet IDs from selected tables
+        if selected_tables:
+            spreadsheet_ids.update(spreadsheet_id for spreadsheet_id, in db.session.query(
+                Spreadsheet.spreadsheet_id).filter(Spreadsheet.spreadsheet_name.in_(selected_tables)))
+        for group in table_groups or []:
+            if group not in TABLE_GROUPS:
+                raise ValueError(f"Unknown spreadsheet list '{group}'.")
+            spreadsheet_ids.update(spreadsheet_id for spreadsheet_id, in db.session.query(
+                Spreadsheet.spreadsheet_id).filter(Spreadsheet.encrypted == TABLE_GROUPS[group]))
+        if excluded_tables:
+            spreadsheet_ids.difference_update(spreadsheet_id for spreadsheet_id, in db.session.query(
+                Spreadsheet.spreadsheet_id).filter(Spreadsheet.spreadsheet_name.in_(excluded_tables)))
+        logger.debug(f"Found {len(spreadsheet_ids)} spreadsheet IDs from selected tables.")
+    else:
+        # Select all public spreadsheets
+        public_spreadsheets = Spreadsheet.query.filter_by(encrypted=False).all()
+        spreadsheet_ids.update([s.spreadsheet_id for s in public_spreadsheets])
+        logger.debug(f"Selected all public spreadsheets: {len(public_spreadsheets)} found.")
+
+        # If decrypt_password is provided, also include all encrypted spreadsheets
+        if decrypt_password:
+            encrypted_spreadsheets = Spreadsheet.query.filter_by(encrypted=True).all()
+            spreadsheet_ids.update([s.spreadsheet_id for s in encrypted_spreadsheets])
+            logger.debug(f"Selected all encrypted spreadsheets due to provided password: {len(encrypted_spreadsheets)} found.")
+
+    instance_filters = parse_instance_filters(instances_json)
+    if instance_filters:
+        for name, values, minimum, maximum in instance_filters:
+            # Find instance IDs that match the name and the selected values or numeric range
+            instance_ids = find_instance_ids(name, values, minimum, maximum)
+            if not instance_ids:
+                logger.warning(f"No instances found for {name} with values {values} in range [{minimum}, {maximum}].")
+                continue
+            # Find spreadsheets associated with these instances
+            spreadsheet_ids_query = SpreadsheetInstance.query.filter(
+                SpreadsheetInstance.instance_id.in_(instance_ids)
+            ).with_entities(SpreadsheetInstance.spreadsheet_id)
+            spreadsheet_ids.update([s[0] for s in spreadsheet_ids_query.all()])
+        logger.debug(f"Total unique spreadsheet IDs after processing instances: {len(spreadsheet_ids)}")
+
+    predicates = parse_predicates(stats_json)
+    if predicates:
+        # Answered from the summary table, without touching spreadsheet_rows
+        spreadsheet_ids &= filter_by_statistics(predicates)
+        logger.debug(f"Spreadsheet IDs left after statistics filters: {len(spreadsheet_ids)}")
+
+    return spreadsheet_ids
+
+def iter_spreadsheet_frames(spreadsheet_ids, decrypt_password, columns, x_axis):
+    """Load and decrypt one spreadsheet at a time.
+
+    Yields (index, table name, df, message); df is None and message says why when
+    a spreadsheet was skipped. Each frame should be released before the next one
+    is requested, so peak memory is bounded by the largest spreadsheet rather
+    than the selection.
+    """
+    for idx, spreadsheet_id in enumerate(sorted(spreadsheet_ids)):
+        spreadsheet = Spreadsheet.query.get(spreadsheet_id)
+        if not spreadsheet:
+            logger.debug("Spreadsheet ID %s not found.", spreadsheet_id)
+            yield idx, None, None, f"Spreadsheet ID {spreadsheet_id} not found."
+            continue
+
+        table_name = spreadsheet.spreadsheet_name
+        try:
+            key = None
+            if spreadsheet.encrypted:
+                logger.debug("Spreadsheet '%s' is encrypted. Attempting decryption.", table_name)
+
+                if not decrypt_password:
+                    logger.error(f"Decryption password not provided for encrypted Spreadsheet '{table_name}'.")
+                    yield idx, table_name, None, f"Password required for spreadsheet '{table_name}'."
+                    continue
+
+                # One KDF per upload batch rather than two per spreadsheet
+                key = get_key_ring().unlock(spreadsheet, decrypt_password)
+                if key is None:
+                    logger.error(f"Incorrect decryption password for Spreadsheet '{table_name}'.")
+                    yield idx, table_name, None, f"Incorrect password for spreadsheet '{table_name}'."
+                    continue
+
+            df = load_spreadsheet_frame(spreadsheet, columns, encryption_key=key)
+            if df.empty:
+                logger.debug("No rows found for Spreadsheet '%s'.", table_name)
+                yield idx, table_name, None, f"No rows found for spreadsheet '{table_name}'."
+                continue
+
+            df = df.dropna(subset=[x_axis])
+            logger.debug("Cleaned data for Spreadsheet '%s': %d rows.", table_name, len(df))
+            if df.empty:
+                yield idx, table_name, None, f"No plottable rows in spreadsheet '{table_name}' (no {x_axis} values)."
+                continue
 
+        except Exception as e:
+            logger.error(f"Error processing Spreadsheet '{table_name}': {e}. Skipping.")
+            yield idx, table_name, None, f"Error processing spreadsheet '{table_name}'."
+            continue
+
+        yield idx, table_name, df, None
+
+def iter_spreadsheet_traces(spreadsheet_ids, decrypt_password, preset, x_axis, y_axis, selected_y_columns):
+    """Yields (traces, message) per spreadsheet; traces is None when it was skipped."""
+    plot_columns = list(dict.fromkeys([x_axis] + y_axis))
+    points = 0  # Plotted so far, the traces switch to WebGL once the figure gets dense
+    for idx, table_name, df, message in iter_spreadsheet_frames(spreadsheet_ids, decrypt_password, plot_columns, x_axis):
+        if df is None:
+            yield None, message
+            continue
+
+        color = COLORS[idx % len(COLORS)]
+        logger.debug("Plotting Spreadsheet '%s' with color '%s'.", table_name, color)
+        try:
+            with span('figure'):
+                traces = build_spreadsheet_traces(df, table_name, color, preset, x_axis, y_axis, selected_y_columns,
+                                                  points_before=points)
+            points += sum(len(trace.x) for trace in traces)
+        except Exception as e:
+            logger.error(f"Error processing Spreadsheet '{table_name}': {e}. Skipping.")
+            yield None, f"Error processing spreadsheet '{table_name}'."
+            continue
+        finally:
+            del df
+
+        yield traces, f"Spreadsheet '{table_name}' plotted successfully."
+
+def read_plot_form():
+    """Axes and spreadsheet selection of a /plot or /ensemble request.
+
+    Returns (preset, x_axis, y_axis, selected_y_columns, spreadsheet_ids, decrypt_password).
+    Raises ValueError with a message for the user when the request cannot be plotted.
+    """
+    x_axis = request.form.get('x_axis') if 'x_axis' in request.form else None
+    y_axis = request.form.getlist('y_axis') if 'y_axis' in request.form else []
+    selected_tables = request.form.getlist('table_name[]')
+    table_groups = request.form.getlist('table_group[]')
+    excluded_tables = request.form.getlist('exclude_table[]')
+    instances_json = request.form.get('instances_json')
+    decrypt_password = request.form.get("decrypt_password")
+    stats_json = request.form.get('stats_json')
+
+    preset = request.form.get('preset-options')
+
+    if preset == "None":
+        # Input validation
+        if not x_axis:
+            logger.error("Missing X-axis in plot request.")
+            raise ValueError("X-axis field is missing from the request.")
+
+        if not y_axis:
+            logger.error("No Y-axis selected in plot request.")
+            raise ValueError("Please select at least one column for the Y-axis.")
+
+    logger.debug(f"Plot parameters - X-axis: {x_axis}, Y-axis: {y_axis}, Tables: {selected_tables}, Instances: {instances_json}")
+
+    spreadsheet_ids = select_spreadsheet_ids(selected_tables, instances_json, decrypt_password, stats_json,
+                                             table_groups, excluded_tables)
+    if not spreadsheet_ids:
+        logger.error("No spreadsheets match the selected filters.")
+        raise ValueError("No spreadsheets match the selected filters.")
+
+    x_axis, y_axis, selected_y_columns = resolve_axes(preset, x_axis, y_axis)
+    return preset, x_axis, y_axis, selected_y_columns, spreadsheet_ids, decrypt_password
+
+def stream_plot(spreadsheet_ids, decrypt_password, preset, x_axis, y_axis, selected_y_columns):
+    """NDJSON body of a streamed /plot: the layout, then one line per spreadsheet as soon as it is ready.
+
+    Lines are {"layout": ...}, {"traces": [...], "message": ...} or {"message": ...},
+    and finally {"done": true, "plot_messages": [...]} or {"error": ...}. The lock
+    taken by plot() is released here, once the last line has been produced.
+    """
+    def line(payload):
+        return json.dumps(payload, cls=plotly.utils.PlotlyJSONEncoder) + '\n'
+
+    try:
+        x_axis_name, y_axis_name = axis_titles(preset, x_axis, y_axis, selected_y_columns)
+        yield line({"layout": figure_layout(x_axis_name, y_axis_name)})
+
+        plot_messages = []
+        points = 0
+        for traces, message in iter_spreadsheet_traces(
+                spreadsheet_ids, decrypt_password, preset, x_axis, y_axis, selected_y_columns):
+            plot_messages.append(message)
+            if traces is None:
+                yield line({"message": message})
+                continue
+            points += sum(len(trace.x) for trace in traces)
+            yield line({"traces": traces, "message": message})
+
+        if not points:
+            logger.error("No data found for the selected spreadsheets or incorrect password.")
+            yield line({"error": "No data found for the selected spreadsheets or incorrect password.",
+                        "plot_messages": plot_messages})
+            return
+        PLOT_POINTS.observe(points)
+        yield line({"done": True, "plot_messages": plot_messages})
 
-def decrypt_value(encrypted_value, key, iv):
-    cipher = Cipher(algorithms.AES(key), modes.CBC(iv))
-    decryptor = cipher.decryptor()
-    decrypted_padded = decryptor.update(base64.b64decode(encrypted_value)) + decryptor.finalize()
-    unpadder = PKCS7(128).unpadder()
-    decrypted_data = unpadder.update(decrypted_padded) + unpadder.finalize()
-    return decrypted_data.decode('utf-8')
+    except Exception as e:
+        logger.exception(f"Error during streamed plotting: {e}")
+        yield line({"error": f"Error during plotting: {e}"})
+
+    finally:
+        release_lock()
+        logger.info("Lock released after streamed plotting.")
 
 @main.route('/plot', methods=['POST'])
 def plot():
@@ -318,315 +553,149 @@ def plot():
         }), 423
 
     logger.info("Lock acquired for plotting.")
+    streaming = False
     try:
-        # Retrieve form data
-        x_axis = request.form.get('x_axis') if 'x_axis' in request.form else None
-        y_axis = request.form.getlist('y_axis') if 'y_axis' in request.form else []
-        selected_tables = request.form.getlist('table_name[]')
-        instances_json = request.form.get('instances_json')
-        decrypt_password = request.form.get("decrypt_password")
-
-        preset = request.form.get('preset-options')
-
-        if preset == "None":
-            # Input validation
-            if not x_axis:
-                logger.error("Missing X-axis in plot request.")
-                return jsonify({"error": "X-axis field is missing from the request."}), 400
-
-            if not y_axis:
-                logger.error("No Y-axis selected in plot request.")
-                return jsonify({"error": "Please select at least one column for the Y-axis."}), 400
-        else:
-            pass
+        try:
+            preset, x_axis, y_axis, selected_y_columns, spreadsheet_ids, decrypt_password = read_plot_form()
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        if request.form.get('stream') in ('true', 'on', '1'):
+            # Traces are sent per spreadsheet as they are built; the generator releases the lock
+            streaming = True
+            return current_app.response_class(
+                stream_with_context(stream_plot(
+                    spreadsheet_ids, decrypt_password, preset, x_axis, y_axis, selected_y_columns)),
+                mimetype='application/x-ndjson'
+            )
+
+        plot_messages = []  # List to track messages (both success and failure)
+        fig = go.Figure()
+        for traces, message in iter_spreadsheet_traces(
+                spreadsheet_ids, decrypt_password, preset, x_axis, y_axis, selected_y_columns):
+            plot_messages.append(message)
+            if traces is not None:
+                fig.add_traces(traces)
+
+        # Same check and message as stream_plot
+        points = sum(len(trace.x) for trace in fig.data)
+        if not points:
+            logger.error("No data found for the selected spreadsheets or incorrect password.")
+            return jsonify({"error": "No data found for the selected spreadsheets or incorrect password.",
+                            "plot_messages": plot_messages}), 404
 
-        logger.debug(f"Plot parameters - X-axis: {x_axis}, Y-axis: {y_axis}, Tables: {selected_tables}, Instances: {instances_json}")
+        if points > webgl_threshold() and any(trace.type == 'scatter' for trace in fig.data):
+            # The figure only got dense part-way through, draw the earlier spreadsheets with WebGL too
+            fig = go.Figure(data=[as_webgl(trace) for trace in fig.data])
 
-        # Process selected tables and instances to get spreadsheet IDs
-        spreadsheet_ids = set()
+        # Customize the layout
+        x_axis_name, y_axis_name = axis_titles(preset, x_axis, y_axis, selected_y_columns)
+        fig.update_layout(**figure_layout(x_axis_name, y_axis_name))
+        logger.info(f"Plotly figure created successfully with {len(fig.data)} traces.")
+
+        PLOT_POINTS.observe(points)
+
+        # Serialize figure and messages in one pass, the figure is embedded as an object rather than a string
+        with span('serialize'):
+            body = json.dumps({
+                "graph": fig,
+                "plot_messages": plot_messages  # Send both success and failure messages as text
+            }, cls=plotly.utils.PlotlyJSONEncoder)
+        logger.debug("Serialized Plotly figure to JSON.")
 
-        # If 'Select Individual Spreadsheets' is checked, 'table_name[]' will be present
-        # Else, plot all public (and encrypted if password is provided) spreadsheets
-        if selected_tables:
-            # Get spreadsheet IDs from selected tables
-            spreadsheets = Spreadsheet.query.filter(Spreadsheet.spreadsheet_name.in_(selected_tables)).all()
-            spreadsheet_ids.update([s.spreadsheet_id for s in spreadsheets])
-            logger.debug(f"Found {len(spreadsheet_ids)} spreadsheet IDs from selected tables.")
-        else:
-            # Select all public spreadsheets
-            public_spreadsheets = Spreadsheet.query.filter_by(encrypted=False).all()
-            spreadsheet_ids.update([s.spreadsheet_id for s in public_spreadsheets])
-            logger.debug(f"Selected all public spreadsheets: {len(public_spreadsheets)} found.")
-
-            # If decrypt_password is provided, also include all encrypted spreadsheets
-            if decrypt_password:
-                encrypted_spreadsheets = Spreadsheet.query.filter_by(encrypted=True).all()
-                spreadsheet_ids.update([s.spreadsheet_id for s in encrypted_spreadsheets])
-                logger.debug(f"Selected all encrypted spreadsheets due to provided password: {len(encrypted_spreadsheets)} found.")
-
-        if instances_json:
-            instances = json.loads(instances_json)
-            for instance in instances:
-                name = instance['name']
-                values = instance['values']
-                # Find instance IDs that match the name and selected values
-                instance_ids = Instance.query.filter(
-                    Instance.instance_name == name,
-                    Instance.instance_value.in_(values)
-                ).with_entities(Instance.instance_id).all()
-                if not instance_ids:
-                    logger.warning(f"No instances found for {name} with values {values}.")
-                    continue
-                instance_ids = [i[0] for i in instance_ids]
-                # Find spreadsheets associated with these instances
-                spreadsheet_ids_query = SpreadsheetInstance.query.filter(
-                    SpreadsheetInstance.instance_id.in_(instance_ids)
-                ).with_entities(SpreadsheetInstance.spreadsheet_id)
-                spreadsheet_ids.update([s[0] for s in spreadsheet_ids_query.all()])
-            logger.debug(f"Total unique spreadsheet IDs after processing instances: {len(spreadsheet_ids)}")
-
-        if not spreadsheet_ids:
-            logger.error("No spreadsheets match the selected filters.")
-            return jsonify({"error": "No spreadsheets match the selected filters."}), 400
-
-        data_frames = []
-        colors = ['red', 'blue', 'green', 'orange', 'purple', 'cyan', 'magenta', 'yellow']  # Extended colors
-        color_map = {}
-        plot_messages = []  # List to track messages (both success and failure)
+        return current_app.response_class(body, mimetype='application/json')
 
-        selected_y_columns = y_axis # This variable is for containing manually selected y_axis which will be 
-                                    #used if calculated preset options are selected 
-
-        # Non-calculated preset options
-        # Columns in preset options get added to y_axis
-        if preset == "non_calc_1":
-            y_axis = ['p', 'q', 'induced_PWP'] + y_axis
-            x_axis = 'axial_strain'
-        if preset == "non_calc_2":
-            y_axis = ['q'] + y_axis
-            x_axis = 'p'
-        if preset == "non_calc_3":
-            y_axis = ['vol_strain'] + y_axis
-            x_axis = 'axial_strain'
-
-        # Calculated preset options
-        if preset == "calc_1":
-            y_axis = ['e'] + y_axis
-            x_axis = 'p'
-        if preset == "calc_2":
-            y_axis = ['q','p'] + y_axis
-            x_axis = 'axial_strain'
-        if preset == "calc_3":
-            y_axis = ['q', 'p'] + y_axis
-            x_axis = 'p'
-
-        for idx, spreadsheet_id in enumerate(spreadsheet_ids):
-            spreadsheet = Spreadsheet.query.get(spreadsheet_id)
-            if not spreadsheet:
-                logger.debug(f"Spreadsheet ID {spreadsheet_id} not found.")
-                plot_messages.append(f"Spreadsheet ID {spreadsheet_id} not found.")
-                continue
 
-            table_name = spreadsheet.spreadsheet_name
-            color_map[table_name] = colors[idx % len(colors)]
-            logger.debug(f"Processing Spreadsheet '{table_name}' with color '{color_map[table_name]}.'")
+    except Exception as e:
+        logger.exception(f"Error during plotting: {e}")
+        return jsonify({"error": f"Error during plotting: {e}"}), 500
 
-            try:
-                if spreadsheet.encrypted:
-                    logger.debug(f"Spreadsheet '{table_name}' is encrypted. Attempting decryption.")
-
-                    if not decrypt_password:
-                        logger.error(f"Decryption password not provided for encrypted Spreadsheet '{table_name}'.")
-                        plot_messages.append(f"Password required for spreadsheet '{table_name}'.")
-                        continue
-
-                    if not verify_password(spreadsheet.password_salt, spreadsheet.password_hash, decrypt_password):
-                        logger.error(f"Incorrect decryption password for Spreadsheet '{table_name}'.")
-                        plot_messages.append(f"Incorrect password for spreadsheet '{table_name}'.")
-                        continue
-
-                    # Decrypt data
-                    key = derive_key(decrypt_password, spreadsheet.key_salt)
-                    iv = spreadsheet.iv
-                    rows = SpreadsheetRow.query.filter_by(spreadsheet_id=spreadsheet.spreadsheet_id).all()
-                    data = []
-                    for row in rows:
-                        decrypted_row = {}
-                        for col in [x_axis] + y_axis:
-                            encrypted_value = getattr(row, col)
-                            if encrypted_value:
-                                decrypted_value = decrypt_value(encrypted_value, key, iv)
-                                try:
-                                    decrypted_row[col] = round(float(decrypted_value), 4)
-                                except ValueError:
-                                    decrypted_row[col] = None
-                            else:
-                                decrypted_row[col] = None
-                        decrypted_row['source'] = table_name
-                        data.append(decrypted_row)
-                    df = pd.DataFrame(data)
-                    df = df.dropna(subset=[x_axis])
-                    data_frames.append(df)
-                    plot_messages.append(f"Spreadsheet '{table_name}' plotted successfully.")
-                    logger.debug(f"Decrypted and cleaned data for Spreadsheet '{table_name}': {len(df)} rows.")
-
-                else:
-                    rows = SpreadsheetRow.query.filter_by(spreadsheet_id=spreadsheet.spreadsheet_id).all()
-                    if not rows:
-                        logger.debug(f"No rows found for Spreadsheet '{table_name}'.")
-                        plot_messages.append(f"No rows found for spreadsheet '{table_name}'.")
-                        continue
-                    data_dicts = []
-                    for row in rows:
-                        row_dict = {col: getattr(row, col) for col in [x_axis] + y_axis}
-                        row_dict['source'] = table_name
-                        data_dicts.append(row_dict)
-                    df = pd.DataFrame(data_dicts)
-                    for col in [x_axis] + y_axis:
-                        if col in df.columns:
-                            df[col] = pd.to_numeric(df[col], errors='coerce').round(4)
-                        else:
-                            logger.warning(f"Column '{col}' not found in Spreadsheet '{table_name}'.")
-                            df[col] = None
-                    df = df.dropna(subset=[x_axis])
-                    logger.debug(f"Cleaned data for Spreadsheet '{table_name}': {len(df)} rows.")
-                    data_frames.append(df)
-                    plot_messages.append(f"Spreadsheet '{table_name}' plotted successfully.")
+    finally:
+        if not streaming:
+            release_lock()
+            logger.info("Lock released after plotting attempt.")
 
+
+@main.route('/ensemble', methods=['POST'])
+def ensemble():
+    """Mean, median and percentile envelopes of the selected tests on a common x grid.
+
+    Takes the same form as /plot, plus optional grid_points, percentiles ('10,90'),
+    x_min and x_max.
+    """
+    if not acquire_lock():
+        logger.warning("Ensemble request denied due to active lock.")
+        return jsonify({
+            'success': False,
+            'message': 'Another operation is in progress. Please try again later.'
+        }), 423
+
+    try:
+        try:
+            preset, x_axis, y_axis, selected_y_columns, spreadsheet_ids, decrypt_password = read_plot_form()
+            grid_points = parse_grid_points(request.form.get('grid_points'))
+            percentiles = parse_percentiles(request.form.get('percentiles'))
+            x_min, x_max = parse_x_range(request.form.get('x_min'), request.form.get('x_max'))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        plot_messages = []
+        series_by_name = {}  # (x name, y name) -> cleaned (x, y) of every test that has it
+        plot_columns = list(dict.fromkeys([x_axis] + y_axis))
+        for _, table_name, df, message in iter_spreadsheet_frames(spreadsheet_ids, decrypt_password, plot_columns, x_axis):
+            if df is None:
+                plot_messages.append(message)
+                continue
+            try:
+                for x_name, y_name, x_values, y_values in spreadsheet_series(df, preset, x_axis, y_axis, selected_y_columns):
+                    cleaned = clean_series(x_values, y_values)
+                    if cleaned is not None:
+                        series_by_name.setdefault((x_name, y_name), []).append(cleaned)
             except Exception as e:
                 logger.error(f"Error processing Spreadsheet '{table_name}': {e}. Skipping.")
                 plot_messages.append(f"Error processing spreadsheet '{table_name}'.")
                 continue
+            plot_messages.append(f"Spreadsheet '{table_name}' included in the ensemble.")
+            del df
 
-        if not data_frames:
+        if not series_by_name:
             logger.error("No data found for the selected spreadsheets or incorrect password.")
             return jsonify({"error": "No data found for the selected spreadsheets or incorrect password."}), 404
 
-        # Combine data
-        data = pd.concat(data_frames, ignore_index=True)
-        logger.info(f"Combined data contains {len(data)} rows.")
-
-        # Create the Plotly figure
         fig = go.Figure()
-
-        if preset in ["calc_1", "calc_2", "calc_3"]:
-            for table_name in data['source'].unique():
-                table_data = data[data['source'] == table_name]
-                if preset == "calc_1": 
-                    y_preset = 'e'  # Swap x-axis and y-axis (just for this option)
-                    x_axis = "log(p')"
-                    table_data[x_axis] = np.log(table_data['p'])
-                if preset == "calc_2":
-                    y_preset = "q/p'"
-                    table_data[y_preset] = table_data['q'] / table_data['p']
-                if preset == "calc_3":
-                    qmax = table_data['q'].max()
-                    y_preset = "qmax/p'"
-                    table_data[y_preset] = qmax / table_data['p']   
-                fig.add_trace(go.Scatter(
-                    x=table_data[x_axis],
-                    y=table_data[y_preset],
-                    mode='markers',
-                    name=f"{table_name} - {y_preset}",
-                    marker=dict(color=color_map[table_name]),
-                    text=table_data['source'],
-                    hovertemplate=(
-                        f"<b>{y_preset}</b>: %{{y}}<br>"
-                        f"<b>{x_axis}</b>: %{{x}}<br>"
-                        f"<b>Spreadsheet</b>: %{{text}}<br>"
-                        "<extra></extra>"
-                    )
-                ))
-                for y in np.unique(selected_y_columns):
-                    fig.add_trace(go.Scatter(
-                        x=table_data[x_axis],
-                        y=table_data[y],
-                        mode='markers',
-                        name=f"{table_name} - {y}",
-                        marker=dict(color=color_map[table_name]),
-                        text=table_data['source'],
-                        hovertemplate=(
-                            f"<b>{y}</b>: %{{y}}<br>"
-                            f"<b>{x_axis}</b>: %{{x}}<br>"
-                            f"<b>Spreadsheet</b>: %{{text}}<br>"
-                            "<extra></extra>"
-                        )
-                    ))   
-            y_axis = [y_preset] + selected_y_columns  # Combining calculated column name and selected columns names
-            logger.debug(f"Added plot trace for '{table_name} - {y}'.")        
-        else:   
-            y_axis = np.unique(y_axis) 
-            for y in y_axis:
-                for table_name in data['source'].unique():
-                    table_data = data[data['source'] == table_name]
-                    fig.add_trace(go.Scatter(
-                        x=table_data[x_axis],
-                        y=table_data[y],
-                        mode='markers',
-                        name=f"{table_name} - {y}",
-                        marker=dict(color=color_map[table_name]),
-                        text=table_data['source'],
-                        hovertemplate=(
-                            f"<b>{y}</b>: %{{y}}<br>"
-                            f"<b>{x_axis}</b>: %{{x}}<br>"
-                            f"<b>Spreadsheet</b>: %{{text}}<br>"
-                            "<extra></extra>"
-                        )
-                    ))
-
-        y_axis = np.unique(["p'" if y == 'p' else y for y in y_axis])  # Add apostrophe to p
-        if x_axis == 'p':
-            x_axis = "p'"
-
-        x_axis_name = x_axis.replace('_', ' ').capitalize()
-        y_axis_name = ', '.join([col.replace('_', ' ').capitalize() for col in y_axis])
-        title_name = f"{y_axis_name} vs {x_axis_name}"
-
-        # Customize the layout
-        fig.update_layout(
-            title=title_name,
-            xaxis_title=x_axis_name,
-            yaxis_title=y_axis_name,
-            legend_title="Source Tables",
-            hovermode='closest',
-            xaxis=dict(
-                tickformat='.2f'
-            ),
-            yaxis=dict(
-                tickformat='.2f'
-            ),
-            margin=dict(l=50, r=50, t=50, b=50),
-            dragmode='pan',
-            legend=dict(
-                x=0.95,
-                y=0.95,
-                xanchor='right',
-                yanchor='top',
-                traceorder="normal",
-                bgcolor="rgba(255, 255, 255, 0.5)",
-                bordercolor="Black",
-                borderwidth=1
-            )
-        )
-        logger.info("Plotly figure created successfully.")
-
-        # Serialize figure and messages
-        graph_json = json.dumps(fig, cls=plotly.utils.PlotlyJSONEncoder)
-        logger.debug("Serialized Plotly figure to JSON.")
-
-        return jsonify({
-            "graph_json": graph_json,
-            "plot_messages": plot_messages  # Send both success and failure messages as text
-        })
-
+        tests = 0
+        with span('ensemble'):
+            for idx, ((x_name, y_name), series) in enumerate(series_by_name.items()):
+                try:
+                    grid = common_grid(series, grid_points, x_min, x_max)
+                except ValueError as e:
+                    return jsonify({"error": str(e)}), 400
+                summary = envelopes(resample(series, grid), percentiles)
+                fig.add_traces(ensemble_traces(grid, summary, y_name, x_name, COLORS[idx % len(COLORS)], percentiles))
+                tests = max(tests, len(series))
+
+        x_axis_name, y_axis_name = axis_titles(preset, x_axis, y_axis, selected_y_columns)
+        layout = figure_layout(x_axis_name, y_axis_name)
+        layout['title'] = f"{layout['title']} (ensemble of {tests} tests)"
+        layout['legend_title'] = "Ensemble"
+        fig.update_layout(**layout)
+        logger.info(f"Ensemble of {tests} tests built on a {grid_points}-point grid.")
+
+        with span('serialize'):
+            body = json.dumps({
+                "graph": fig,
+                "tests": tests,
+                "plot_messages": plot_messages
+            }, cls=plotly.utils.PlotlyJSONEncoder)
+        return current_app.response_class(body, mimetype='application/json')
 
     except Exception as e:
-        logger.exception(f"Error during plotting: {e}")
-        return jsonify({"error": f"Error during plotting: {e}"}), 500
+        logger.exception(f"Error during ensemble analysis: {e}")
+        return jsonify({"error": f"Error during ensemble analysis: {e}"}), 500
 
     finally:
         release_lock()
-        logger.info("Lock released after plotting attempt.")
+        logger.info("Lock released after ensemble analysis.")
 
 
 @main.route('/add-data', methods=['GET', 'POST'])
@@ -649,36 +718,50 @@ def add_data():
         else:
             return jsonify({'success': False, 'message': 'No data provided.'})
 
-        # Create or get the 'custom_input' spreadsheet
-        spreadsheet_name = 'custom_input'
-        spreadsheet = Spreadsheet.query.filter_by(spreadsheet_name=spreadsheet_name).first()
-        if not spreadsheet:
-            spreadsheet = Spreadsheet(spreadsheet_name=spreadsheet_name, encrypted=False)
-            db.session.add(spreadsheet)
-            db.session.commit()
+        # The row offset, extra series and series files are read, modified and written back
+        if not acquire_lock():
+            logger.warning("Lock acquisition failed. Another upload is in progress.")
+            return jsonify({
+                'success': False,
+                'message': 'Database is currently being updated by another user. Please try again later.'
+            }), 423
 
-        # Insert data into the database
-        standard_columns = ['time_start_of_stage', 'shear_induced_PWP', 'axial_strain',
-                            'vol_strain', 'induced_PWP', 'p', 'q', 'e']
-
-        rows = []
-        for _, row in df.iterrows():
-            data = {}
-            extra_data = {}
-            for column in df.columns:
-                value = str(row[column]) if pd.notnull(row[column]) else ''
-                if column in standard_columns:
-                    data[column] = value
-                else:
-                    extra_data[column] = value
-            row_entry = SpreadsheetRow(
-                spreadsheet_id=spreadsheet.spreadsheet_id,
-                **data,
-                extra_data=extra_data
-            )
-            rows.append(row_entry)
-        db.session.bulk_save_objects(rows)
-        db.session.commit()
+        try:
+            # Create or get the 'custom_input' spreadsheet
+            spreadsheet_name = 'custom_input'
+            spreadsheet = Spreadsheet.query.filter_by(spreadsheet_name=spreadsheet_name).first()
+            if not spreadsheet:
+                spreadsheet = Spreadsheet(spreadsheet_name=spreadsheet_name, encrypted=False)
+                db.session.add(spreadsheet)
+                db.session.commit()
+
+            # Insert data into the database
+            standard_columns = ['time_start_of_stage', 'shear_induced_PWP', 'axial_strain',
+                                'vol_strain', 'induced_PWP', 'p', 'q', 'e']
+            row_columns = [column for column in df.columns if column in standard_columns]
+            extra_columns = [column for column in df.columns if column not in standard_columns]
+
+            # New rows continue after the ones already stored, so extra series stay aligned
+            offset = SpreadsheetRow.query.filter_by(spreadsheet_id=spreadsheet.spreadsheet_id).count()
+            rows = prepare_rows(df[row_columns], start=offset)
+            for row in rows:
+                row['spreadsheet_id'] = spreadsheet.spreadsheet_id
+            db.session.bulk_insert_mappings(SpreadsheetRow, rows)
+
+            # Non-standard columns are stored as typed whole-column series instead of per-row JSON
+            if extra_columns:
+                append_extra_series(spreadsheet, df[extra_columns], offset)
+
+            spreadsheet.data_version = (spreadsheet.data_version or 1) + 1
+            db.session.commit()
+            rebuild_series(spreadsheet)
+            refresh_statistics(spreadsheet)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        finally:
+            release_lock()
         flash('Data added successfully.', 'success')
         return redirect(url_for('main.home'))
     else:
@@ -694,14 +777,15 @@ def view_data():
     if not spreadsheet or not spreadsheet.encrypted:
         return jsonify({'success': False, 'message': 'Spreadsheet not found or not encrypted.'})
 
-    # Retrieve the encrypted data, salt, and IV
-    salt = spreadsheet.key_salt
+    # Retrieve the encrypted data and IV
     iv = spreadsheet.iv
     encrypted_row = SpreadsheetRow.query.filter_by(spreadsheet_id=spreadsheet_id).first()
     encrypted_data = encrypted_row.encrypted_data
 
-    # Derive the key from the password
-    key = derive_key(password, salt)
+    # Unwrap the spreadsheet's data key with the password
+    key = get_key_ring().unlock(spreadsheet, password)
+    if key is None:
+        return jsonify({'success': False, 'message': 'Incorrect password or corrupted data.'})
 
     # Attempt to decrypt
     try:
@@ -719,14 +803,149 @@ def view_data():
         return jsonify({'success': False, 'message': 'Incorrect password or corrupted data.'})
 
 
+@main.route('/metrics', methods=['GET'])
+def metrics():
+    return current_app.response_class(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+@main.route('/spreadsheet-stats', methods=['GET'])
+def spreadsheet_stats():
+    """Summary statistics of the spreadsheets matching the 'predicates' query parameter (all if absent)."""
+    try:
+        predicates = parse_predicates(request.args.get('predicates'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    spreadsheet_ids = filter_by_statistics(predicates) if predicates else None
+    statistics = get_statistics(spreadsheet_ids)
+    names = dict(Spreadsheet.query.with_entities(Spreadsheet.spreadsheet_id, Spreadsheet.spreadsheet_name)
+                 .filter(Spreadsheet.spreadsheet_id.in_(statistics.keys())).all())
+    spreadsheets = [{'spreadsheet_name': names[spreadsheet_id], 'statistics': values}
+                    for spreadsheet_id, values in statistics.items() if spreadsheet_id in names]
+    spreadsheets.sort(key=lambda item: item['spreadsheet_name'])
+    return jsonify({'statistics': get_statistic_names(), 'spreadsheets': spreadsheets})
+
+def read_page_args():
+    """(limit, cursor, q) of a paged /get-tables or /get-instances request. Raises ValueError on a bad limit."""
+    try:
+        limit = int(request.args.get('limit', PAGE_SIZE))
+    except ValueError:
+        raise ValueError("limit must be a whole number.")
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise ValueError(f"limit must be between 1 and {MAX_PAGE_SIZE}.")
+    return limit, request.args.get('cursor') or None, request.args.get('q') or None
+
 @main.route('/get-tables', methods=['GET'])
 def get_tables_route():
-    tables = get_tables()
-    return jsonify({'tables': tables})
+    """All spreadsheets, or with any of limit, cursor, q (name prefix) or group a page of them.
+
+    A page comes with the next_cursor to pass back for the following page (null on the last).
+    """
+    if not any(arg in request.args for arg in ('limit', 'cursor', 'q', 'group')):
+        tables = get_tables()
+        return jsonify({'tables': tables})
+    try:
+        limit, cursor, prefix = read_page_args()
+        group = request.args.get('group') or None
+        if group is not None and group not in TABLE_GROUPS:
+            raise ValueError(f"Unknown spreadsheet list '{group}'.")
+        tables, next_cursor = list_tables(limit, cursor, prefix, group)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'tables': tables, 'next_cursor': next_cursor})
+
+@main.route('/delete-spreadsheets', methods=['POST'])
+def delete_spreadsheets_route():
+    """Delete the spreadsheets named in table_name[] with everything stored for them.
+
+    Encrypted spreadsheets are only deleted with the password that unlocks them
+    (decrypt_password); if any of them is refused, nothing is deleted.
+    """
+    names = request.form.getlist('table_name[]')
+    if not names:
+        return jsonify({'success': False, 'message': 'No spreadsheets selected.'}), 400
+
+    if not acquire_lock():
+        logger.warning("Delete request denied due to active lock.")
+        return jsonify({
+            'success': False,
+            'message': 'Another operation is in progress. Please try again later.'
+        }), 423
 
+    try:
+        spreadsheets = Spreadsheet.query.filter(Spreadsheet.spreadsheet_name.in_(names)).all()
+        password = request.form.get('decrypt_password')
+        refused = [
+            spreadsheet.spreadsheet_name for spreadsheet in spreadsheets
+            if spreadsheet.encrypted and (not password or get_key_ring().unlock(spreadsheet, password) is None)
+        ]
+        if refused:
+            return jsonify({
+                'success': False,
+                'message': f"Password missing or incorrect for: {', '.join(refused)}. Nothing was deleted."
+            }), 403
+
+        deleted = [spreadsheet.spreadsheet_name for spreadsheet in spreadsheets]
+        missing = sorted(set(names) - set(deleted))
+        if not deleted:
+            return jsonify({'success': False, 'message': 'None of the spreadsheets exist.', 'missing': missing}), 404
+        with span('delete'):
+            remove_spreadsheets(spreadsheets)
+        logger.info(f"Deleted spreadsheets: {deleted}. Not found: {missing}.")
+        return jsonify({'success': True, 'deleted': deleted, 'missing': missing})
+
+    except Exception as e:
+        logger.exception(f"Error while deleting spreadsheets: {e}")
+        db.session.rollback()
+        return jsonify({'success': False, 'message': 'An unexpected error occurred.'}), 500
+
+    finally:
+        release_lock()
+
+
+@main.route('/projects', methods=['GET'])
+def list_projects():
+    """Every project with its spreadsheet counts, read across the shards."""
+    return jsonify({'projects': get_project_summaries(), 'current': current_project()})
+
+@main.route('/projects', methods=['POST'])
+def add_project():
+    name = request.form.get('name') or (request.get_json(silent=True) or {}).get('name')
+    try:
+        create_project(name)
+    except ValueError as e:
+        if request.is_json:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        flash(str(e), 'error')
+        return redirect(url_for('main.home'))
+
+    session['project'] = name
+    if request.is_json:
+        return jsonify({'success': True, 'project': name}), 201
+    flash(f"Created project '{name}'.", 'success')
+    return redirect(url_for('main.home'))
+
+@main.route('/projects/select', methods=['POST'])
+def select_project_route():
+    # The 'project' field was already validated and activated by select_project()
+    session['project'] = current_project()
+    return redirect(url_for('main.home'))
 
 @main.route('/get-instances', methods=['GET'])
 def get_instances_route():
+    """All instance values; with limit the first page of each instance's values, their
+    next_cursors and ranges; with name a page of that instance's values (cursor, q as /get-tables).
+    """
+    try:
+        if 'name' in request.args:
+            limit, cursor, prefix = read_page_args()
+            values, next_cursor = list_instance_values(request.args['name'], limit, cursor, prefix)
+            return jsonify({'name': request.args['name'], 'values': values, 'next_cursor': next_cursor})
+        if 'limit' in request.args:
+            limit, _, _ = read_page_args()
+            instances, next_cursors = list_instances(limit)
+            return jsonify({'instances': instances, 'next_cursors': next_cursors, 'ranges': get_instance_ranges()})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     instances = get_instances()
-    return jsonify({'instances': instances})
+    return jsonify({'instances': instances, 'ranges': get_instance_ranges()})
 
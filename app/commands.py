@@ -0,0 +1,70 @@
+# app/commands.py
+
+"""Maintenance commands: `flask delete-spreadsheets` and `flask maintain-db`.
+
+Both take the project lock like the web requests do. `maintain-db` is meant to
+run on a schedule, e.g. nightly from cron:
+
+    0 3 * * * cd /app && flask maintain-db --all-projects
+"""
+
+import click
+from flask.cli import with_appcontext
+
+from app.blueprints.main import acquire_lock, release_lock
+from app.database import activate_project, get_projects, maintain_database, remove_spreadsheets, Spreadsheet, db
+
+def _activate(project):
+    try:
+        activate_project(project)
+    except LookupError as e:
+        raise click.ClickException(str(e))
+
+def _format_size(size):
+    return 'unknown size' if size is None else f'{size / 1024 / 1024:.1f} MB'
+
+@click.command('delete-spreadsheets')
+@click.argument('names', nargs=-1, required=True)
+@click.option('--project', help='Project the spreadsheets belong to (default: the default project).')
+@click.option('--yes', is_flag=True, help='Do not ask for confirmation.')
+@with_appcontext
+def delete_command(names, project, yes):
+    """Delete spreadsheets NAMES with their rows, series, statistics and orphaned instances."""
+    _activate(project)
+    spreadsheets = Spreadsheet.query.filter(Spreadsheet.spreadsheet_name.in_(names)).all()
+    found = [spreadsheet.spreadsheet_name for spreadsheet in spreadsheets]
+    for name in sorted(set(names) - set(found)):
+        click.echo(f"Spreadsheet '{name}' does not exist.", err=True)
+    if not spreadsheets:
+        raise click.ClickException('Nothing to delete.')
+    if not yes:
+        click.confirm(f"Delete {len(found)} spreadsheets ({', '.join(found)})?", abort=True)
+
+    if not acquire_lock():
+        raise click.ClickException('The database is locked by another operation, try again later.')
+    try:
+        remove_spreadsheets(spreadsheets)
+    finally:
+        release_lock()
+    click.echo(f"Deleted {len(found)} spreadsheets.")
+
+@click.command('maintain-db')
+@click.option('--project', help='Project to maintain (default: the default project).')
+@click.option('--all-projects', is_flag=True, help='Maintain every project.')
+@click.option('--full', is_flag=True,
+              help='Rewrite the whole file with VACUUM; also switches older databases to incremental auto_vacuum.')
+@with_appcontext
+def maintain_command(project, all_projects, full):
+    """Release free pages (incremental VACUUM) and refresh the planner statistics (ANALYZE)."""
+    for name in (get_projects() if all_projects else [project]):
+        _activate(name)
+        if not acquire_lock():
+            click.echo(f"Project '{name}' is locked by another operation, skipped.", err=True)
+            continue
+        try:
+            stats = maintain_database(db.session.get_bind(), full=full)
+        finally:
+            release_lock()
+        if stats:
+            click.echo(f"{name or 'default'}: {_format_size(stats['before']['size'])} -> "
+                       f"{_format_size(stats['after']['size'])}, {stats['after']['free_pages']} free pages left.")
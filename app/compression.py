@@ -0,0 +1,138 @@
+# app/compression.py
+
+"""Negotiated compression of large text/JSON responses.
+
+zstd and brotli are used when their packages (zstandard, brotli, both in
+requirements.txt) are installed and the browser accepts them; gzip is always
+available. Streamed NDJSON (e.g. /plot with stream=true) is compressed line by
+line and flushed after every chunk, so the browser can still draw each line as
+it arrives. Settings come from the environment:
+
+    COMPRESSION_ENABLED     'false' to switch compression off, default on
+    COMPRESSION_MIN_SIZE    smallest body in bytes worth compressing, default 1024
+    COMPRESSION_LEVEL       gzip level (1-9), default 6
+    COMPRESSION_BR_QUALITY  brotli quality (0-11), default 5
+    COMPRESSION_ZSTD_LEVEL  zstd level (1-22), default 3
+"""
+
+import gzip
+import os
+import zlib
+
+from flask import request
+
+from app.instrumentation import span
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSIBLE_TYPES = ('application/json', 'application/x-ndjson', 'application/javascript', 'image/svg+xml')
+
+def _env_int(name, default):
+    try:
+        return int(os.getenv(name, default))
+    except ValueError:
+        return default
+
+def available_encodings():
+    """Supported encodings in server preference order."""
+    encodings = []
+    if zstandard is not None:
+        encodings.append('zstd')
+    if brotli is not None:
+        encodings.append('br')
+    encodings.append('gzip')
+    return encodings
+
+def compress(data, encoding):
+    if encoding == 'zstd':
+        return zstandard.ZstdCompressor(level=_env_int('COMPRESSION_ZSTD_LEVEL', 3)).compress(data)
+    if encoding == 'br':
+        return brotli.compress(data, quality=_env_int('COMPRESSION_BR_QUALITY', 5))
+    return gzip.compress(data, compresslevel=_env_int('COMPRESSION_LEVEL', 6), mtime=0)
+
+class StreamCompressor:
+    """Compresses a streamed body chunk by chunk, flushing after each so no line is held back."""
+
+    def __init__(self, encoding):
+        self.encoding = encoding
+        if encoding == 'zstd':
+            self._compressor = zstandard.ZstdCompressor(level=_env_int('COMPRESSION_ZSTD_LEVEL', 3)).compressobj()
+        elif encoding == 'br':
+            self._compressor = brotli.Compressor(quality=_env_int('COMPRESSION_BR_QUALITY', 5))
+        else:
+            # wbits 31: a gzip header and trailer around the deflate stream
+            self._compressor = zlib.compressobj(_env_int('COMPRESSION_LEVEL', 6), zlib.DEFLATED, 31)
+
+    def compress(self, chunk):
+        if self.encoding == 'zstd':
+            return self._compressor.compress(chunk) + self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+        if self.encoding == 'br':
+            return self._compressor.process(chunk) + self._compressor.flush()
+        return self._compressor.compress(chunk) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        if self.encoding == 'zstd':
+            return self._compressor.flush()
+        if self.encoding == 'br':
+            return self._compressor.finish()
+        return self._compressor.flush(zlib.Z_FINISH)
+
+def compress_stream(chunks, encoding):
+    """Yield the compressed form of an iterable of str/bytes chunks, closing it when done."""
+    compressor = StreamCompressor(encoding)
+    try:
+        for chunk in chunks:
+            data = compressor.compress(chunk.encode() if isinstance(chunk, str) else chunk)
+            if data:
+                yield data
+        yield compressor.finish()
+    finally:
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            close()  # e.g. the teardown of stream_with_context
+
+def _compressible(response):
+    if response.direct_passthrough:
+        return False  # Files are sent as they are
+    if response.status_code < 200 or response.status_code >= 300 or response.status_code == 204:
+        return False
+    if 'Content-Encoding' in response.headers:
+        return False
+    mimetype = response.mimetype or ''
+    return mimetype.startswith('text/') or mimetype in COMPRESSIBLE_TYPES
+
+def _compress_response(response):
+    if not _compressible(response):
+        return response
+    response.vary.add('Accept-Encoding')
+
+    encoding = request.accept_encodings.best_match(available_encodings())
+    if encoding is None:
+        return response
+    if response.is_streamed:
+        # Its size is unknown up front, so no COMPRESSION_MIN_SIZE check
+        response.response = compress_stream(response.response, encoding)
+        response.headers.pop('Content-Length', None)
+        response.headers['Content-Encoding'] = encoding
+        return response
+    data = response.get_data()
+    if len(data) < _env_int('COMPRESSION_MIN_SIZE', 1024):
+        return response
+
+    with span('compress'):
+        response.set_data(compress(data, encoding))
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+def init_compression(app):
+    # Registered after the instrumentation hook, so it runs before it and its span is reported
+    if os.getenv('COMPRESSION_ENABLED', 'true').lower() not in ('false', '0', 'no'):
+        app.after_request(_compress_response)
@@ -1,17 +1,38 @@
 # app/database/__init__.py
 
-from .connection import db 
-from .models import Spreadsheet, SpreadsheetRow, Instance, SpreadsheetInstance
+from .connection import db, enable_sqlite_savepoints, enable_incremental_vacuum
+from .models import (
+    Spreadsheet, SpreadsheetRow, Instance, SpreadsheetInstance, ContentHash, ExtraSeries, SpreadsheetStatistic, Project,
+    IngestCheckpoint, DataMigration
+)
 from .data_extraction import data_extractor
-from .data_insertion import insert_data_to_db
-from .instance_handling import find_instances, insert_instances_to_db
-from .filtering import get_tables, get_instances, get_columns
+from .data_insertion import insert_data_to_db, update_data_in_db, prepare_rows
+from .instance_handling import find_instances, insert_instances_to_db, parse_numeric, backfill_numeric_values
+from .extra_series import (
+    append_extra_series, attach_extra_series, set_extra_series, get_extra_series_names, backfill_extra_series
+)
+from .series_store import write_series, rebuild_series, load_series, remove_series
+from .data_retrieval import decrypt_value, load_spreadsheet_frame
+from .test_parameters import extract_test_parameters, apply_test_parameters, load_test_parameters, CORRECTED_Q
+from .deduplication import hash_file_content, hash_payload, find_spreadsheets_by_hash, record_content_hashes
+from .statistics import (
+    store_statistics, refresh_statistics, backfill_statistics, parse_predicates,
+    filter_by_statistics, get_statistics, get_statistic_names
+)
+from .key_management import derive_key, hash_password, verify_password, new_data_key, KeyRing, get_key_ring
+from .filtering import (
+    get_tables, get_instances, get_instance_ranges, parse_instance_filters, find_instance_ids, get_columns,
+    PAGE_SIZE, MAX_PAGE_SIZE, TABLE_GROUPS, list_tables, list_instance_values, list_instances
+)
+from .schema import upgrade_schema, run_data_migration
+from .maintenance import (
+    delete_spreadsheets, remove_spreadsheets, database_stats, maintain_database
+)
+from .sharding import (
+    DEFAULT_PROJECT, activate_project, create_project, current_project, get_projects,
+    get_project_summaries, query_projects, project_lockfile
+)
 import logging
 
-logging.basicConfig(
-        level=logging.DEBUG,  # Set to DEBUG for detailed logs; change to INFO or WARNING in production
-        format='%(asctime)s %(levelname)s:%(name)s:%(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S'
-    )
 logger = logging.getLogger(__name__)
 
@@ -1,5 +1,59 @@
 # app/database/connection.py
 
+from flask import g, has_app_context
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
 
-db = SQLAlchemy()
+class ShardedSession(Session):
+    """Routes the default bind to the shard of the current project (see sharding.activate_project).
+
+    Models with a bind key, such as the catalog, keep their own engine.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        engine = super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+        if bind is None and has_app_context() and engine is self._db.engines.get(None):
+            project_engine = g.get('project_engine')
+            if project_engine is not None:
+                return project_engine
+        return engine
+
+db = SQLAlchemy(session_options={'class_': ShardedSession})
+
+def enable_sqlite_savepoints(engine):
+    """Let SQLAlchemy issue BEGIN itself so SAVEPOINTs (session.begin_nested) work on SQLite.
+
+    pysqlite opens transactions lazily and commits on its own around some
+    statements, which silently breaks nested transactions. This is the recipe
+    from the SQLAlchemy SQLite dialect documentation.
+    """
+    if engine.dialect.name != 'sqlite':
+        return
+
+    @event.listens_for(engine, 'connect')
+    def disable_pysqlite_transactions(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(engine, 'begin')
+    def emit_begin(connection):
+        connection.exec_driver_sql('BEGIN')
+
+def execute_outside_transaction(engine, statements):
+    """Run statements on a raw connection, for VACUUM and PRAGMAs that cannot run inside a transaction.
+
+    enable_sqlite_savepoints() leaves pysqlite connections in autocommit mode,
+    so nothing here is wrapped in BEGIN. executescript() steps every statement
+    to completion, which PRAGMA incremental_vacuum needs: execute() stops after
+    its first step and frees a single page.
+    """
+    connection = engine.raw_connection()
+    try:
+        connection.cursor().executescript(';\n'.join(statements) + ';')
+    finally:
+        connection.close()
+
+def enable_incremental_vacuum(engine):
+    """Create new databases with auto_vacuum=INCREMENTAL; only takes effect before the first table exists."""
+    if engine.dialect.name == 'sqlite':
+        execute_outside_transaction(engine, ['PRAGMA auto_vacuum = INCREMENTAL'])
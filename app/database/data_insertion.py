@@ -2,9 +2,11 @@
 
 from .models import Spreadsheet, SpreadsheetRow
 from .connection import db
+from app.instrumentation import span
 from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
 from cryptography.hazmat.primitives.padding import PKCS7
 import base64
+import hashlib
 
 import pandas as pd
 import time
@@ -25,6 +27,29 @@ def encrypt_value(value, key, iv):
         logger.exception(f"Error encrypting value '{value}': {e}")
         raise  # Re-raise exception after logging
 
+def fingerprint_row(values, key=None):
+    """Hash a row's plaintext values. Encrypted spreadsheets use their key so the hash reveals nothing."""
+    digest = hashlib.blake2b(digest_size=16, key=key or b'')
+    digest.update('\x1f'.join(values).encode())
+    return digest.hexdigest()
+
+def prepare_rows(df, encryption_key=None, start=0):
+    """Convert a DataFrame into plaintext row mappings tagged with their position and fingerprint."""
+    columns = list(df.columns)
+    text = df.astype(object).where(df.notna(), '').astype(str)
+    prepared = []
+    for row_index, values in enumerate(text.to_numpy().tolist(), start=start):
+        mapping = dict(zip(columns, values))
+        mapping['row_index'] = row_index
+        mapping['row_hash'] = fingerprint_row(values, encryption_key)
+        prepared.append(mapping)
+    return prepared
+
+def encrypt_mapping(mapping, columns, key, iv):
+    for column in columns:
+        mapping[column] = encrypt_value(mapping[column], key, iv)
+    return mapping
+
 def insert_data_to_db(name, df, spreadsheet=None, encrypt=False, encryption_key=None, iv=None, retries=3, delay=2):
     for attempt in range(1, retries + 1):
         try:
@@ -43,27 +68,23 @@ def insert_data_to_db(name, df, spreadsheet=None, encrypt=False, encryption_key=
                 else:
                     logger.debug(f"Added Spreadsheet '{name}' with ID {spreadsheet.spreadsheet_id} to the session.")
 
+            if spreadsheet.spreadsheet_id is None:
+                logger.error(f"Spreadsheet ID is None for '{name}'. Cannot insert rows.")
+                raise ValueError(f"Spreadsheet ID is None for '{name}'. Cannot insert rows.")
+
             rows = []
-            for idx, row in df.iterrows():
-                data = {}
-                for column in df.columns:
-                    value = str(row[column]) if pd.notnull(row[column]) else ''
+            with span('encrypt' if encrypt else 'prepare_rows'):
+                for data in prepare_rows(df, encryption_key if encrypt else None):
                     if encrypt:
-                        data[column] = encrypt_value(value, encryption_key, iv)
-                    else:
-                        data[column] = value
-
-                if spreadsheet.spreadsheet_id is None:
-                    logger.error(f"Spreadsheet ID is None for '{name}'. Cannot insert rows.")
-                    raise ValueError(f"Spreadsheet ID is None for '{name}'. Cannot insert rows.")
-
-                row_entry = SpreadsheetRow(
-                    spreadsheet_id=int(spreadsheet.spreadsheet_id),
-                    **data
-                )
-                rows.append(row_entry)
+                        encrypt_mapping(data, df.columns, encryption_key, iv)
+                    row_entry = SpreadsheetRow(
+                        spreadsheet_id=int(spreadsheet.spreadsheet_id),
+                        **data
+                    )
+                    rows.append(row_entry)
 
-            db.session.bulk_save_objects(rows)
+            with span('db_insert'):
+                db.session.bulk_save_objects(rows)
             logger.info(f"Bulk saved {len(rows)} rows for Spreadsheet '{name}'.")
 
             # Do not commit here; let the caller handle it
@@ -82,3 +103,67 @@ def insert_data_to_db(name, df, spreadsheet=None, encrypt=False, encryption_key=
             logger.exception(f"Unexpected error on attempt {attempt} for Spreadsheet '{name}': {e}")
             return {'success': False, 'message': 'An unexpected error occurred while inserting data.'}
 
+
+def update_data_in_db(spreadsheet, df, encryption_key=None, iv=None):
+    """Incrementally re-ingest a spreadsheet that is already stored.
+
+    Row fingerprints of the new DataFrame are compared with the stored ones by
+    row position: unchanged rows are skipped, changed rows are updated in place,
+    new rows are appended and rows past the end of the new sheet are removed.
+    """
+    name = spreadsheet.spreadsheet_name
+    encrypt = bool(spreadsheet.encrypted)
+    try:
+        stored = db.session.query(
+            SpreadsheetRow.id, SpreadsheetRow.row_index, SpreadsheetRow.row_hash
+        ).filter_by(spreadsheet_id=spreadsheet.spreadsheet_id).all()
+
+        if any(row.row_hash is None or row.row_index is None for row in stored):
+            # Rows ingested before fingerprints existed cannot be diffed; replace them once
+            logger.info(f"Spreadsheet '{name}' has rows without fingerprints. Replacing all {len(stored)} rows.")
+            SpreadsheetRow.query.filter_by(spreadsheet_id=spreadsheet.spreadsheet_id).delete(synchronize_session=False)
+            stored = []
+
+        stored_by_index = {row.row_index: row for row in stored}
+        inserts = []
+        updates = []
+        for mapping in prepare_rows(df, encryption_key if encrypt else None):
+            existing = stored_by_index.pop(mapping['row_index'], None)
+            if existing is not None and existing.row_hash == mapping['row_hash']:
+                continue
+            if encrypt:
+                encrypt_mapping(mapping, df.columns, encryption_key, iv)
+            if existing is None:
+                mapping['spreadsheet_id'] = spreadsheet.spreadsheet_id
+                inserts.append(mapping)
+            else:
+                mapping['id'] = existing.id
+                updates.append(mapping)
+        stale_ids = [row.id for row in stored_by_index.values()]
+
+        with span('db_insert'):
+            if inserts:
+                db.session.bulk_insert_mappings(SpreadsheetRow, inserts)
+            if updates:
+                db.session.bulk_update_mappings(SpreadsheetRow, updates)
+            for start in range(0, len(stale_ids), 500):
+                SpreadsheetRow.query.filter(
+                    SpreadsheetRow.id.in_(stale_ids[start:start + 500])
+                ).delete(synchronize_session=False)
+
+        changed = bool(inserts or updates or stale_ids)
+        if changed:
+            spreadsheet.data_version = (spreadsheet.data_version or 1) + 1
+        message = (f"{len(inserts)} rows appended, {len(updates)} updated, "
+                   f"{len(stale_ids)} removed" if changed else "no changes")
+        logger.info(f"Incremental update of Spreadsheet '{name}': {message}")
+
+        # Do not commit here; let the caller handle it
+        return {'success': True, 'message': message, 'changed': changed}
+
+    except sqlalchemy.exc.OperationalError as e:
+        logger.error(f"OperationalError while updating Spreadsheet '{name}': {e}", exc_info=True)
+        return {'success': False, 'message': 'Database I/O error. Please try again later.'}
+    except Exception as e:
+        logger.exception(f"Unexpected error while updating Spreadsheet '{name}': {e}")
+        return {'success': False, 'message': 'An unexpected error occurred while updating data.'}
@@ -0,0 +1,69 @@
+# app/database/data_retrieval.py
+
+from .models import SpreadsheetRow
+from .connection import db
+from .extra_series import attach_extra_series
+from .series_store import load_series
+from app.instrumentation import span
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+from cryptography.hazmat.primitives.padding import PKCS7
+import base64
+import pandas as pd
+
+import logging
+logger = logging.getLogger(__name__)
+
+ROW_COLUMNS = {column.name for column in SpreadsheetRow.__table__.columns}
+
+def decrypt_value(encrypted_value, key, iv):
+    cipher = Cipher(algorithms.AES(key), modes.CBC(iv))
+    decryptor = cipher.decryptor()
+    decrypted_padded = decryptor.update(base64.b64decode(encrypted_value)) + decryptor.finalize()
+    unpadder = PKCS7(128).unpadder()
+    decrypted_data = unpadder.update(decrypted_padded) + unpadder.finalize()
+    return decrypted_data.decode('utf-8')
+
+def load_spreadsheet_frame(spreadsheet, columns, encryption_key=None):
+    """Load the requested columns of one spreadsheet as a numeric DataFrame, rounded to 4 places.
+
+    Only the requested columns are fetched: from the series store when available,
+    otherwise from SQLite (decrypting with encryption_key for encrypted spreadsheets).
+    Columns that are not on SpreadsheetRow come from the extra series.
+    """
+    stored_columns = [col for col in columns if col in ROW_COLUMNS]
+    extra_columns = [col for col in columns if col not in ROW_COLUMNS]
+
+    df = None
+    rounded_columns = []
+    if not spreadsheet.encrypted:
+        with span('series_read'):
+            series = load_series(spreadsheet, stored_columns)
+        if series is not None:
+            # Wraps the mapped columns without copying them; the store already holds rounded float64
+            df = pd.DataFrame(series, copy=False)
+            rounded_columns = stored_columns
+
+    if df is None:
+        with span('row_fetch'):
+            rows = db.session.query(
+                SpreadsheetRow.row_index, *[getattr(SpreadsheetRow, col) for col in stored_columns]
+            ).filter(SpreadsheetRow.spreadsheet_id == spreadsheet.spreadsheet_id).order_by(
+                SpreadsheetRow.row_index, SpreadsheetRow.id  # Same order as the series store (rebuild_series)
+            ).all()
+            df = pd.DataFrame(rows, columns=['row_index'] + stored_columns)
+        if spreadsheet.encrypted:
+            with span('decrypt'):
+                iv = spreadsheet.iv
+                for col in stored_columns:
+                    df[col] = [decrypt_value(value, encryption_key, iv) if value else None for value in df[col]]
+
+    if extra_columns:
+        with span('row_fetch'):
+            df = attach_extra_series(df, spreadsheet.spreadsheet_id, extra_columns, encryption_key, spreadsheet.iv)
+
+    for col in columns:
+        if col in rounded_columns:
+            continue
+        df[col] = pd.to_numeric(df[col], errors='coerce').round(4)
+    logger.debug("Loaded %d rows of %s for Spreadsheet '%s'.", len(df), columns, spreadsheet.spreadsheet_name)
+    return df
@@ -0,0 +1,57 @@
+# app/database/deduplication.py
+
+from .models import Spreadsheet, ContentHash
+from .connection import db
+import hashlib
+import numpy as np
+
+import logging
+logger = logging.getLogger(__name__)
+
+def hash_file_content(file, chunk_size=1024 * 1024):
+    """Hash the raw uploaded bytes and rewind the file for parsing.
+
+    The digest is kept on the file as content_digest, so parsing the same upload
+    (see sheet_index.load_sheet_index) does not read it a second time.
+    """
+    digest = hashlib.sha256()
+    file.seek(0)
+    for chunk in iter(lambda: file.read(chunk_size), b''):
+        digest.update(chunk)
+    file.seek(0)
+    file.content_digest = digest.hexdigest()
+    return file.content_digest
+
+def hash_payload(df):
+    """Hash the extracted numeric data, so re-saved workbooks with identical data still match."""
+    digest = hashlib.sha256()
+    digest.update('\x1f'.join(map(str, df.columns)).encode())
+    values = np.ascontiguousarray(df.to_numpy(dtype='float64'))
+    values[np.isnan(values)] = np.nan  # Canonicalise NaN bit patterns
+    digest.update(values.tobytes())
+    return digest.hexdigest()
+
+def find_spreadsheets_by_hash(hash_type, digest):
+    """Return the spreadsheets whose stored content has the given hash."""
+    return Spreadsheet.query.join(
+        ContentHash, ContentHash.spreadsheet_id == Spreadsheet.spreadsheet_id
+    ).filter(
+        ContentHash.hash_type == hash_type,
+        ContentHash.digest == digest
+    ).all()
+
+def record_content_hashes(spreadsheet, file_digest=None, payload_digest=None, replace=True):
+    """Store content hashes for a spreadsheet, replacing its previous ones unless replace is False."""
+    known = set()
+    if replace:
+        ContentHash.query.filter_by(spreadsheet_id=spreadsheet.spreadsheet_id).delete(synchronize_session=False)
+    else:
+        known = {(h.hash_type, h.digest) for h in ContentHash.query.filter_by(spreadsheet_id=spreadsheet.spreadsheet_id)}
+    for hash_type, digest in (('file', file_digest), ('payload', payload_digest)):
+        if digest and (hash_type, digest) not in known:
+            db.session.add(ContentHash(
+                spreadsheet_id=spreadsheet.spreadsheet_id,
+                hash_type=hash_type,
+                digest=digest
+            ))
+    logger.debug(f"Recorded content hashes for Spreadsheet '{spreadsheet.spreadsheet_name}'.")
@@ -0,0 +1,181 @@
+# app/database/extra_series.py
+
+from .models import ExtraSeries, Spreadsheet, SpreadsheetRow
+from .connection import db
+from sqlalchemy import func, null
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+from cryptography.hazmat.primitives.padding import PKCS7
+import json
+import numpy as np
+import pandas as pd
+
+import logging
+logger = logging.getLogger(__name__)
+
+def encode_series(values):
+    """Pack a column as float64 when every non-empty value is numeric, otherwise as strings."""
+    series = pd.Series(values).reset_index(drop=True)
+    numeric = pd.to_numeric(series, errors='coerce')
+    if numeric.notna().sum() == series.notna().sum():
+        return 'float64', numeric.to_numpy(dtype='<f8').tobytes()
+    strings = [str(value) if pd.notnull(value) else None for value in series]
+    return 'str', json.dumps(strings).encode()
+
+def encrypt_series_data(data, key, iv):
+    encryptor = Cipher(algorithms.AES(key), modes.CBC(iv)).encryptor()
+    padder = PKCS7(128).padder()
+    return encryptor.update(padder.update(data) + padder.finalize()) + encryptor.finalize()
+
+def decrypt_series_data(data, key, iv):
+    decryptor = Cipher(algorithms.AES(key), modes.CBC(iv)).decryptor()
+    unpadder = PKCS7(128).unpadder()
+    return unpadder.update(decryptor.update(data) + decryptor.finalize()) + unpadder.finalize()
+
+def decode_series(dtype, data, encryption_key=None, iv=None):
+    if dtype.startswith('aes:'):
+        # Series of encrypted spreadsheets are stored as one AES-CBC blob
+        if encryption_key is None:
+            raise ValueError('Encrypted series requires the spreadsheet key.')
+        dtype, data = dtype[4:], decrypt_series_data(data, encryption_key, iv)
+    if dtype == 'float64':
+        return np.frombuffer(data, dtype='<f8')
+    return np.array(json.loads(data.decode()), dtype=object)
+
+def set_extra_series(spreadsheet, column_name, values, encryption_key=None):
+    """Store or replace one whole extra series, encrypted with the spreadsheet's key when one is given."""
+    dtype, data = encode_series(values)
+    if encryption_key is not None:
+        dtype, data = 'aes:' + dtype, encrypt_series_data(data, encryption_key, spreadsheet.iv)
+
+    series = ExtraSeries.query.filter_by(spreadsheet_id=spreadsheet.spreadsheet_id, column_name=column_name).first()
+    if series is None:
+        series = ExtraSeries(spreadsheet_id=spreadsheet.spreadsheet_id, column_name=column_name)
+        db.session.add(series)
+    series.dtype = dtype
+    series.length = len(values)
+    series.data = data
+    return series
+
+def append_extra_series(spreadsheet, df, offset):
+    """Append the columns of df to the spreadsheet's extra series, starting at row position offset.
+
+    Series missing from either side are padded with NaN/None so every series stays
+    aligned with SpreadsheetRow.row_index.
+    """
+    stored = {series.column_name: series for series in
+              ExtraSeries.query.filter_by(spreadsheet_id=spreadsheet.spreadsheet_id).all()}
+    new_length = offset + len(df)
+
+    for column_name in set(stored) | set(df.columns):
+        existing = stored.get(column_name)
+        if existing is not None:
+            head = pd.Series(decode_series(existing.dtype, existing.data))
+        else:
+            head = pd.Series(dtype='float64')
+        head = head.reindex(range(offset))  # Pad series that started later than row 0
+
+        if column_name in df.columns:
+            tail = df[column_name].reset_index(drop=True)
+        else:
+            tail = pd.Series([np.nan] * len(df))
+
+        dtype, data = encode_series(pd.concat([head.astype(object), tail.astype(object)], ignore_index=True))
+        if existing is None:
+            db.session.add(ExtraSeries(
+                spreadsheet_id=spreadsheet.spreadsheet_id,
+                column_name=column_name,
+                dtype=dtype,
+                length=new_length,
+                data=data
+            ))
+        else:
+            existing.dtype = dtype
+            existing.length = new_length
+            existing.data = data
+
+    logger.info(f"Stored {len(df.columns)} extra series for Spreadsheet '{spreadsheet.spreadsheet_name}' at offset {offset}.")
+
+def attach_extra_series(df, spreadsheet_id, columns, encryption_key=None, iv=None):
+    """Add the requested extra series to df, aligned on its 'row_index' column."""
+    stored = {series.column_name: series for series in ExtraSeries.query.filter(
+        ExtraSeries.spreadsheet_id == spreadsheet_id,
+        ExtraSeries.column_name.in_(columns)
+    ).all()}
+    positions = pd.to_numeric(df['row_index'], errors='coerce') if 'row_index' in df.columns else None
+    for column_name in columns:
+        series = stored.get(column_name)
+        if series is None or positions is None:
+            df[column_name] = np.nan
+            continue
+        values = pd.Series(decode_series(series.dtype, series.data, encryption_key, iv))
+        df[column_name] = values.reindex(positions).to_numpy()
+    return df
+
+# Stored dtypes of series that can be plotted
+NUMERIC_DTYPES = ('float64', 'aes:float64')
+
+def get_extra_series_names(numeric_only=False):
+    """Retrieve the distinct names of all stored extra series, or of the float64 ones only."""
+    query = db.session.query(ExtraSeries.column_name)
+    if numeric_only:
+        query = query.filter(ExtraSeries.dtype.in_(NUMERIC_DTYPES))
+    return [row[0] for row in query.distinct().order_by(ExtraSeries.column_name)]
+
+def backfill_extra_series():
+    """Move the custom columns stored per row in SpreadsheetRow.extra_data into extra series.
+
+    extra_data is what /add-data wrote before extra series existed. Rows are taken
+    in (row_index, id) order; rows stored without a row_index are numbered by that
+    order first, so the series stay aligned with the rows. Values are merged into
+    any extra series the spreadsheet already has, then extra_data is cleared.
+    create_app runs it once per database, through run_data_migration.
+    """
+    # Imported here to avoid import cycles (statistics imports this module through data_retrieval)
+    from .series_store import rebuild_series
+    from .statistics import refresh_statistics
+
+    # JSON null is also how the ORM stores an unset extra_data
+    spreadsheet_ids = [spreadsheet_id for spreadsheet_id, in db.session.query(SpreadsheetRow.spreadsheet_id).filter(
+        SpreadsheetRow.extra_data.isnot(None), func.json_type(SpreadsheetRow.extra_data) == 'object'
+    ).distinct()]
+    migrated = 0
+    for spreadsheet_id in spreadsheet_ids:
+        spreadsheet = db.session.get(Spreadsheet, spreadsheet_id)
+        if spreadsheet is None or spreadsheet.encrypted:
+            # Never written for encrypted spreadsheets; storing plain series for one would leak its data
+            logger.warning(f"Leaving the extra_data of spreadsheet {spreadsheet_id} unmigrated.")
+            continue
+        rows = SpreadsheetRow.query.filter_by(spreadsheet_id=spreadsheet_id).order_by(
+            SpreadsheetRow.row_index, SpreadsheetRow.id).all()
+        if any(row.row_index is None for row in rows):
+            for position, row in enumerate(rows):
+                row.row_index = position
+
+        legacy = pd.DataFrame([row.extra_data or {} for row in rows], index=[row.row_index for row in rows])
+        stored = {series.column_name: series for series in
+                  ExtraSeries.query.filter_by(spreadsheet_id=spreadsheet_id).all()}
+        length = max([len(rows)] + [series.length for series in stored.values()])
+        for column_name in legacy.columns:
+            values = legacy[column_name].reindex(range(length)).astype(object)
+            existing = stored.get(column_name)
+            if existing is not None:
+                # Values appended since the change win over the legacy ones
+                values = pd.Series(decode_series(existing.dtype, existing.data)).astype(object) \
+                    .reindex(range(length)).combine_first(values)
+            set_extra_series(spreadsheet, column_name, values)
+        for column_name, series in stored.items():
+            if column_name not in legacy.columns and series.length < length:
+                # Keep every series as long as the rows it is aligned with
+                set_extra_series(spreadsheet, column_name,
+                                 pd.Series(decode_series(series.dtype, series.data)).reindex(range(length)))
+
+        SpreadsheetRow.query.filter_by(spreadsheet_id=spreadsheet_id).update(
+            {SpreadsheetRow.extra_data: null()}, synchronize_session=False)
+        spreadsheet.data_version = (spreadsheet.data_version or 1) + 1
+        db.session.commit()
+        rebuild_series(spreadsheet)
+        refresh_statistics(spreadsheet)
+        db.session.commit()
+        migrated += 1
+    if migrated:
+        logger.info(f"Moved the extra_data of {migrated} spreadsheets into extra series.")
@@ -2,6 +2,10 @@
 
 from .models import Spreadsheet, Instance, SpreadsheetInstance, SpreadsheetRow
 from .connection import db
+from sqlalchemy import func, or_, and_
+import base64
+import json
+from .extra_series import get_extra_series_names
 
 def get_tables():
     """Retrieve all spreadsheet names and encryption status from the database."""
@@ -13,8 +17,8 @@ def get_tables():
 
 
 def get_instances():
-    """Retrieve all instances from the database."""
-    instances = Instance.query.all()
+    """Retrieve all instances from the database, numeric values in numeric order."""
+    instances = Instance.query.order_by(Instance.instance_name, Instance.numeric_value, Instance.instance_value).all()
     instance_dict = {}
     for instance in instances:
         key = instance.instance_name
@@ -25,7 +29,163 @@ def get_instances():
             instance_dict[key] = [value]
     return instance_dict
 
+# Spreadsheets per page of /get-tables and instance values per page of /get-instances
+PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# The spreadsheet lists of the selection form, by their encrypted flag
+TABLE_GROUPS = {'public': False, 'encrypted': True}
+
+def encode_cursor(values):
+    """Opaque cursor of the last row of a page: its sort key as URL-safe base64 JSON."""
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+def decode_cursor(cursor, length):
+    """Sort key of a cursor from encode_cursor(). Raises ValueError if it is malformed."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, UnicodeError):
+        raise ValueError("Invalid page cursor.")
+    if not isinstance(values, list) or len(values) != length:
+        raise ValueError("Invalid page cursor.")
+    return values
+
+def prefix_filter(column, prefix):
+    """column starts with prefix, as a range so it is answered from an index on column.
+
+    LIKE would be case-insensitive in SQLite and could not use the (binary) index;
+    the range matches case-sensitively.
+    """
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    return and_(column >= prefix, column < upper)
+
+def list_tables(limit=PAGE_SIZE, cursor=None, prefix=None, group=None):
+    """A page of spreadsheets in name order, optionally only the names starting with prefix.
+
+    group ('public' or 'encrypted', see TABLE_GROUPS) restricts the page to one
+    list. Pages are keyed on the name (the unique index, or ix_spreadsheets_encrypted_name
+    within a group), so a page costs the same however deep it is. Returns
+    (tables, next_cursor); next_cursor is None on the last page.
+    """
+    query = db.session.query(Spreadsheet.spreadsheet_name, Spreadsheet.encrypted)
+    if group is not None:
+        query = query.filter(Spreadsheet.encrypted == TABLE_GROUPS[group])
+    if prefix:
+        query = query.filter(prefix_filter(Spreadsheet.spreadsheet_name, prefix))
+    if cursor:
+        last_name, = decode_cursor(cursor, 1)
+        query = query.filter(Spreadsheet.spreadsheet_name > last_name)
+    rows = query.order_by(Spreadsheet.spreadsheet_name).limit(limit + 1).all()
+
+    tables = [{"spreadsheet_name": name, "encrypted": encrypted} for name, encrypted in rows[:limit]]
+    next_cursor = encode_cursor([tables[-1]["spreadsheet_name"]]) if len(rows) > limit else None
+    return tables, next_cursor
+
+def get_instance_names():
+    """Names of all instances, e.g. ['Density', 'Drainage']."""
+    return [name for name, in db.session.query(Instance.instance_name).distinct().order_by(Instance.instance_name)]
+
+def list_instance_values(name, limit=PAGE_SIZE, cursor=None, prefix=None):
+    """A page of the values of instance name, numeric values in numeric order like get_instances().
+
+    Keyed on (numeric_value, instance_value) through ix_instances_name_numeric_value.
+    Returns (values, next_cursor); next_cursor is None on the last page.
+    """
+    query = db.session.query(Instance.numeric_value, Instance.instance_value).filter(Instance.instance_name == name)
+    if prefix:
+        query = query.filter(prefix_filter(Instance.instance_value, prefix))
+    if cursor:
+        last_numeric, last_value = decode_cursor(cursor, 2)
+        if last_numeric is None:
+            # Non-numeric values sort first (NULLs first in SQLite)
+            query = query.filter(or_(
+                and_(Instance.numeric_value.is_(None), Instance.instance_value > last_value),
+                Instance.numeric_value.isnot(None)
+            ))
+        else:
+            query = query.filter(or_(
+                Instance.numeric_value > last_numeric,
+                and_(Instance.numeric_value == last_numeric, Instance.instance_value > last_value)
+            ))
+    rows = query.order_by(Instance.numeric_value, Instance.instance_value).limit(limit + 1).all()
+
+    values = [value for _, value in rows[:limit]]
+    next_cursor = encode_cursor(list(rows[limit - 1])) if len(rows) > limit else None
+    return values, next_cursor
+
+def list_instances(limit=PAGE_SIZE):
+    """The first page of values of every instance: ({name: values}, {name: next_cursor})."""
+    instances, next_cursors = {}, {}
+    for name in get_instance_names():
+        instances[name], next_cursors[name] = list_instance_values(name, limit)
+    return instances, next_cursors
+
+def get_instance_ranges():
+    """{instance name: {'min': ..., 'max': ...}} for instances with numeric values, for range filters."""
+    ranges = db.session.query(
+        Instance.instance_name, func.min(Instance.numeric_value), func.max(Instance.numeric_value)
+    ).filter(Instance.numeric_value.isnot(None)).group_by(Instance.instance_name)
+    return {name: {'min': low, 'max': high} for name, low, high in ranges}
+
+def parse_instance_filters(instances_json):
+    """Parse '[{"name": "Density", "values": ["loose"], "min": 1.5, "max": 1.7}, ...]'.
+
+    values, min and max are each optional. Returns (name, values, min, max) tuples.
+    Raises ValueError on malformed input.
+    """
+    if not instances_json:
+        return []
+    try:
+        instances = json.loads(instances_json)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Invalid instance filter: {e}")
+    if not isinstance(instances, list):
+        raise ValueError("Instance filters must be a list.")
+
+    parsed = []
+    for instance in instances:
+        if not isinstance(instance, dict) or not isinstance(instance.get('name'), str):
+            raise ValueError("Each instance filter needs a 'name'.")
+        values = instance.get('values') or []
+        if not isinstance(values, list):
+            raise ValueError(f"Instance filter '{instance['name']}' values must be a list.")
+        bounds = []
+        for bound in ('min', 'max'):
+            value = instance.get(bound)
+            if value in (None, ''):
+                bounds.append(None)
+                continue
+            try:
+                bounds.append(float(value))
+            except (TypeError, ValueError):
+                raise ValueError(f"Instance filter '{instance['name']}' has a non-numeric {bound}.")
+        parsed.append((instance['name'], [str(value) for value in values], bounds[0], bounds[1]))
+    return parsed
+
+def find_instance_ids(name, values=None, minimum=None, maximum=None):
+    """IDs of the instances called name whose value is one of values or lies within [minimum, maximum]."""
+    conditions = []
+    if values:
+        conditions.append(Instance.instance_value.in_(values))
+    if minimum is not None or maximum is not None:
+        # Served by ix_instances_name_numeric as a range scan
+        in_range = Instance.numeric_value.isnot(None)
+        if minimum is not None:
+            in_range &= Instance.numeric_value >= minimum
+        if maximum is not None:
+            in_range &= Instance.numeric_value <= maximum
+        conditions.append(in_range)
+    if not conditions:
+        return []
+    query = db.session.query(Instance.instance_id).filter(Instance.instance_name == name, or_(*conditions))
+    return [row[0] for row in query]
+
 def get_columns():
-    """Retrieve column names from the SpreadsheetRow model."""
-    return [column.name for column in SpreadsheetRow.__table__.columns if column.name != 'id']
+    """Retrieve column names from the SpreadsheetRow model, followed by the numeric extra series.
+
+    String extra series are stored too but cannot be plotted, so they are left out.
+    """
+    columns = [column.name for column in SpreadsheetRow.__table__.columns
+               if column.name not in ('id', 'row_index', 'row_hash', 'extra_data')]
+    return columns + [name for name in get_extra_series_names(numeric_only=True) if name not in columns]
 
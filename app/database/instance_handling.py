@@ -2,11 +2,21 @@
 
 from .models import Instance, SpreadsheetInstance, Spreadsheet
 from .connection import db
+import math
 import pandas as pd
+from app.logging_config import SAMPLED
 
 import logging
 logger = logging.getLogger(__name__)
 
+def parse_numeric(value):
+    """The instance value as a float, or None when it is not a finite number ('loose', 'drained', ...)."""
+    try:
+        number = float(str(value).strip())
+    except ValueError:
+        return None
+    return number if math.isfinite(number) else None
+
 def find_instances(file):
     instances = {}
 
@@ -30,7 +40,7 @@ def find_instances(file):
     for name, value in zip(names, values):
         if pd.notnull(name) and pd.notnull(value):
             instances[str(name).strip()] = str(value).strip()
-            logger.debug(f"Found instance: {name} = {value}")
+            logger.debug("Found instance: %s = %s", name, value)
 
     # Handle 'anisotropy' special case
     try:
@@ -47,7 +57,7 @@ def find_instances(file):
     logger.info(f"Total instances found: {len(instances)}")
     return instances
 
-def insert_instances_to_db(name, instances):
+def insert_instances_to_db(name, instances, replace_existing=False):
     if not instances:
         logger.warning(f"No instances to insert for Spreadsheet '{name}'.")
         return
@@ -58,6 +68,7 @@ def insert_instances_to_db(name, instances):
             logger.error(f"Spreadsheet '{name}' not found in the database.")
             return
 
+        current_instance_ids = set()
         for instance_name, instance_value in instances.items():
             # Fetch or create the Instance object
             instance_obj = Instance.query.filter_by(
@@ -68,10 +79,13 @@ def insert_instances_to_db(name, instances):
             if not instance_obj:
                 instance_obj = Instance(
                     instance_name=instance_name,
-                    instance_value=instance_value
+                    instance_value=instance_value,
+                    numeric_value=parse_numeric(instance_value)
                 )
                 db.session.add(instance_obj)
-                logger.debug(f"Added new Instance: {instance_name} = {instance_value}")
+                db.session.flush()  # Flush to assign instance_id
+                logger.debug("Added new Instance: %s = %s", instance_name, instance_value)
+            current_instance_ids.add(instance_obj.instance_id)
 
             # Check if association already exists
             association = SpreadsheetInstance.query.filter_by(
@@ -85,9 +99,20 @@ def insert_instances_to_db(name, instances):
                     instance_id=instance_obj.instance_id
                 )
                 db.session.add(association)
-                logger.debug(f"Associated Instance '{instance_name} = {instance_value}' with Spreadsheet '{name}'.")
+                logger.debug("Associated Instance '%s = %s' with Spreadsheet '%s'.",
+                             instance_name, instance_value, name, extra=SAMPLED)
             else:
-                logger.debug(f"Association already exists for Instance '{instance_name} = {instance_value}' with Spreadsheet '{name}'.")
+                logger.debug("Association already exists for Instance '%s = %s' with Spreadsheet '%s'.",
+                             instance_name, instance_value, name, extra=SAMPLED)
+
+        if replace_existing:
+            # Drop associations to values the re-uploaded sheet no longer has
+            stale = SpreadsheetInstance.query.filter(
+                SpreadsheetInstance.spreadsheet_id == spreadsheet.spreadsheet_id,
+                SpreadsheetInstance.instance_id.notin_(current_instance_ids)
+            ).delete(synchronize_session=False)
+            if stale:
+                logger.info(f"Removed {stale} outdated instance associations for Spreadsheet '{name}'.")
 
         logger.info(f"All instances for Spreadsheet '{name}' have been processed and added to the session.")
 
@@ -95,3 +120,18 @@ def insert_instances_to_db(name, instances):
         logger.exception(f"Error inserting instances into the database for Spreadsheet '{name}': {e}")
         raise  # Propagate exception to handle it in the calling function
 
+
+def backfill_numeric_values():
+    """Fill Instance.numeric_value for instances stored before it existed.
+
+    Non-numeric values stay NULL, so create_app runs it once per database through run_data_migration.
+    """
+    updated = 0
+    for instance in Instance.query.filter(Instance.numeric_value.is_(None)):
+        number = parse_numeric(instance.instance_value)
+        if number is not None:
+            instance.numeric_value = number
+            updated += 1
+    if updated:
+        db.session.commit()
+        logger.info(f"Stored numeric values for {updated} existing instances.")
@@ -0,0 +1,120 @@
+# app/database/key_management.py
+
+"""Envelope encryption for encrypted spreadsheets.
+
+Each encrypted spreadsheet has its own random data key (DEK) that encrypts its
+rows. The DEK is stored wrapped (RFC 3394 AES key wrap) by a key-encryption key
+(KEK) derived from the password and `Spreadsheet.kek_salt`. All spreadsheets of
+one upload share a kek_salt, so unlocking any number of them with the same
+password costs a single PBKDF2 run. A wrong password fails the unwrap integrity
+check, so no separate password hash is needed.
+
+Spreadsheets stored before this scheme (key derived directly from the password
+and key_salt, checked against password_hash) still unlock, and are re-wrapped
+on first unlock so later requests take the fast path. KeyRing.unlock only
+changes the spreadsheet; the main blueprint commits it when the request ends
+(persist_rewrapped_keys), and ingestion commits it with the upload.
+"""
+
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+from cryptography.hazmat.primitives.keywrap import aes_key_wrap, aes_key_unwrap, InvalidUnwrap
+from flask import g, has_app_context
+from app.instrumentation import span
+import hashlib
+import hmac
+import os
+
+import logging
+logger = logging.getLogger(__name__)
+
+KDF_ITERATIONS = 100000
+
+def derive_key(password, salt):
+    # Use PBKDF2HMAC to derive a key from the password
+    kdf = PBKDF2HMAC(
+        algorithm=hashes.SHA256(),
+        length=32,  # AES-256 key size
+        salt=salt,
+        iterations=KDF_ITERATIONS,
+    )
+    with span('key_derivation'):
+        return kdf.derive(password.encode())
+
+def hash_password(password, salt=None):
+    if not salt:
+        salt = os.urandom(16)
+    with span('key_derivation'):
+        pwd_hash = hashlib.pbkdf2_hmac('sha256', password.encode(), salt, KDF_ITERATIONS)
+    return salt, pwd_hash
+
+def verify_password(stored_salt, stored_hash, password_attempt):
+    with span('key_derivation'):
+        pwd_hash = hashlib.pbkdf2_hmac('sha256', password_attempt.encode(), stored_salt, KDF_ITERATIONS)
+    return hmac.compare_digest(pwd_hash, stored_hash)
+
+def new_data_key(kek):
+    """A fresh random data key and its wrapped form for Spreadsheet.wrapped_key."""
+    data_key = os.urandom(32)
+    return data_key, aes_key_wrap(kek, data_key)
+
+class KeyRing:
+    """Caches derived keys for the duration of one request (or one CLI batch)."""
+
+    def __init__(self):
+        self._keks = {}
+        self._data_keys = {}
+        self._batch_salts = {}
+        self.dirty = False  # Legacy spreadsheets were re-wrapped and need committing
+
+    def kek(self, password, salt):
+        cache_key = (password, salt)
+        if cache_key not in self._keks:
+            self._keks[cache_key] = derive_key(password, salt)
+        return self._keks[cache_key]
+
+    def batch_salt(self, password):
+        """The kek_salt shared by every spreadsheet this batch encrypts with password."""
+        if password not in self._batch_salts:
+            self._batch_salts[password] = os.urandom(16)
+        return self._batch_salts[password]
+
+    def wrap_new_key(self, password):
+        """Return (kek_salt, data_key, wrapped_key) for a new encrypted spreadsheet."""
+        salt = self.batch_salt(password)
+        data_key, wrapped_key = new_data_key(self.kek(password, salt))
+        return salt, data_key, wrapped_key
+
+    def unlock(self, spreadsheet, password):
+        """The data key of an encrypted spreadsheet, or None if the password is wrong."""
+        if not password:
+            return None
+        cache_key = (spreadsheet.spreadsheet_id, password)
+        if cache_key in self._data_keys:
+            return self._data_keys[cache_key]
+
+        if spreadsheet.wrapped_key:
+            try:
+                data_key = aes_key_unwrap(self.kek(password, spreadsheet.kek_salt), spreadsheet.wrapped_key)
+            except InvalidUnwrap:
+                return None
+        else:
+            if not verify_password(spreadsheet.password_salt, spreadsheet.password_hash, password):
+                return None
+            data_key = derive_key(password, spreadsheet.key_salt)
+            # Wrap the legacy key under this batch's KEK so the next unlock costs one shared KDF
+            spreadsheet.kek_salt = self.batch_salt(password)
+            spreadsheet.wrapped_key = aes_key_wrap(self.kek(password, spreadsheet.kek_salt), data_key)
+            self.dirty = True
+            logger.info(f"Re-wrapped the key of legacy encrypted Spreadsheet '{spreadsheet.spreadsheet_name}'.")
+
+        self._data_keys[cache_key] = data_key
+        return data_key
+
+def get_key_ring():
+    """The KeyRing of the current request, or a fresh one outside a request."""
+    if not has_app_context():
+        return KeyRing()
+    if 'key_ring' not in g:
+        g.key_ring = KeyRing()
+    return g.key_ring
@@ -0,0 +1,115 @@
+# app/database/maintenance.py
+
+"""Deleting spreadsheets and giving the freed space back to the file system.
+
+Databases are created with auto_vacuum=INCREMENTAL, so pages freed by deletes
+can be returned with a cheap PRAGMA incremental_vacuum instead of rewriting
+the whole file. Databases created before that setting need one full VACUUM
+(maintain_database(full=True), or `flask maintain-db --full`) to switch over.
+"""
+
+import os
+
+from sqlalchemy import select
+
+from .connection import db, execute_outside_transaction
+from .models import (
+    Spreadsheet, SpreadsheetRow, Instance, SpreadsheetInstance, ContentHash, ExtraSeries, SpreadsheetStatistic
+)
+from .series_store import remove_series
+
+import logging
+logger = logging.getLogger(__name__)
+
+# Stays below SQLite's limit on bound parameters per statement
+CHUNK_SIZE = 500
+
+# Rows sampled per index by ANALYZE; keeps it fast on large databases on the NAS
+ANALYSIS_LIMIT = 1000
+
+AUTO_VACUUM_INCREMENTAL = 2
+
+# Everything stored per spreadsheet, children before the spreadsheet itself
+DEPENDENT_MODELS = (SpreadsheetRow, ExtraSeries, SpreadsheetStatistic, ContentHash, SpreadsheetInstance)
+
+def _chunks(values):
+    values = list(values)
+    for start in range(0, len(values), CHUNK_SIZE):
+        yield values[start:start + CHUNK_SIZE]
+
+def delete_spreadsheets(spreadsheet_ids):
+    """Bulk-delete spreadsheets with their rows, extra series, statistics, hashes and instance links.
+
+    Instances that no remaining spreadsheet uses are deleted too. Runs in the
+    caller's transaction and does not commit; series files are left to
+    remove_spreadsheets(), which only removes them once the delete is committed.
+    """
+    spreadsheet_ids = list(spreadsheet_ids)
+    linked_instances = set()
+    for chunk in _chunks(spreadsheet_ids):
+        linked_instances.update(instance_id for instance_id, in db.session.query(SpreadsheetInstance.instance_id).filter(
+            SpreadsheetInstance.spreadsheet_id.in_(chunk)).distinct())
+        for model in DEPENDENT_MODELS:
+            model.query.filter(model.spreadsheet_id.in_(chunk)).delete(synchronize_session=False)
+        Spreadsheet.query.filter(Spreadsheet.spreadsheet_id.in_(chunk)).delete(synchronize_session=False)
+
+    still_linked = select(SpreadsheetInstance.instance_id)
+    orphans = 0
+    for chunk in _chunks(sorted(linked_instances)):
+        orphans += Instance.query.filter(
+            Instance.instance_id.in_(chunk), Instance.instance_id.not_in(still_linked)
+        ).delete(synchronize_session=False)
+    logger.info(f"Deleted {len(spreadsheet_ids)} spreadsheets and {orphans} orphaned instances.")
+    return orphans
+
+def remove_spreadsheets(spreadsheets):
+    """Delete spreadsheets in one transaction, then their series files.
+
+    The freed pages are reclaimed by the scheduled maintain_database() (`flask
+    maintain-db`), not here: a vacuum and ANALYZE on the NAS would hold the lock
+    for every delete.
+    """
+    spreadsheet_ids = [spreadsheet.spreadsheet_id for spreadsheet in spreadsheets]
+    try:
+        delete_spreadsheets(spreadsheet_ids)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    db.session.expire_all()  # The bulk deletes bypassed the identity map
+    for spreadsheet_id in spreadsheet_ids:
+        remove_series(spreadsheet_id)
+
+def database_stats(engine):
+    """{'size', 'free_pages', 'page_size', 'auto_vacuum'} of a SQLite database."""
+    size = None
+    if engine.url.database and os.path.exists(engine.url.database):
+        size = os.path.getsize(engine.url.database)
+    with engine.connect() as connection:
+        values = [connection.exec_driver_sql(f'PRAGMA {pragma}').scalar()
+                  for pragma in ('page_size', 'freelist_count', 'auto_vacuum')]
+    return {'size': size, 'page_size': values[0], 'free_pages': values[1], 'auto_vacuum': values[2]}
+
+def maintain_database(engine, full=False, analyze=True):
+    """Return free pages to the file system and refresh the query planner statistics.
+
+    With full=True the whole file is rewritten by VACUUM, which also switches
+    older databases to incremental auto_vacuum; otherwise only the free pages are
+    released, and only when the database already uses incremental auto_vacuum.
+    Returns the database_stats() before and after.
+    """
+    if engine.dialect.name != 'sqlite':
+        return None
+    before = database_stats(engine)
+    statements = []
+    if full:
+        statements += ['PRAGMA auto_vacuum = INCREMENTAL', 'VACUUM']
+    elif before['auto_vacuum'] == AUTO_VACUUM_INCREMENTAL and before['free_pages']:
+        statements.append('PRAGMA incremental_vacuum')
+    if analyze:
+        statements += [f'PRAGMA analysis_limit = {ANALYSIS_LIMIT}', 'ANALYZE']
+    if statements:
+        execute_outside_transaction(engine, statements)
+    after = database_stats(engine)
+    logger.info(f"Database maintenance of {engine.url.database}: {before} -> {after}.")
+    return {'before': before, 'after': after}
@@ -1,6 +1,7 @@
 # app/database/models.py
 
 from sqlalchemy.dialects.sqlite import JSON
+from datetime import datetime
 from .connection import db
 
 class Spreadsheet(db.Model):
@@ -14,6 +15,13 @@ class Spreadsheet(db.Model):
     iv = db.Column(db.LargeBinary, nullable=True)
     password_salt = db.Column(db.LargeBinary, nullable=True)  # Add this line
     password_hash = db.Column(db.LargeBinary, nullable=True)
+    # Envelope encryption: the random data key wrapped by a key derived from the password and kek_salt
+    kek_salt = db.Column(db.LargeBinary, nullable=True)
+    wrapped_key = db.Column(db.LargeBinary, nullable=True)
+    # Bumped whenever the stored rows change so cached copies can be invalidated
+    data_version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    # Input variables and membrane correction table extracted at ingest (JSON, encrypted like the rows)
+    test_parameters = db.Column(db.Text, nullable=True)
     rows = db.relationship('SpreadsheetRow', backref='spreadsheet', lazy=True)
     instances = db.relationship(
         'Instance',
@@ -21,6 +29,11 @@ class Spreadsheet(db.Model):
         backref=db.backref('spreadsheets', lazy='dynamic')
     )
 
+    __table_args__ = (
+        # Pages of the public or encrypted spreadsheet list in name order (list_tables)
+        db.Index('ix_spreadsheets_encrypted_name', 'encrypted', 'spreadsheet_name'),
+    )
+
 class SpreadsheetRow(db.Model):
     __tablename__ = 'spreadsheet_rows'
     id = db.Column(db.Integer, primary_key=True)
@@ -34,12 +47,65 @@ class SpreadsheetRow(db.Model):
     q = db.Column(db.Text)
     e = db.Column(db.Text)
     extra_data = db.Column(JSON)  # Add this line
+    # Position of the row in the source sheet and a fingerprint of its values,
+    # used to diff re-uploads of the same spreadsheet
+    row_index = db.Column(db.Integer)
+    row_hash = db.Column(db.String)
+
+    __table_args__ = (
+        db.Index('ix_spreadsheet_rows_spreadsheet_row', 'spreadsheet_id', 'row_index'),
+    )
+
+class ExtraSeries(db.Model):
+    __tablename__ = 'extra_series'
+    id = db.Column(db.Integer, primary_key=True)
+    spreadsheet_id = db.Column(db.Integer, db.ForeignKey('spreadsheets.spreadsheet_id'), nullable=False)
+    column_name = db.Column(db.String, nullable=False)
+    dtype = db.Column(db.String, nullable=False)  # 'float64' (packed little-endian) or 'str' (JSON list)
+    length = db.Column(db.Integer, nullable=False)
+    # One whole column per spreadsheet, indexed by SpreadsheetRow.row_index
+    data = db.Column(db.LargeBinary, nullable=False)
+
+    __table_args__ = (
+        db.UniqueConstraint('spreadsheet_id', 'column_name', name='uq_extra_series_spreadsheet_column'),
+    )
+
+class SpreadsheetStatistic(db.Model):
+    __tablename__ = 'spreadsheet_statistics'
+    id = db.Column(db.Integer, primary_key=True)
+    spreadsheet_id = db.Column(db.Integer, db.ForeignKey('spreadsheets.spreadsheet_id'), nullable=False)
+    name = db.Column(db.String, nullable=False)  # 'row_count', 'q_max', 'e_min', 'qmax', 'axial_strain_at_qmax', ...
+    value = db.Column(db.Float, nullable=False)
+
+    __table_args__ = (
+        db.UniqueConstraint('spreadsheet_id', 'name', name='uq_spreadsheet_statistics_spreadsheet_name'),
+        db.Index('ix_spreadsheet_statistics_name_value', 'name', 'value'),
+    )
+
+class ContentHash(db.Model):
+    __tablename__ = 'content_hashes'
+    id = db.Column(db.Integer, primary_key=True)
+    spreadsheet_id = db.Column(db.Integer, db.ForeignKey('spreadsheets.spreadsheet_id'), nullable=False)
+    hash_type = db.Column(db.String, nullable=False)  # 'file' (uploaded bytes) or 'payload' (extracted data)
+    digest = db.Column(db.String, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_content_hashes_type_digest', 'hash_type', 'digest'),
+    )
 
 class Instance(db.Model):
     __tablename__ = 'instances'
     instance_id = db.Column(db.Integer, primary_key=True)
     instance_name = db.Column(db.String, nullable=False)
     instance_value = db.Column(db.String, nullable=False)
+    # instance_value as a number when it parses as one, so filters can use index range scans
+    numeric_value = db.Column(db.Float, nullable=True)
+
+    __table_args__ = (
+        db.Index('ix_instances_name_numeric', 'instance_name', 'numeric_value'),
+        # Pages of the values of one instance (list_instance_values)
+        db.Index('ix_instances_name_numeric_value', 'instance_name', 'numeric_value', 'instance_value'),
+    )
 
 class SpreadsheetInstance(db.Model):
     __tablename__ = 'spreadsheet_instances'
@@ -47,3 +113,30 @@ class SpreadsheetInstance(db.Model):
     spreadsheet_id = db.Column(db.Integer, db.ForeignKey('spreadsheets.spreadsheet_id'), nullable=False)
     instance_id = db.Column(db.Integer, db.ForeignKey('instances.instance_id'), nullable=False)
 
+
+class Project(db.Model):
+    """A project (or campaign) whose spreadsheets live in their own SQLite shard, see sharding.py."""
+    __bind_key__ = 'catalog'
+    __tablename__ = 'projects'
+    project_id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String, unique=True, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+class IngestCheckpoint(db.Model):
+    """A workbook of the watched folder as last ingested, so `flask ingest` resumes without re-parsing it."""
+    __tablename__ = 'ingest_checkpoints'
+    id = db.Column(db.Integer, primary_key=True)
+    path = db.Column(db.String, unique=True, nullable=False)
+    size = db.Column(db.Integer, nullable=False)
+    mtime = db.Column(db.Float, nullable=False)
+    file_digest = db.Column(db.String, nullable=True)
+    status = db.Column(db.String, nullable=False)  # 'stored', 'updated', 'skipped' or 'failed'
+    spreadsheet_name = db.Column(db.String, nullable=True)
+    message = db.Column(db.String, nullable=True)
+    ingested_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+class DataMigration(db.Model):
+    """A one-off data migration that has completed on this database, see schema.run_data_migration."""
+    __tablename__ = 'data_migrations'
+    name = db.Column(db.String, primary_key=True)
+    completed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
@@ -0,0 +1,52 @@
+# app/database/schema.py
+
+from sqlalchemy import inspect, text
+from .connection import db
+from .models import DataMigration
+import logging
+
+logger = logging.getLogger(__name__)
+
+def upgrade_schema(engine=None):
+    """Add columns and indexes that db.create_all() skips on tables that already exist.
+
+    The app has no migration tool; new model columns are added as nullable (or
+    server-defaulted) columns so existing databases on the NAS keep working.
+    Upgrades the default database unless a project shard's engine is given.
+    """
+    engine = engine or db.engine
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+
+    with engine.begin() as connection:
+        for table in db.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+
+            existing_columns = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                statement = f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'
+                if column.server_default is not None:
+                    statement += f" DEFAULT {column.server_default.arg}"
+                connection.execute(text(statement))
+                logger.info(f"Added missing column '{table.name}.{column.name}'.")
+
+            for index in table.indexes:
+                index.create(bind=connection, checkfirst=True)
+
+def run_data_migration(name, migrate):
+    """Run migrate() on the default database once, recording it in data_migrations when it completes.
+
+    For backfills of rows stored by older versions of the app, which would otherwise
+    rescan the same tables on every startup. Returns whether migrate() ran.
+    """
+    if db.session.get(DataMigration, name) is not None:
+        return False
+    migrate()
+    db.session.add(DataMigration(name=name))
+    db.session.commit()
+    logger.info(f"Completed data migration '{name}'.")
+    return True
@@ -0,0 +1,115 @@
+# app/database/series_store.py
+
+from .models import SpreadsheetRow
+from .sharding import project_series_path
+import os
+import numpy as np
+import pandas as pd
+
+import logging
+logger = logging.getLogger(__name__)
+
+# Fixed column layout of every stored series file
+SERIES_COLUMNS = ['time_start_of_stage', 'shear_induced_PWP', 'axial_strain', 'vol_strain',
+                  'induced_PWP', 'p', 'q', 'e']
+
+def series_store_path():
+    """Directory of the current project's binary series store, or None when it is disabled."""
+    base_path = os.getenv('SERIES_STORE_PATH')
+    return project_series_path(base_path) if base_path else None
+
+def _series_file(spreadsheet, version=None):
+    version = spreadsheet.data_version if version is None else version
+    return os.path.join(series_store_path(), str(spreadsheet.spreadsheet_id), f'v{version or 1}.npy')
+
+def _storable(spreadsheet):
+    # Decrypted values must never be written to disk
+    return series_store_path() is not None and not spreadsheet.encrypted
+
+def write_series(spreadsheet, df):
+    """Write a spreadsheet's numeric columns as one float64 .npy file for its current data_version.
+
+    Row i of the file is the row with row_index i. Values are rounded to 4 places, as
+    /plot shows them, and stored column-major so that each column is one contiguous
+    range of the file. Older versions are removed once the new file is in place. The
+    store is a read accelerator, so failures are only logged.
+    """
+    if not _storable(spreadsheet):
+        return False
+    path = _series_file(spreadsheet)
+    try:
+        values = df.reindex(columns=SERIES_COLUMNS).apply(pd.to_numeric, errors='coerce').to_numpy(dtype='<f8')
+        values = np.asfortranarray(values.round(4))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f'{path}.{os.getpid()}.tmp'
+        with open(temp_path, 'wb') as f:
+            np.save(f, values)
+        os.replace(temp_path, path)
+
+        for entry in os.scandir(os.path.dirname(path)):
+            if entry.name.endswith('.npy') and entry.path != path:
+                os.remove(entry.path)
+        logger.info(f"Wrote series file for Spreadsheet '{spreadsheet.spreadsheet_name}': {values.shape[0]} rows.")
+        return True
+    except Exception as e:
+        logger.exception(f"Failed to write series file for Spreadsheet '{spreadsheet.spreadsheet_name}': {e}")
+        return False
+
+def rebuild_series(spreadsheet):
+    """Write the series file from the rows stored in SQLite."""
+    if not _storable(spreadsheet):
+        return False
+    rows = SpreadsheetRow.query.filter_by(
+        spreadsheet_id=spreadsheet.spreadsheet_id
+    ).order_by(SpreadsheetRow.row_index, SpreadsheetRow.id).with_entities(
+        *[getattr(SpreadsheetRow, column) for column in SERIES_COLUMNS]
+    ).all()
+    if not rows:
+        return False
+    return write_series(spreadsheet, pd.DataFrame(rows, columns=SERIES_COLUMNS))
+
+def _map_series_file(path):
+    try:
+        values = np.load(path, mmap_mode='r')
+    except Exception as e:
+        logger.exception(f"Failed to read series file '{path}': {e}")
+        return None
+    if values.ndim != 2 or values.shape[1] != len(SERIES_COLUMNS):
+        logger.error(f"Series file '{path}' has unexpected shape {values.shape}. Ignoring it.")
+        return None
+    return values
+
+def load_series(spreadsheet, columns):
+    """Memory-map a spreadsheet's series file and return {column: values} for the requested columns
+    plus 'row_index', or None if unavailable.
+
+    The values are read-only views into the mapped file, so only the pages of the
+    requested columns are read. Files written row-major by earlier versions are
+    rewritten once.
+    """
+    if not _storable(spreadsheet) or any(column not in SERIES_COLUMNS for column in columns):
+        return None
+    path = _series_file(spreadsheet)
+    if not os.path.exists(path) and not rebuild_series(spreadsheet):
+        return None
+    values = _map_series_file(path)
+    if values is not None and not values.flags.f_contiguous:
+        logger.info(f"Rewriting row-major series file '{path}' column-major.")
+        del values  # Release the mapping before the file is replaced
+        values = _map_series_file(path) if rebuild_series(spreadsheet) else None
+    if values is None:
+        return None
+
+    series = {column: values[:, SERIES_COLUMNS.index(column)] for column in columns}
+    series['row_index'] = np.arange(values.shape[0])
+    return series
+
+def remove_series(spreadsheet_id):
+    """Delete every stored series file of a spreadsheet."""
+    if series_store_path() is None:
+        return
+    directory = os.path.join(series_store_path(), str(spreadsheet_id))
+    if os.path.isdir(directory):
+        for entry in os.scandir(directory):
+            os.remove(entry.path)
+        os.rmdir(directory)
@@ -0,0 +1,149 @@
+# app/database/sharding.py
+
+"""Per-project SQLite shards.
+
+Spreadsheets of the default project stay in DATABASE_PATH. Every other project
+has its own SQLite file under PROJECTS_PATH with the same schema, and the small
+catalog database (CATALOG_PATH) lists the projects. activate_project() routes
+db.session to a project's shard for the rest of the request. Each shard also
+has its own lockfile and series store directory, so uploads to one project do
+not wait for plots of another.
+
+Queries across projects ATTACH the shards to one connection on demand, see
+query_projects().
+"""
+
+from flask import current_app, g, has_app_context
+from sqlalchemy import create_engine
+from .connection import db, enable_sqlite_savepoints, enable_incremental_vacuum
+from .models import Project
+from .schema import upgrade_schema
+import os
+import re
+import threading
+
+import logging
+logger = logging.getLogger(__name__)
+
+DEFAULT_PROJECT = 'default'
+PROJECT_NAME = re.compile(r'^[A-Za-z0-9][A-Za-z0-9_-]{0,63}$')
+
+# SQLite attaches at most 10 databases to one connection by default
+ATTACH_LIMIT = 10
+
+_engines = {}  # Shard path -> engine, shared by every request of the process
+_engines_lock = threading.Lock()
+
+def shard_path(name):
+    return os.path.join(current_app.config['PROJECTS_PATH'], f'{name}.db')
+
+def shard_engine(name):
+    """The engine of a project's shard, creating the file and its tables on first use."""
+    path = shard_path(name)
+    with _engines_lock:
+        engine = _engines.get(path)
+        if engine is None:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            uri_path = path.replace('\\', '/')  # SQLite URIs need forward slashes
+            engine = create_engine(f'sqlite:///{uri_path}')
+            enable_sqlite_savepoints(engine)
+            enable_incremental_vacuum(engine)  # Only takes effect while the file is still empty
+            db.metadata.create_all(engine)
+            upgrade_schema(engine)  # Shards created by an older version of the app
+            _engines[path] = engine
+            logger.info(f"Opened shard of project '{name}' at {path}.")
+    return engine
+
+def current_project():
+    """Name of the project the current request works on."""
+    return g.get('project', DEFAULT_PROJECT) if has_app_context() else DEFAULT_PROJECT
+
+def activate_project(name):
+    """Route db.session to the shard of a project for the rest of the app context.
+
+    Must be called before the session is first used. Raises LookupError for unknown projects.
+    """
+    if not name or name == DEFAULT_PROJECT:
+        g.project = DEFAULT_PROJECT
+        g.project_engine = None
+        return
+    if Project.query.filter_by(name=name).first() is None:
+        raise LookupError(f"Project '{name}' does not exist.")
+    g.project = name
+    g.project_engine = shard_engine(name)
+
+def create_project(name):
+    """Register a project in the catalog and create its shard. Raises ValueError for invalid or taken names."""
+    if name == DEFAULT_PROJECT or not PROJECT_NAME.match(name or ''):
+        raise ValueError("Project names are 1-64 letters, digits, '-' or '_' and cannot be 'default'.")
+    if Project.query.filter_by(name=name).first() is not None:
+        raise ValueError(f"Project '{name}' already exists.")
+    project = Project(name=name)
+    db.session.add(project)
+    db.session.commit()
+    shard_engine(name)
+    logger.info(f"Created project '{name}'.")
+    return project
+
+def get_projects():
+    """Every project name, the default project first."""
+    return [DEFAULT_PROJECT] + [row[0] for row in db.session.query(Project.name).order_by(Project.name)]
+
+def project_lockfile(default_path):
+    """Lockfile of the current project; the default project keeps the global one."""
+    project = current_project()
+    if project == DEFAULT_PROJECT:
+        return default_path
+    return f'{shard_path(project)}.lock'
+
+def project_series_path(base_path):
+    """Series store directory of the current project below base_path."""
+    project = current_project()
+    if project == DEFAULT_PROJECT:
+        return base_path
+    return os.path.join(base_path, 'projects', project)
+
+def query_projects(select_sql, names=None):
+    """Run select_sql against several project databases and return the rows of all of them.
+
+    select_sql names its tables through the '{schema}' placeholder, e.g.
+    'SELECT COUNT(*) FROM {schema}.spreadsheets'. Each row is prefixed with the
+    project name. Shards are ATTACHed to a catalog connection in groups that stay
+    within SQLite's attach limit.
+    """
+    names = get_projects() if names is None else names
+    paths = {DEFAULT_PROJECT: current_app.config['DEFAULT_DATABASE_PATH']}
+    rows = []
+    with db.engines['catalog'].connect() as connection:
+        for start in range(0, len(names), ATTACH_LIMIT - 1):
+            group = names[start:start + ATTACH_LIMIT - 1]
+            attached = []
+            try:
+                for index, name in enumerate(group):
+                    path = paths.get(name) or shard_path(name)
+                    if not os.path.exists(path):
+                        continue
+                    schema = f'shard_{index}'
+                    connection.exec_driver_sql(f'ATTACH DATABASE ? AS {schema}', (path,))
+                    attached.append((name, schema))
+                if attached:
+                    union = ' UNION ALL '.join(
+                        f"SELECT '{name}' AS project, * FROM ({select_sql.format(schema=schema)})"
+                        for name, schema in attached
+                    )
+                    rows.extend(connection.exec_driver_sql(union).fetchall())
+            finally:
+                for _, schema in attached:
+                    connection.exec_driver_sql(f'DETACH DATABASE {schema}')
+    return rows
+
+def get_project_summaries():
+    """[{'name', 'spreadsheets', 'encrypted'}] of every project, read through ATTACHed shards."""
+    rows = query_projects(
+        'SELECT COUNT(*) AS spreadsheets, COALESCE(SUM(encrypted), 0) AS encrypted FROM {schema}.spreadsheets'
+    )
+    counts = {row[0]: (row[1], row[2]) for row in rows}
+    return [
+        {'name': name, 'spreadsheets': counts.get(name, (0, 0))[0], 'encrypted': counts.get(name, (0, 0))[1]}
+        for name in get_projects()
+    ]
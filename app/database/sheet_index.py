@@ -0,0 +1,88 @@
+# app/database/sheet_index.py
+
+import os
+import threading
+from collections import OrderedDict
+
+import openpyxl
+import logging
+
+from .deduplication import hash_file_content
+
+logger = logging.getLogger(__name__)
+
+# Excel error values; pandas reads most of them as NaN, so they are treated as empty cells
+EXCEL_ERRORS = {'#N/A', '#NULL!', '#DIV/0!', '#VALUE!', '#REF!', '#NAME?', '#NUM!', '#GETTING_DATA'}
+
+CACHE_SIZE = 16
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+class SheetIndex:
+    """All non-empty cells of one worksheet, read in a single pass.
+
+    Rows and columns are 1-based like Excel. `find` locates an anchor (a header
+    label) without rescanning the sheet, and `value`/`row_values` serve range reads.
+    """
+
+    def __init__(self, rows):
+        self.cells = {}
+        self.anchors = {}
+        for row_number, row in enumerate(rows, start=1):
+            for column_number, value in enumerate(row, start=1):
+                if value is None or (isinstance(value, str) and value in EXCEL_ERRORS):
+                    continue
+                self.cells[(row_number, column_number)] = value
+                if isinstance(value, str):
+                    self.anchors.setdefault(value, []).append((row_number, column_number))
+        self.max_row = max((row for row, _ in self.cells), default=0)
+
+    def find(self, value, min_row=1, min_col=1, max_col=None):
+        """Position of the first cell equal to value, in row-major order, or None."""
+        for row, column in self.anchors.get(value, ()):
+            if row >= min_row and column >= min_col and (max_col is None or column <= max_col):
+                return row, column
+        return None
+
+    def value(self, row, column):
+        return self.cells.get((row, column))
+
+    def row_values(self, row, first_col, width):
+        return [self.cells.get((row, column)) for column in range(first_col, first_col + width)]
+
+def _workbook_key(doc):
+    """Cache key of a workbook path or file object, and the source to open it from."""
+    if isinstance(doc, (str, os.PathLike)):
+        stat = os.stat(doc)
+        return (os.path.abspath(doc), stat.st_mtime_ns, stat.st_size), doc
+
+    # Uploads were already hashed for deduplication; only other file objects are read here
+    digest = getattr(doc, 'content_digest', None) or hash_file_content(doc)
+    return digest, getattr(doc, 'stream', doc)  # werkzeug FileStorage wraps the real stream
+
+def load_sheet_index(doc, sheet_name):
+    """Return the SheetIndex of one sheet, reading the workbook once per content.
+
+    Raises KeyError if the workbook has no such sheet.
+    """
+    key, source = _workbook_key(doc)
+    with _cache_lock:
+        if (key, sheet_name) in _cache:
+            _cache.move_to_end((key, sheet_name))
+            return _cache[(key, sheet_name)]
+
+    workbook = openpyxl.load_workbook(source, read_only=True, data_only=True)
+    try:
+        index = SheetIndex(workbook[sheet_name].iter_rows(values_only=True))
+    finally:
+        workbook.close()
+        if hasattr(source, 'seek'):
+            source.seek(0)
+    logger.debug("Indexed sheet '%s': %d cells, %d anchors.", sheet_name, len(index.cells), len(index.anchors))
+
+    with _cache_lock:
+        _cache[(key, sheet_name)] = index
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return index
@@ -0,0 +1,119 @@
+# app/database/statistics.py
+
+from .models import Spreadsheet, SpreadsheetStatistic, ExtraSeries
+from .connection import db
+from .data_retrieval import load_spreadsheet_frame
+from .series_store import SERIES_COLUMNS
+import json
+import pandas as pd
+
+import logging
+logger = logging.getLogger(__name__)
+
+def compute_statistics(df):
+    """Summary of one spreadsheet: row count, min/max of every numeric column, qmax and the strain at qmax."""
+    statistics = {'row_count': float(len(df))}
+    numeric = df.drop(columns=['row_index'], errors='ignore').apply(pd.to_numeric, errors='coerce')
+    for column in numeric.columns:
+        values = numeric[column]
+        if values.notna().any():
+            statistics[f'{column}_min'] = float(values.min())
+            statistics[f'{column}_max'] = float(values.max())
+
+    if 'q' in numeric.columns and numeric['q'].notna().any():
+        peak = numeric['q'].idxmax()
+        statistics['qmax'] = float(numeric['q'][peak])
+        if 'axial_strain' in numeric.columns and pd.notna(numeric['axial_strain'][peak]):
+            statistics['axial_strain_at_qmax'] = float(numeric['axial_strain'][peak])
+    return statistics
+
+def store_statistics(spreadsheet, df):
+    """Replace the stored summary of a spreadsheet. Encrypted spreadsheets get none, it would leak their data.
+
+    The caller commits.
+    """
+    SpreadsheetStatistic.query.filter_by(spreadsheet_id=spreadsheet.spreadsheet_id).delete(synchronize_session=False)
+    if spreadsheet.encrypted:
+        return {}
+
+    statistics = compute_statistics(df)
+    db.session.bulk_insert_mappings(SpreadsheetStatistic, [
+        {'spreadsheet_id': spreadsheet.spreadsheet_id, 'name': name, 'value': value}
+        for name, value in statistics.items()
+    ])
+    logger.debug("Stored %d statistics for Spreadsheet '%s'.", len(statistics), spreadsheet.spreadsheet_name)
+    return statistics
+
+def refresh_statistics(spreadsheet):
+    """Recompute the summary of a public spreadsheet from its stored rows and extra series."""
+    extra_columns = [row[0] for row in db.session.query(ExtraSeries.column_name)
+                     .filter_by(spreadsheet_id=spreadsheet.spreadsheet_id)]
+    df = load_spreadsheet_frame(spreadsheet, SERIES_COLUMNS + extra_columns)
+    return store_statistics(spreadsheet, df)
+
+def backfill_statistics():
+    """Summarise public spreadsheets stored before statistics existed."""
+    summarised = db.session.query(SpreadsheetStatistic.spreadsheet_id).distinct()
+    missing = Spreadsheet.query.filter(
+        Spreadsheet.encrypted.isnot(True),
+        Spreadsheet.spreadsheet_id.notin_(summarised)
+    ).all()
+    for spreadsheet in missing:
+        refresh_statistics(spreadsheet)
+    if missing:
+        db.session.commit()
+        logger.info(f"Computed statistics for {len(missing)} existing spreadsheets.")
+
+def parse_predicates(predicates_json):
+    """Parse '[{"stat": "qmax", "min": 300, "max": null}, ...]'. Raises ValueError on malformed input."""
+    if not predicates_json:
+        return []
+    try:
+        predicates = json.loads(predicates_json)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Invalid statistics filter: {e}")
+    if not isinstance(predicates, list):
+        raise ValueError("Statistics filters must be a list.")
+
+    parsed = []
+    for predicate in predicates:
+        if not isinstance(predicate, dict) or not isinstance(predicate.get('stat'), str):
+            raise ValueError("Each statistics filter needs a 'stat' name.")
+        bounds = []
+        for bound in ('min', 'max'):
+            value = predicate.get(bound)
+            if value in (None, ''):
+                bounds.append(None)
+                continue
+            try:
+                bounds.append(float(value))
+            except (TypeError, ValueError):
+                raise ValueError(f"Statistics filter '{predicate['stat']}' has a non-numeric {bound}.")
+        parsed.append((predicate['stat'], bounds[0], bounds[1]))
+    return parsed
+
+def filter_by_statistics(predicates):
+    """IDs of the spreadsheets whose statistics satisfy every (stat, min, max) predicate."""
+    matching = None
+    for name, minimum, maximum in predicates:
+        query = db.session.query(SpreadsheetStatistic.spreadsheet_id).filter(SpreadsheetStatistic.name == name)
+        if minimum is not None:
+            query = query.filter(SpreadsheetStatistic.value >= minimum)
+        if maximum is not None:
+            query = query.filter(SpreadsheetStatistic.value <= maximum)
+        ids = {row[0] for row in query}
+        matching = ids if matching is None else matching & ids
+    return matching if matching is not None else set()
+
+def get_statistics(spreadsheet_ids=None):
+    """{spreadsheet_id: {stat: value}} for the given spreadsheets (all summarised ones by default)."""
+    query = SpreadsheetStatistic.query
+    if spreadsheet_ids is not None:
+        query = query.filter(SpreadsheetStatistic.spreadsheet_id.in_(spreadsheet_ids))
+    statistics = {}
+    for row in query:
+        statistics.setdefault(row.spreadsheet_id, {})[row.name] = row.value
+    return statistics
+
+def get_statistic_names():
+    return [row[0] for row in db.session.query(SpreadsheetStatistic.name).distinct().order_by(SpreadsheetStatistic.name)]
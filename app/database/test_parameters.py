@@ -0,0 +1,87 @@
+# app/database/test_parameters.py
+
+from .connection import db
+from .data_insertion import encrypt_value
+from .data_retrieval import decrypt_value
+from .extra_series import set_extra_series
+from .models import ExtraSeries
+from .input_variable_extractor import find_inputs_and_extract, find_membrane_correction_and_extract
+import json
+import numpy as np
+import pandas as pd
+
+import logging
+logger = logging.getLogger(__name__)
+
+INPUTS_SHEET = '01 - Inputs'
+CORRECTED_Q = 'q_corrected'
+
+def extract_test_parameters(file):
+    """Input variables and the membrane correction table of a workbook (one cached sheet pass)."""
+    parameters = {
+        'inputs': find_inputs_and_extract(file, INPUTS_SHEET, 'General inputs and calculations'),
+        'membrane': find_membrane_correction_and_extract(file, INPUTS_SHEET, 'Membrane correction'),
+    }
+    if hasattr(file, 'seek'):
+        file.seek(0)
+    return parameters
+
+def _to_json(parameters):
+    # Labels can be numbers (e.g. the diameter readings 1, 2, 3) and values dates, so stringify both
+    return json.dumps(
+        {section: {str(key): value for key, value in values.items()} for section, values in parameters.items()},
+        default=str
+    )
+
+def store_test_parameters(spreadsheet, parameters, encryption_key=None):
+    data = _to_json(parameters)
+    if encryption_key is not None:
+        data = encrypt_value(data, encryption_key, spreadsheet.iv)
+    spreadsheet.test_parameters = data
+
+def load_test_parameters(spreadsheet, encryption_key=None):
+    """The stored parameters of a spreadsheet, or {} if none were extracted at ingest."""
+    data = spreadsheet.test_parameters
+    if not data:
+        return {}
+    if spreadsheet.encrypted:
+        data = decrypt_value(data, encryption_key, spreadsheet.iv)
+    return json.loads(data)
+
+def membrane_corrected_q(df, membrane):
+    """q minus the membrane correction interpolated at each row's axial strain, or None.
+
+    The table gives the correction for this test (kPa) against axial strain in percent,
+    while axial_strain is stored as a fraction. Strains beyond the table keep its end values.
+    """
+    table = pd.DataFrame({
+        'strain': pd.to_numeric(pd.Series(membrane.get('Axial Strain', []), dtype=object), errors='coerce'),
+        'correction': pd.to_numeric(pd.Series(membrane.get('Correction for this test', []), dtype=object),
+                                    errors='coerce'),
+    }).dropna().sort_values('strain')
+    if len(table) < 2:
+        return None
+
+    strain_percent = pd.to_numeric(df['axial_strain'], errors='coerce').to_numpy(dtype=float) * 100
+    q = pd.to_numeric(df['q'], errors='coerce').to_numpy(dtype=float)
+    return q - np.interp(strain_percent, table['strain'].to_numpy(), table['correction'].to_numpy())
+
+def apply_test_parameters(spreadsheet, df, parameters, encryption_key=None):
+    """Store the parameters and the membrane-corrected q series next to the raw rows.
+
+    Returns the corrected q values, or None if the workbook has no usable table. The caller commits.
+    """
+    store_test_parameters(spreadsheet, parameters, encryption_key)
+    corrected = membrane_corrected_q(df, parameters.get('membrane', {}))
+    if corrected is None:
+        logger.info("No usable membrane correction table for Spreadsheet '%s'.", spreadsheet.spreadsheet_name)
+        # A re-upload without a table must not keep the correction of the previous version
+        ExtraSeries.query.filter_by(
+            spreadsheet_id=spreadsheet.spreadsheet_id, column_name=CORRECTED_Q
+        ).delete(synchronize_session=False)
+        return None
+
+    set_extra_series(spreadsheet, CORRECTED_Q, corrected, encryption_key)
+    db.session.flush()
+    logger.info("Stored membrane-corrected q for Spreadsheet '%s'.", spreadsheet.spreadsheet_name)
+    return corrected
@@ -0,0 +1,143 @@
+# app/ensemble.py
+
+"""Ensemble curves: many tests resampled onto one x grid and summarised per grid point.
+
+Every test has its own irregular sampling of x (e.g. axial strain), so tests are
+interpolated onto a shared grid first. All tests are interpolated in a single
+np.interp call: each test's x values are shifted into their own disjoint band,
+which keeps the concatenated series increasing, and grid points outside a
+test's own x range are masked afterwards. The result is a tests × grid array
+that mean, median and percentile envelopes are computed from column-wise.
+"""
+
+import warnings
+
+import numpy as np
+import plotly.graph_objs as go
+
+DEFAULT_GRID_POINTS = 200
+MAX_GRID_POINTS = 5000
+DEFAULT_PERCENTILES = (10, 90)
+
+def clean_series(x, y):
+    """Finite (x, y) pairs sorted by x, or None when fewer than two are left."""
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    finite = np.isfinite(x) & np.isfinite(y)
+    if finite.sum() < 2:
+        return None
+    x, y = x[finite], y[finite]
+    order = np.argsort(x, kind='stable')
+    return x[order], y[order]
+
+def common_grid(series, points=DEFAULT_GRID_POINTS, x_min=None, x_max=None):
+    """Evenly spaced grid over the union of the x ranges, optionally clipped to [x_min, x_max].
+
+    Raises ValueError when the resulting range is empty, e.g. x_min alone lies past the data.
+    """
+    low = min(x[0] for x, _ in series) if x_min is None else x_min
+    high = max(x[-1] for x, _ in series) if x_max is None else x_max
+    if low >= high:
+        raise ValueError(f"The x range [{low:g}, {high:g}] is empty; adjust x_min or x_max.")
+    return np.linspace(low, high, points)
+
+def resample(series, grid):
+    """Interpolate every cleaned (x, y) series onto grid in one pass.
+
+    Returns a len(series) × len(grid) array, NaN where the grid lies outside a test's data.
+    """
+    lengths = np.array([len(x) for x, _ in series])
+    test_index = np.repeat(np.arange(len(series)), lengths)
+    x_all = np.concatenate([x for x, _ in series])
+    y_all = np.concatenate([y for _, y in series])
+
+    # Shift test k into [k * width, (k + 1) * width) so one increasing xp covers every test
+    low = min(x_all.min(), grid[0])
+    width = max(x_all.max(), grid[-1]) - low + 1.0
+    offsets = np.arange(len(series)) * width
+    xp = x_all - low + offsets[test_index]
+    xq = (grid[np.newaxis, :] - low) + offsets[:, np.newaxis]
+    values = np.interp(xq.ravel(), xp, y_all).reshape(len(series), len(grid))
+
+    ends = np.cumsum(lengths)
+    first_x = x_all[ends - lengths]
+    last_x = x_all[ends - 1]
+    outside = (grid[np.newaxis, :] < first_x[:, np.newaxis]) | (grid[np.newaxis, :] > last_x[:, np.newaxis])
+    values[outside] = np.nan
+    return values
+
+def envelopes(values, percentiles=DEFAULT_PERCENTILES):
+    """Column-wise count, mean, median and the lower/upper percentile of a tests × grid array."""
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)  # Grid points no test covers are all-NaN
+        lower, upper = np.nanpercentile(values, percentiles, axis=0)
+        return {
+            'count': np.sum(~np.isnan(values), axis=0),
+            'mean': np.nanmean(values, axis=0),
+            'median': np.nanmedian(values, axis=0),
+            'lower': lower,
+            'upper': upper,
+        }
+
+def ensemble_traces(grid, summary, y_name, x_name, color, percentiles=DEFAULT_PERCENTILES):
+    """Percentile band, mean and median traces of one y series."""
+    label = "p'" if y_name == 'p' else y_name
+    band = f"{label} - P{percentiles[0]:g}–P{percentiles[1]:g}"
+    return [
+        go.Scatter(
+            x=grid, y=summary['lower'], mode='lines', line=dict(width=0, color=color),
+            name=band, legendgroup=band, showlegend=False, hoverinfo='skip'
+        ),
+        go.Scatter(
+            x=grid, y=summary['upper'], mode='lines', line=dict(width=0, color=color),
+            fill='tonexty', opacity=0.3, name=band, legendgroup=band, hoverinfo='skip'
+        ),
+        go.Scatter(
+            x=grid, y=summary['mean'], mode='lines', line=dict(color=color),
+            name=f"{label} - mean", customdata=summary['count'],
+            hovertemplate=(
+                f"<b>mean {label}</b>: %{{y}}<br>"
+                f"<b>{x_name}</b>: %{{x}}<br>"
+                "<b>Tests</b>: %{customdata}<br>"
+                "<extra></extra>"
+            )
+        ),
+        go.Scatter(
+            x=grid, y=summary['median'], mode='lines', line=dict(color=color, dash='dash'),
+            name=f"{label} - median"
+        ),
+    ]
+
+def parse_percentiles(text):
+    """Parse '10,90' into (10.0, 90.0). Raises ValueError on malformed input."""
+    if not text:
+        return DEFAULT_PERCENTILES
+    try:
+        lower, upper = (float(part) for part in text.split(','))
+    except ValueError:
+        raise ValueError("Percentiles must be two numbers, e.g. '10,90'.")
+    if not 0 <= lower < upper <= 100:
+        raise ValueError("Percentiles must satisfy 0 <= lower < upper <= 100.")
+    return lower, upper
+
+def parse_grid_points(text):
+    """Parse the number of grid points. Raises ValueError on malformed input."""
+    if not text:
+        return DEFAULT_GRID_POINTS
+    try:
+        points = int(text)
+    except ValueError:
+        raise ValueError("The number of grid points must be an integer.")
+    if not 2 <= points <= MAX_GRID_POINTS:
+        raise ValueError(f"The number of grid points must be between 2 and {MAX_GRID_POINTS}.")
+    return points
+
+def parse_x_range(x_min, x_max):
+    """Parse the optional grid bounds. Raises ValueError on malformed input."""
+    try:
+        bounds = [float(bound) if bound not in (None, '') else None for bound in (x_min, x_max)]
+    except ValueError:
+        raise ValueError("x_min and x_max must be numbers.")
+    if None not in bounds and bounds[0] >= bounds[1]:
+        raise ValueError("x_min must be smaller than x_max.")
+    return bounds[0], bounds[1]
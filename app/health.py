@@ -0,0 +1,132 @@
+# app/health.py
+
+"""Liveness and readiness endpoints for the container healthcheck.
+
+`GET /healthz` answers 200 as long as the process serves requests; it never
+touches the database. `GET /readyz` reports the last probe of the default
+database on the NAS: a stat of the database file and a read of its header
+(PRAGMA schema_version), with their latency. A background thread per app,
+started by init_health, repeats the probe every HEALTH_PROBE_INTERVAL seconds
+(default 15), so health checks add no load on the NAS however often they run.
+/readyz answers 503 when the last probe failed, or when it is older than
+HEALTH_PROBE_MAX_AGE seconds (default three intervals), which is what a hung
+NAS mount looks like: the probe thread is stuck in its read. The thread is
+stopped at interpreter exit, or by ReadinessProbe.stop().
+"""
+
+import atexit
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+from flask import current_app, jsonify
+
+from app.database import db
+from app.instrumentation import DB_PROBE
+
+import logging
+logger = logging.getLogger(__name__)
+
+# Seconds a /readyz request right after startup waits for the first probe before answering 'starting'
+FIRST_PROBE_WAIT = 2
+
+def _env_float(name, default):
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        return default
+
+def probe_interval():
+    return _env_float('HEALTH_PROBE_INTERVAL', 15)
+
+def probe_max_age():
+    return _env_float('HEALTH_PROBE_MAX_AGE', 3 * probe_interval())
+
+def probe_database(engine):
+    """Stat and read the header of the database behind engine. Returns the probe result."""
+    start = time.perf_counter()
+    try:
+        if engine.url.database:
+            os.stat(engine.url.database)
+        with engine.connect() as connection:
+            # Reads the first page of the file; SELECT 1 would not touch the NAS at all
+            connection.exec_driver_sql('PRAGMA schema_version').scalar()
+        ok, error = True, None
+    except Exception as e:
+        ok, error = False, str(e)
+    latency = time.perf_counter() - start
+    DB_PROBE.observe(latency, outcome='ok' if ok else 'error')
+    return {'ok': ok, 'latency_ms': round(latency * 1000, 1), 'error': error,
+            'checked_at': datetime.now(timezone.utc).isoformat(), 'monotonic': time.monotonic()}
+
+class ReadinessProbe:
+    """The probe of one app's default database, repeated by a daemon thread; kept in app.extensions['health']."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.last_probe = None
+        self._lock = threading.Lock()
+        self._first_probe = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='readiness-probe', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self, timeout=FIRST_PROBE_WAIT):
+        """Stop probing; waits up to timeout seconds for a probe in progress, which may be stuck on the NAS."""
+        self._stopped.set()
+        if self._thread.is_alive():
+            self._thread.join(timeout)
+
+    def _run(self):
+        while not self._stopped.is_set():
+            result = probe_database(self.engine)
+            with self._lock:
+                was_ok = self.last_probe is None or self.last_probe['ok']
+                self.last_probe = result
+            # Logged on changes only, not on every probe of an outage
+            if was_ok and not result['ok']:
+                logger.warning(f"Database readiness probe of {self.engine.url.database} failed: {result['error']}")
+            elif result['ok'] and not was_ok:
+                logger.info(f"Database readiness probe of {self.engine.url.database} recovered.")
+            self._first_probe.set()
+            self._stopped.wait(probe_interval())
+
+    def readiness(self):
+        """({'status', 'database'}, HTTP status) from the last probe."""
+        self._first_probe.wait(FIRST_PROBE_WAIT)
+        with self._lock:
+            probe = dict(self.last_probe) if self.last_probe else None
+        if probe is None:
+            return {'status': 'starting', 'database': None}, 503
+
+        probe['age_s'] = round(time.monotonic() - probe.pop('monotonic'), 1)
+        if not probe['ok']:
+            status = 'unavailable'
+        elif probe['age_s'] > probe_max_age():
+            status = 'stale'
+        else:
+            status = 'ready'
+        return {'status': status, 'database': probe}, 200 if status == 'ready' else 503
+
+def init_health(app):
+    """Start probing the app's default database and register /healthz and /readyz on the app itself,
+    outside the main blueprint and its project hook.
+    """
+    with app.app_context():
+        engine = db.engine  # The default database; project shards live next to it
+    probe = ReadinessProbe(engine)
+    app.extensions['health'] = probe
+    probe.start()
+    atexit.register(probe.stop)
+
+    @app.route('/healthz', methods=['GET'])
+    def healthz():
+        return jsonify({'status': 'ok'})
+
+    @app.route('/readyz', methods=['GET'])
+    def readyz():
+        body, status = current_app.extensions['health'].readiness()
+        return jsonify(body), status
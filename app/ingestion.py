@@ -0,0 +1,215 @@
+# app/ingestion.py
+
+"""Per-workbook ingest shared by POST /upload and the `flask ingest` watch-folder command.
+
+parse_workbook() only reads the workbook, so the watch-folder command runs it
+in worker processes; ingest_workbook() writes one workbook through db.session
+and is always called by the process that owns the session, inside a savepoint.
+"""
+
+import os
+
+from werkzeug.datastructures import FileStorage
+
+from app.database import (
+    data_extractor,
+    insert_data_to_db,
+    update_data_in_db,
+    write_series,
+    find_instances,
+    insert_instances_to_db,
+    extract_test_parameters,
+    apply_test_parameters,
+    store_statistics,
+    get_key_ring,
+    hash_file_content,
+    hash_payload,
+    find_spreadsheets_by_hash,
+    record_content_hashes,
+    Spreadsheet,
+    db
+)
+from app.instrumentation import span, record_ingest
+
+import logging
+logger = logging.getLogger(__name__)
+
+SHEET_NAME = '03 - Shearing'
+
+def find_reusable_duplicate(hash_type, digest, password, existing=None):
+    """Find a stored spreadsheet with identical content that this upload can reuse.
+
+    Public uploads only match public spreadsheets, and encrypted uploads only match
+    encrypted spreadsheets the given password unlocks. When updating an existing
+    spreadsheet only that spreadsheet itself counts, meaning nothing has changed.
+    """
+    for spreadsheet in find_spreadsheets_by_hash(hash_type, digest):
+        if existing is not None and spreadsheet.spreadsheet_id != existing.spreadsheet_id:
+            continue
+        if not spreadsheet.encrypted and not password:
+            return spreadsheet
+        if spreadsheet.encrypted and get_key_ring().unlock(spreadsheet, password) is not None:
+            return spreadsheet
+    return None
+
+def upload_group_size():
+    """Files per commit during an upload (UPLOAD_GROUP_COMMIT_SIZE); 0 commits once at the end."""
+    try:
+        return max(int(os.getenv('UPLOAD_GROUP_COMMIT_SIZE', 10)), 0)
+    except ValueError:
+        return 10
+
+def commit_upload_group(pending):
+    """Commit the files ingested since the last commit, then write their series files."""
+    with span('commit'):
+        db.session.commit()
+    for spreadsheet, df, seconds in pending:
+        record_ingest(len(df), seconds)
+        with span('series_write'):
+            write_series(spreadsheet, df)
+    pending.clear()
+
+def parse_workbook(file):
+    """The shearing data, payload hash, test parameters and instances of a workbook. No database access."""
+    with span('parse'):
+        df = data_extractor(file, SHEET_NAME)
+    if df.empty:
+        return {'df': df}
+    with span('hash'):
+        payload_digest = hash_payload(df)
+    file.seek(0)
+    with span('parse'):
+        parameters = extract_test_parameters(file)
+    file.seek(0)
+    with span('parse'):
+        instances = find_instances(file)
+    return {'df': df, 'payload_digest': payload_digest, 'parameters': parameters, 'instances': instances}
+
+def parse_workbook_path(path, known_digest=None):
+    """Hash and parse a workbook on disk; runs in the worker processes of the watch-folder command.
+
+    When the file hash equals known_digest the workbook is not parsed again and
+    only {'file_digest', 'unchanged': True} is returned. Errors are returned
+    under 'error' rather than raised, so one bad file does not stop a batch.
+    """
+    try:
+        with open(path, 'rb') as stream:
+            file = FileStorage(stream, filename=os.path.basename(path))
+            with span('hash'):
+                file_digest = hash_file_content(file)
+            if file_digest == known_digest:
+                return {'file_digest': file_digest, 'unchanged': True}
+            return {'file_digest': file_digest, **parse_workbook(file)}
+    except Exception as e:
+        logger.exception(f"Failed to parse workbook '{path}': {e}")
+        return {'error': f'Could not read the workbook: {e}'}
+
+def ingest_workbook(file, name, password=None, update_existing=False, file_digest=None, parsed=None):
+    """Store one workbook as spreadsheet `name`, the way /upload does for every file.
+
+    Call inside a savepoint and roll it back when the status is 'failed'. file is
+    only read when file_digest or parsed (see parse_workbook) are not given.
+    Returns a dict with 'status' ('stored', 'updated', 'skipped' or 'failed') and
+    'reason' for failures, 'duplicate_of' for skipped files, or 'spreadsheet',
+    'df' and 'message' for stored and updated ones.
+    """
+    existing = Spreadsheet.query.filter_by(spreadsheet_name=name).first()
+    if existing and not update_existing:
+        logger.warning(f"Spreadsheet '{name}' already exists in the database.")
+        return {'status': 'failed', 'reason': 'Spreadsheet already exists in the database.'}
+
+    # Short-circuit workbooks whose bytes are already stored, before any Excel parsing
+    if file_digest is None:
+        with span('hash'):
+            file_digest = hash_file_content(file)
+    duplicate = find_reusable_duplicate('file', file_digest, password, existing)
+    if duplicate:
+        logger.info(f"Workbook '{name}' is identical to stored Spreadsheet '{duplicate.spreadsheet_name}'. Skipping.")
+        return {'status': 'skipped', 'duplicate_of': duplicate.spreadsheet_name}
+
+    if parsed is None:
+        parsed = parse_workbook(file)
+    df = parsed['df']
+    if df.empty:
+        logger.warning(f"No valid data extracted for spreadsheet '{name}'.")
+        return {'status': 'failed', 'reason': 'No valid data extracted.'}
+
+    # Re-saved workbooks differ byte-wise but may carry exactly the same data
+    payload_digest = parsed['payload_digest']
+    duplicate = find_reusable_duplicate('payload', payload_digest, password, existing)
+    if duplicate:
+        logger.info(f"Data of '{name}' is identical to stored Spreadsheet '{duplicate.spreadsheet_name}'. Skipping.")
+        # Remember these bytes too, so the next upload of them is skipped before parsing
+        record_content_hashes(duplicate, file_digest=file_digest, replace=False)
+        return {'status': 'skipped', 'duplicate_of': duplicate.spreadsheet_name}
+
+    key = None
+    iv = None
+    if existing:
+        logger.debug(f"Spreadsheet '{name}' exists. Performing incremental update.")
+        if existing.encrypted:
+            if not password:
+                return {'status': 'failed', 'reason': 'Password required to update an encrypted spreadsheet.'}
+            key = get_key_ring().unlock(existing, password)
+            if key is None:
+                return {'status': 'failed', 'reason': 'Incorrect password for the existing spreadsheet.'}
+            iv = existing.iv
+        elif password:
+            return {'status': 'failed', 'reason': 'Cannot encrypt an existing public spreadsheet during an update.'}
+
+        result = update_data_in_db(existing, df, encryption_key=key, iv=iv)
+
+    elif password:
+        logger.debug("Encryption enabled for this file.")
+        # A random data key per spreadsheet, wrapped by a KEK derived once for the whole batch
+        kek_salt, key, wrapped_key = get_key_ring().wrap_new_key(password)
+        iv = os.urandom(16)
+
+        spreadsheet = Spreadsheet(
+            spreadsheet_name=name,
+            public=False,
+            encrypted=True,
+            iv=iv,
+            kek_salt=kek_salt,
+            wrapped_key=wrapped_key
+        )
+        db.session.add(spreadsheet)
+        db.session.flush()  # Assigns spreadsheet_id; committed together with the data
+        logger.debug(f"Added Spreadsheet object for {name} to the session.")
+
+        result = insert_data_to_db(
+            name, df, spreadsheet=spreadsheet, encrypt=True, encryption_key=key, iv=iv
+        )
+    else:
+        logger.debug("Encryption not enabled for this file.")
+        result = insert_data_to_db(name, df)
+
+    if not result['success']:
+        logger.error(f"Failed to insert data for spreadsheet '{name}'. Reason: {result['message']}")
+        return {'status': 'failed', 'reason': result['message']}
+
+    stored_spreadsheet = existing or Spreadsheet.query.filter_by(spreadsheet_name=name).first()
+    record_content_hashes(stored_spreadsheet, file_digest, payload_digest)
+
+    # Input variables and the membrane-corrected q are computed once here, not per plot
+    with span('correction'):
+        corrected = apply_test_parameters(stored_spreadsheet, df, parsed['parameters'],
+                                          key if stored_spreadsheet.encrypted else None)
+    with span('statistics'):
+        store_statistics(stored_spreadsheet, df if corrected is None else df.assign(q_corrected=corrected))
+
+    instances = parsed['instances']
+    logger.debug(f"Found {len(instances)} instances for spreadsheet '{name}'.")
+    if instances:
+        try:
+            insert_instances_to_db(name, instances, replace_existing=bool(existing))
+        except Exception as e:
+            logger.error(f"Failed to insert instances for spreadsheet '{name}'. Reason: {str(e)}")
+            return {'status': 'failed', 'reason': 'Failed to insert instances.'}
+
+    return {
+        'status': 'updated' if existing else 'stored',
+        'message': result['message'],
+        'spreadsheet': stored_spreadsheet,
+        'df': df,
+    }
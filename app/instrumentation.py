@@ -0,0 +1,166 @@
+# app/instrumentation.py
+
+"""Named timing spans, a Server-Timing response header and Prometheus metrics.
+
+Wrap a stage in `with span('parse'):` to time it. Within a request the span
+durations are summed per name and sent back in the Server-Timing header, and
+every span is also observed in the `soil_span_seconds` histogram that /metrics
+exposes in the Prometheus text format.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import g, has_request_context, request
+
+# Seconds; covers a fast SQLite read up to a slow NAS upload
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+LOCK_WAIT_BUCKETS = (0.001, 0.01, 0.1, 0.5, 1, 2, 5, 10, 20, 30)
+RATE_BUCKETS = (100, 500, 1000, 5000, 10000, 50000, 100000, 500000)
+POINT_BUCKETS = (100, 1000, 10000, 50000, 100000, 500000, 1000000, 5000000)
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    escaped = [(name, str(value).replace('\\', '\\\\').replace('"', '\\"')) for name, value in pairs]
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+def _format_number(value):
+    return repr(float(value)) if value != float('inf') else '+Inf'
+
+class Counter:
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(label, '') for label in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{_format_labels(self.labels, key)} {_format_number(value)}')
+        return lines
+
+class Histogram:
+    def __init__(self, name, documentation, buckets=DURATION_BUCKETS, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        self.labels = tuple(labels)
+        self._series = {}  # label values -> [bucket counts, sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(label, '') for label in self.labels)
+        with self._lock:
+            series = self._series.setdefault(key, [[0] * len(self.buckets), 0.0, 0])
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][index] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    labels = _format_labels(self.labels, key, ('le', _format_number(bound)))
+                    lines.append(f'{self.name}_bucket{labels} {cumulative}')
+                labels = _format_labels(self.labels, key)
+                lines.append(f'{self.name}_sum{labels} {_format_number(total)}')
+                lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+REQUEST_DURATION = Histogram(
+    'soil_request_duration_seconds', 'Time spent handling a request.', labels=('endpoint', 'status'))
+SPAN_DURATION = Histogram(
+    'soil_span_seconds', 'Time spent in a named stage (parse, encrypt, db_insert, row_fetch, ...).', labels=('span',))
+LOCK_WAIT = Histogram(
+    'soil_lock_wait_seconds', 'Time spent waiting for the database lockfile.', LOCK_WAIT_BUCKETS, labels=('outcome',))
+LOCK_REJECTIONS = Counter(
+    'soil_lock_rejections_total', 'Requests answered with 423 because the lock was held.', labels=('endpoint',))
+ROWS_INGESTED = Counter('soil_rows_ingested_total', 'Spreadsheet rows written to the database.')
+INGEST_RATE = Histogram(
+    'soil_ingest_rows_per_second', 'Rows ingested per second, observed per uploaded file.', RATE_BUCKETS)
+PLOT_POINTS = Histogram('soil_plot_points', 'Data points returned by a plot request.', POINT_BUCKETS)
+DB_PROBE = Histogram(
+    'soil_db_probe_seconds', 'Latency of the background database readiness probe.', labels=('outcome',))
+
+METRICS = [REQUEST_DURATION, SPAN_DURATION, LOCK_WAIT, LOCK_REJECTIONS, ROWS_INGESTED, INGEST_RATE, PLOT_POINTS,
+           DB_PROBE]
+
+def render_metrics():
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+def record_span(name, seconds):
+    SPAN_DURATION.observe(seconds, span=name)
+    if has_request_context():
+        spans = g.setdefault('timing_spans', {})
+        spans[name] = spans.get(name, 0.0) + seconds
+
+@contextmanager
+def span(name):
+    """Time the enclosed block as the stage `name`."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(name, time.perf_counter() - start)
+
+def record_lock_wait(seconds, outcome):
+    LOCK_WAIT.observe(seconds, outcome=outcome)
+    record_span('lock_wait', seconds)
+
+def record_ingest(rows, seconds):
+    ROWS_INGESTED.inc(rows)
+    if seconds > 0:
+        INGEST_RATE.observe(rows / seconds)
+
+def _start_timer():
+    g.request_start = time.perf_counter()
+
+def _server_timing(response):
+    start = g.pop('request_start', None)
+    if start is None:
+        return response
+    endpoint = request.endpoint or 'unknown'
+    status = response.status_code
+    if status == 423:
+        LOCK_REJECTIONS.inc(endpoint=endpoint)
+
+    entries = [f'{name};dur={seconds * 1000:.1f}' for name, seconds in g.get('timing_spans', {}).items()]
+    if response.is_streamed:
+        # The body is produced after this hook, so the request is timed once it has been sent.
+        # The header only holds the spans up to here and no total, which would stop at the first byte.
+        response.call_on_close(
+            lambda: REQUEST_DURATION.observe(time.perf_counter() - start, endpoint=endpoint, status=status))
+    else:
+        total = time.perf_counter() - start
+        REQUEST_DURATION.observe(total, endpoint=endpoint, status=status)
+        entries.append(f'total;dur={total * 1000:.1f}')
+    if entries:
+        response.headers['Server-Timing'] = ', '.join(entries)
+    return response
+
+def init_instrumentation(app):
+    app.before_request(_start_timer)
+    app.after_request(_server_timing)
@@ -0,0 +1,87 @@
+# app/logging_config.py
+
+"""Logging set up from the environment, with log I/O moved off the request thread.
+
+Records are put on an in-memory queue by a QueueHandler and written by a
+QueueListener thread, so a slow NAS-mounted log file or terminal never blocks
+ingest. Per-row/per-item messages pass `extra=SAMPLED` and only a fraction of
+them is kept.
+
+Environment variables:
+    LOG_LEVEL        root level, default INFO
+    LOG_FORMAT       logging format string
+    LOG_FILE         also write to this file (stderr is always used)
+    LOG_SAMPLE_RATE  fraction of sampled messages kept, default 0.01
+    LOG_QUEUE        'false' to write synchronously (useful when debugging crashes)
+"""
+
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import random
+
+DEFAULT_FORMAT = '%(asctime)s %(levelname)s:%(name)s:%(message)s'
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Pass as `extra=SAMPLED` on messages logged once per row or per item
+SAMPLED = {'sampled': True}
+
+_listener = None
+
+class SamplingFilter(logging.Filter):
+    """Keep only `rate` of the records marked as sampled; everything else passes."""
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        if not getattr(record, 'sampled', False):
+            return True
+        return self.rate >= 1 or random.random() < self.rate
+
+def _env_float(name, default):
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        return default
+
+def configure_logging():
+    """Configure the root logger once; later calls are no-ops."""
+    global _listener
+    root = logging.getLogger()
+    if getattr(root, '_soil_configured', False):
+        return
+
+    level = os.getenv('LOG_LEVEL', 'INFO').upper()
+    formatter = logging.Formatter(os.getenv('LOG_FORMAT', DEFAULT_FORMAT), datefmt=DATE_FORMAT)
+
+    handlers = [logging.StreamHandler()]
+    log_file = os.getenv('LOG_FILE')
+    if log_file:
+        handlers.append(logging.FileHandler(log_file))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    sampling = SamplingFilter(_env_float('LOG_SAMPLE_RATE', 0.01))
+
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+
+    if os.getenv('LOG_QUEUE', 'true').lower() in ('false', '0', 'no'):
+        for handler in handlers:
+            handler.addFilter(sampling)
+            root.addHandler(handler)
+    else:
+        log_queue = queue.SimpleQueue()
+        queue_handler = logging.handlers.QueueHandler(log_queue)
+        queue_handler.addFilter(sampling)  # Drop sampled records before they are queued
+        root.addHandler(queue_handler)
+        _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+        _listener.start()
+        atexit.register(_listener.stop)
+
+    root.setLevel(level)
+    root._soil_configured = True
@@ -0,0 +1,149 @@
+# app/plotting.py
+
+import os
+
+import numpy as np
+import plotly.graph_objs as go
+
+COLORS = ['red', 'blue', 'green', 'orange', 'purple', 'cyan', 'magenta', 'yellow']  # Extended colors
+
+# Non-calculated preset options: columns in the preset get added to y_axis
+# Calculated preset options: the preset columns are the inputs of a derived series
+PRESETS = {
+    "non_calc_1": ('axial_strain', ['p', 'q', 'induced_PWP']),
+    "non_calc_2": ('p', ['q']),
+    "non_calc_3": ('axial_strain', ['vol_strain']),
+    "calc_1": ('p', ['e']),
+    "calc_2": ('axial_strain', ['q', 'p']),
+    "calc_3": ('p', ['q', 'p']),
+}
+
+# x and y labels of the series derived by the calculated presets
+CALCULATED_PRESETS = {
+    "calc_1": ("log(p')", 'e'),  # Swap x-axis and y-axis (just for this option)
+    "calc_2": ('axial_strain', "q/p'"),
+    "calc_3": ('p', "qmax/p'"),
+}
+
+def resolve_axes(preset, x_axis, y_axis):
+    """Apply a preset to the requested axes.
+
+    Returns the x column, the columns to load, and the manually selected y columns,
+    which are still plotted on top of calculated presets.
+    """
+    selected_y_columns = list(y_axis)
+    if preset in PRESETS:
+        x_axis, preset_columns = PRESETS[preset]
+        y_axis = preset_columns + selected_y_columns
+    return x_axis, list(y_axis), selected_y_columns
+
+def calculated_series(preset, df):
+    """Return the x and y values of a calculated preset for one spreadsheet."""
+    if preset == "calc_1":
+        return np.log(df['p'].to_numpy()), df['e'].to_numpy()
+    if preset == "calc_2":
+        return df['axial_strain'].to_numpy(), (df['q'] / df['p']).to_numpy()
+    qmax = df['q'].max()
+    return df['p'].to_numpy(), (qmax / df['p']).to_numpy()
+
+def webgl_threshold():
+    """Points in a figure above which its traces are drawn with WebGL (PLOT_WEBGL_THRESHOLD, default 10000)."""
+    try:
+        return int(os.getenv('PLOT_WEBGL_THRESHOLD', 10000))
+    except ValueError:
+        return 10000
+
+def make_trace(x, y, table_name, y_name, x_name, color, webgl=False):
+    # SVG markers become unusable beyond tens of thousands of points; Scattergl takes the same attributes
+    trace_type = go.Scattergl if webgl else go.Scatter
+    return trace_type(
+        x=x,
+        y=y,
+        mode='markers',
+        name=f"{table_name} - {y_name}",
+        marker=dict(color=color),
+        meta=table_name,  # One value per trace instead of a repeated per-point text array
+        hovertemplate=(
+            f"<b>{y_name}</b>: %{{y}}<br>"
+            f"<b>{x_name}</b>: %{{x}}<br>"
+            f"<b>Spreadsheet</b>: %{{meta}}<br>"
+            "<extra></extra>"
+        )
+    )
+
+def spreadsheet_series(df, preset, x_axis, y_axis, selected_y_columns):
+    """The (x name, y name, x values, y values) series a preset plots for one spreadsheet."""
+    series = []
+    if preset in CALCULATED_PRESETS:
+        x_name, y_preset = CALCULATED_PRESETS[preset]
+        x_values, y_values = calculated_series(preset, df)
+        series.append((x_name, y_preset, x_values, y_values))
+        for y in np.unique(selected_y_columns):
+            series.append((x_name, y, x_values, df[y].to_numpy()))
+    else:
+        for y in np.unique(y_axis):
+            series.append((x_axis, y, df[x_axis].to_numpy(), df[y].to_numpy()))
+    return series
+
+def build_spreadsheet_traces(df, table_name, color, preset, x_axis, y_axis, selected_y_columns, points_before=0):
+    """Build the traces of a single spreadsheet, so no cross-spreadsheet frame is ever needed.
+
+    The traces are WebGL once the figure, counting the points_before already
+    plotted for other spreadsheets, exceeds webgl_threshold().
+    """
+    series = spreadsheet_series(df, preset, x_axis, y_axis, selected_y_columns)
+    webgl = points_before + sum(len(x_values) for _, _, x_values, _ in series) > webgl_threshold()
+    return [
+        make_trace(x_values, y_values, table_name, y_name, x_name, color, webgl=webgl)
+        for x_name, y_name, x_values, y_values in series
+    ]
+
+def as_webgl(trace):
+    """The Scattergl equivalent of an SVG Scatter trace; other traces are returned unchanged."""
+    if trace.type != 'scatter':
+        return trace
+    properties = trace.to_plotly_json()
+    properties.pop('type')
+    return go.Scattergl(properties)
+
+def axis_titles(preset, x_axis, y_axis, selected_y_columns):
+    """Return the x and y axis titles of a figure."""
+    if preset in CALCULATED_PRESETS:
+        x_axis, y_preset = CALCULATED_PRESETS[preset]
+        y_axis = [y_preset] + selected_y_columns  # Combining calculated column name and selected columns names
+
+    y_axis = np.unique(["p'" if y == 'p' else y for y in y_axis])  # Add apostrophe to p
+    if x_axis == 'p':
+        x_axis = "p'"
+
+    x_axis_name = x_axis.replace('_', ' ').capitalize()
+    y_axis_name = ', '.join([col.replace('_', ' ').capitalize() for col in y_axis])
+    return x_axis_name, y_axis_name
+
+def figure_layout(x_axis_name, y_axis_name):
+    """Layout shared by every plot."""
+    return dict(
+        title=f"{y_axis_name} vs {x_axis_name}",
+        xaxis_title=x_axis_name,
+        yaxis_title=y_axis_name,
+        legend_title="Source Tables",
+        hovermode='closest',
+        xaxis=dict(
+            tickformat='.2f'
+        ),
+        yaxis=dict(
+            tickformat='.2f'
+        ),
+        margin=dict(l=50, r=50, t=50, b=50),
+        dragmode='pan',
+        legend=dict(
+            x=0.95,
+            y=0.95,
+            xanchor='right',
+            yanchor='top',
+            traceorder="normal",
+            bgcolor="rgba(255, 255, 255, 0.5)",
+            bordercolor="Black",
+            borderwidth=1
+        )
+    )
@@ -0,0 +1,169 @@
+# app/profiling.py
+
+"""Opt-in per-request profiling.
+
+Nothing is profiled unless PROFILE_DIR is set. A request is then profiled when it
+carries an `X-Profile` header or a `profile` query parameter, and in addition a
+random fraction of all requests is profiled with the stack sampler. Settings
+come from the environment:
+
+    PROFILE_DIR          directory the profiles are written to; unset disables profiling
+    PROFILE_MODE         'cprofile' (default) or 'sample', used when a request asks
+                         with a value other than a mode name, e.g. X-Profile: 1
+    PROFILE_TOKEN        when set, the header/parameter value must be this token
+                         (or 'cprofile:<token>' / 'sample:<token>')
+    PROFILE_SAMPLE_RATE  fraction of all requests profiled with the sampler, default 0
+    PROFILE_INTERVAL     seconds between stack samples, default 0.005
+
+'cprofile' profiles deterministically and writes a pstats file (<name>.prof,
+readable with pstats, snakeviz or flameprof). 'sample' reads the request
+thread's stack every PROFILE_INTERVAL seconds from a background thread and
+writes collapsed stacks (<name>.folded) for flamegraph.pl or speedscope; its
+overhead is low enough to leave PROFILE_SAMPLE_RATE on in production. The file
+name is returned in the X-Profile-File response header. The body of a streamed
+response is produced after the view returns and is not part of its profile.
+"""
+
+import cProfile
+import hmac
+import itertools
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+from flask import g, request
+
+import logging
+logger = logging.getLogger(__name__)
+
+MODES = ('cprofile', 'sample')
+
+_sequence = itertools.count()
+# Only one deterministic profiler can be active per process (sys.monitoring in Python 3.12+)
+_cprofile_lock = threading.Lock()
+
+def _env_float(name, default):
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        return default
+
+class StackSampler:
+    """Counts the collapsed stacks of one thread, sampled every `interval` seconds."""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.counts = Counter()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                frame = frame.f_back
+            if stack:
+                self.counts[';'.join(reversed(stack))] += 1
+
+    def write(self, path):
+        with open(path, 'w') as f:
+            for stack, count in self.counts.most_common():
+                f.write(f'{stack} {count}\n')
+
+def requested_mode():
+    """The profiling mode of the current request, or None when it is not profiled."""
+    if not os.getenv('PROFILE_DIR'):
+        return None
+    value = request.headers.get('X-Profile') or request.args.get('profile')
+    if value:
+        mode, _, secret = value.partition(':')
+        if mode not in MODES:
+            mode, secret = os.getenv('PROFILE_MODE', 'cprofile'), value
+        token = os.getenv('PROFILE_TOKEN')
+        if token and not hmac.compare_digest(secret.encode(), token.encode()):
+            logger.warning("Ignoring a profiling request with a wrong PROFILE_TOKEN.")
+            return None
+        return mode if mode in MODES else 'cprofile'
+    if random.random() < _env_float('PROFILE_SAMPLE_RATE', 0):
+        return 'sample'
+    return None
+
+def _start_profile():
+    mode = requested_mode()
+    if mode == 'cprofile':
+        if not _cprofile_lock.acquire(blocking=False):
+            logger.info("Another request is being profiled with cProfile; sampling this one instead.")
+            mode = 'sample'
+        else:
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError as e:  # Another profiling tool (e.g. a debugger) is active
+                _cprofile_lock.release()
+                logger.warning(f"Could not start cProfile: {e}")
+                return
+            g.profile = ('cprofile', profiler, time.perf_counter())
+            return
+    if mode == 'sample':
+        sampler = StackSampler(threading.get_ident(), _env_float('PROFILE_INTERVAL', 0.005))
+        sampler.start()
+        g.profile = ('sample', sampler, time.perf_counter())
+
+def _finish_profile():
+    """Stop the profiler of the current request and write its file. Returns the file name."""
+    mode, profiler, start = g.pop('profile')
+    elapsed = time.perf_counter() - start
+    if mode == 'cprofile':
+        profiler.disable()
+        _cprofile_lock.release()
+    else:
+        profiler.stop()
+
+    directory = os.getenv('PROFILE_DIR')
+    os.makedirs(directory, exist_ok=True)
+    endpoint = (request.endpoint or 'unknown').replace('.', '-')
+    name = (f"{datetime.now():%Y%m%d-%H%M%S}-{endpoint}-{elapsed * 1000:.0f}ms-"
+            f"{os.getpid()}-{next(_sequence)}.{'prof' if mode == 'cprofile' else 'folded'}")
+    path = os.path.join(directory, name)
+    if mode == 'cprofile':
+        profiler.dump_stats(path)
+    else:
+        profiler.write(path)
+    logger.info(f"Wrote {mode} profile of {request.method} {request.path} to {path}.")
+    return name
+
+def _profile_response(response):
+    if 'profile' in g:
+        try:
+            response.headers['X-Profile-File'] = _finish_profile()
+        except OSError as e:
+            logger.error(f"Failed to write profile: {e}")
+    return response
+
+def _profile_teardown(exc):
+    if 'profile' in g:  # The view raised, so after_request did not run
+        try:
+            _finish_profile()
+        except OSError as e:
+            logger.error(f"Failed to write profile: {e}")
+
+def init_profiling(app):
+    """Register the profiling hooks; call before other init_* hooks so their work is profiled too."""
+    app.before_request(_start_profile)
+    app.after_request(_profile_response)
+    app.teardown_request(_profile_teardown)
@@ -104,10 +104,61 @@ document
     }
   });
 
+// Spreadsheets per page of /get-tables and values per page of /get-instances
+const PAGE_SIZE = 100;
+
+// Append value checkboxes to the checklist of one instance
+function appendInstanceValues(checklist, values) {
+  const instanceName = checklist.dataset.instance;
+  values.forEach((value) => {
+    const valueCheckbox = document.createElement("input");
+    valueCheckbox.type = "checkbox";
+    valueCheckbox.id = `${instanceName}_${value}`;
+    valueCheckbox.name = `${instanceName}_values`;
+    valueCheckbox.value = value;
+
+    const valueLabel = document.createElement("label");
+    valueLabel.setAttribute("for", `${instanceName}_${value}`);
+    valueLabel.textContent = value;
+
+    checklist.appendChild(valueCheckbox);
+    checklist.appendChild(valueLabel);
+    checklist.appendChild(document.createElement("br"));
+  });
+}
+
+// Fetch the next page of an instance's values once its checklist is scrolled near the end
+function watchValueChecklist(checklist) {
+  let loading = false;
+  checklist.addEventListener("scroll", async function () {
+    const cursor = checklist.dataset.nextCursor;
+    const nearEnd =
+      checklist.scrollTop + checklist.clientHeight >= checklist.scrollHeight - 50;
+    if (!cursor || loading || !nearEnd) return;
+    loading = true;
+    try {
+      const params = new URLSearchParams({
+        name: checklist.dataset.instance,
+        cursor: cursor,
+        limit: PAGE_SIZE,
+      });
+      const response = await fetch(`/get-instances?${params}`);
+      const data = await response.json();
+      if (!response.ok) throw new Error(data.error);
+      appendInstanceValues(checklist, data.values);
+      checklist.dataset.nextCursor = data.next_cursor || "";
+    } catch (error) {
+      console.error("Error fetching instance values:", error);
+    } finally {
+      loading = false;
+    }
+  });
+}
+
 // Function to fetch and display instances
 async function fetchAndDisplayInstances() {
   try {
-    const response = await fetch("/get-instances");
+    const response = await fetch(`/get-instances?limit=${PAGE_SIZE}`);
     const data = await response.json();
     const instanceSelection = document.getElementById("instance-selection");
     instanceSelection.innerHTML = ""; // Clear existing options
@@ -140,22 +191,26 @@ async function fetchAndDisplayInstances() {
         const checklist = document.createElement("div");
         checklist.className = "value-checklist";
         checklist.style.display = "none";
-
-        values.forEach((value) => {
-          const valueCheckbox = document.createElement("input");
-          valueCheckbox.type = "checkbox";
-          valueCheckbox.id = `${instanceName}_${value}`;
-          valueCheckbox.name = `${instanceName}_values`;
-          valueCheckbox.value = value;
-
-          const valueLabel = document.createElement("label");
-          valueLabel.setAttribute("for", `${instanceName}_${value}`);
-          valueLabel.textContent = value;
-
-          checklist.appendChild(valueCheckbox);
-          checklist.appendChild(valueLabel);
+        checklist.dataset.instance = instanceName;
+        checklist.dataset.nextCursor =
+          (data.next_cursors && data.next_cursors[instanceName]) || "";
+
+        // Numeric instances can also be filtered by range
+        const range = data.ranges && data.ranges[instanceName];
+        if (range) {
+          ["min", "max"].forEach((bound) => {
+            const input = document.createElement("input");
+            input.type = "number";
+            input.step = "any";
+            input.id = `${instanceName}_${bound}`;
+            input.placeholder = `${bound} ${range[bound]}`;
+            checklist.appendChild(input);
+          });
           checklist.appendChild(document.createElement("br"));
-        });
+        }
+
+        appendInstanceValues(checklist, values);
+        watchValueChecklist(checklist);
 
         div.appendChild(checklist);
         instanceSelection.appendChild(div);
@@ -171,36 +226,194 @@ async function fetchAndDisplayInstances() {
   }
 }
 
-// Modify refreshTableList to also fetch instances
-async function refreshTableList() {
-  try {
-    const [tablesResponse, instancesResponse] = await Promise.all([
-      fetch("/get-tables"),
-      fetch("/get-instances"),
-    ]);
+// Spreadsheet lists only render the rows in view and fetch further pages from
+// /get-tables as they are scrolled, so thousands of spreadsheets stay cheap.
+const TABLE_ROW_HEIGHT = 24; // px, the height of .paged-list-row in style.css
+
+class TableList {
+  constructor(container) {
+    this.container = container;
+    this.group = container.dataset.group;
+    this.items = JSON.parse(container.dataset.items || "[]");
+    this.nextCursor = container.dataset.nextCursor || null;
+    this.prefix = "";
+    this.loading = false;
+    this.generation = 0; // Responses to an older search or reload are dropped
+    // Everything starts checked; `toggled` holds the names that differ from allChecked
+    this.allChecked = true;
+    this.toggled = new Set();
+
+    this.spacer = document.createElement("div");
+    this.rows = document.createElement("div");
+    this.rows.style.position = "absolute";
+    this.rows.style.left = "0";
+    this.rows.style.right = "0";
+    container.appendChild(this.spacer);
+    container.appendChild(this.rows);
+    container.addEventListener("scroll", () => this.scheduleRender());
+    this.render();
+  }
 
-    const tablesData = await tablesResponse.json();
-    const instancesData = await instancesResponse.json();
+  isChecked(name) {
+    return this.allChecked !== this.toggled.has(name);
+  }
 
-    const tableCheckboxes = document.getElementById("table-checkboxes");
-    tableCheckboxes.innerHTML = ""; // Clear existing options
-    tablesData.tables.forEach((table) => {
-      const checkbox = document.createElement("input");
-      checkbox.type = "checkbox";
-      checkbox.name = "table_name[]";
-      checkbox.value = table;
-      checkbox.checked = true; // Ensure all are checked by default
+  setChecked(name, checked) {
+    if (checked === this.allChecked) {
+      this.toggled.delete(name);
+    } else {
+      this.toggled.add(name);
+    }
+  }
 
-      const label = document.createElement("label");
-      label.textContent = table;
+  setAll(checked) {
+    this.allChecked = checked;
+    this.toggled.clear();
+    this.render();
+  }
+
+  // Form fields of the selection: the whole list less what was unchecked, or only what was checked
+  appendSelection(formData) {
+    if (this.allChecked) {
+      formData.append("table_group[]", this.group);
+      this.toggled.forEach((name) => formData.append("exclude_table[]", name));
+    } else {
+      this.toggled.forEach((name) => formData.append("table_name[]", name));
+    }
+  }
+
+  async fetchPage(cursor) {
+    const params = new URLSearchParams({ group: this.group, limit: PAGE_SIZE });
+    if (this.prefix) params.set("q", this.prefix);
+    if (cursor) params.set("cursor", cursor);
+    const response = await fetch(`/get-tables?${params}`);
+    const data = await response.json();
+    if (!response.ok) throw new Error(data.error);
+    return data;
+  }
+
+  async reload() {
+    const generation = ++this.generation;
+    this.loading = true;
+    try {
+      const data = await this.fetchPage(null);
+      if (generation !== this.generation) return;
+      this.items = data.tables;
+      this.nextCursor = data.next_cursor;
+      this.container.scrollTop = 0;
+    } finally {
+      if (generation === this.generation) this.loading = false;
+    }
+    this.render();
+  }
 
-      tableCheckboxes.appendChild(checkbox);
-      tableCheckboxes.appendChild(label);
-      tableCheckboxes.appendChild(document.createElement("br"));
+  async search(prefix) {
+    this.prefix = prefix;
+    await this.reload();
+  }
+
+  async loadMore() {
+    if (!this.nextCursor || this.loading) return;
+    const generation = this.generation;
+    this.loading = true;
+    try {
+      const data = await this.fetchPage(this.nextCursor);
+      if (generation !== this.generation) return;
+      this.items = this.items.concat(data.tables);
+      this.nextCursor = data.next_cursor;
+    } catch (error) {
+      console.error("Error fetching spreadsheets:", error);
+      this.nextCursor = null; // Stop retrying on every scroll; a refresh starts over
+    } finally {
+      if (generation === this.generation) this.loading = false;
+    }
+    this.render();
+  }
+
+  scheduleRender() {
+    if (this.renderPending) return;
+    this.renderPending = true;
+    requestAnimationFrame(() => {
+      this.renderPending = false;
+      this.render();
     });
+  }
+
+  render() {
+    this.spacer.style.height = `${this.items.length * TABLE_ROW_HEIGHT}px`;
+    const first = Math.floor(this.container.scrollTop / TABLE_ROW_HEIGHT);
+    // A hidden list has no height yet; render a screenful so it is not empty when shown
+    const visible =
+      Math.ceil((this.container.clientHeight || 300) / TABLE_ROW_HEIGHT) + 1;
+    const last = Math.min(first + visible, this.items.length);
+
+    this.rows.style.top = `${first * TABLE_ROW_HEIGHT}px`;
+    this.rows.innerHTML = "";
+    for (let index = first; index < last; index++) {
+      const name = this.items[index].spreadsheet_name;
+      const row = document.createElement("div");
+      row.className = "paged-list-row";
+      const label = document.createElement("label");
+      label.title = name;
+      const checkbox = document.createElement("input");
+      checkbox.type = "checkbox"; // No name: the selection is sent by appendSelection
+      checkbox.checked = this.isChecked(name);
+      checkbox.addEventListener("change", () =>
+        this.setChecked(name, checkbox.checked),
+      );
+      label.appendChild(checkbox);
+      label.appendChild(document.createTextNode(name));
+      row.appendChild(label);
+      this.rows.appendChild(row);
+    }
+    if (this.items.length === 0) {
+      this.rows.textContent = this.prefix
+        ? "No spreadsheets match the search."
+        : "No spreadsheets.";
+    }
+
+    // Fetch the next page while a screenful of loaded rows is still left
+    if (last + visible >= this.items.length) this.loadMore();
+  }
+}
+
+const tableLists = {
+  public: new TableList(document.getElementById("table-checkboxes")),
+  encrypted: new TableList(
+    document.getElementById("encrypted-table-checkboxes"),
+  ),
+};
+
+// Server-rendered instance checklists also fetch their further values on scroll
+document.querySelectorAll(".value-checklist").forEach(watchValueChecklist);
+
+// Search both spreadsheet lists by name prefix, once typing pauses
+let tableSearchTimer = null;
+document.getElementById("table-search").addEventListener("input", function () {
+  clearTimeout(tableSearchTimer);
+  const prefix = this.value.trim();
+  tableSearchTimer = setTimeout(() => {
+    Object.values(tableLists).forEach((list) =>
+      list.search(prefix).catch((error) => {
+        console.error("Error searching spreadsheets:", error);
+      }),
+    );
+  }, 200);
+});
+// Enter searches rather than submitting the filter form
+document.getElementById("table-search").addEventListener("keydown", function (event) {
+  if (event.key === "Enter") event.preventDefault();
+});
+
+// Refresh the spreadsheet lists, then the instances and statistics
+async function refreshTableList() {
+  try {
+    // Back to the first page of each list, keeping the search and what is checked
+    await Promise.all(Object.values(tableLists).map((list) => list.reload()));
 
     // Now, fetch and display instances
     await fetchAndDisplayInstances();
+    await fetchStatisticNames();
   } catch (error) {
     console.error("Error refreshing table and instance lists:", error);
     await showMessage(
@@ -223,13 +436,9 @@ document
     // Determine if Custom Graph is selected
     const isCustomGraph = document.getElementById("custom-graph").checked;
 
-    // Collect selected tables
-    let selectedTables = [];
+    // Selected tables are sent by each list (see TableList.appendSelection)
     if (document.getElementById("select-individual").checked) {
-      selectedTables = Array.from(
-        document.querySelectorAll('input[name="table_name[]"]:checked'),
-      ).map((checkbox) => checkbox.value);
-      console.log("Selected Tables:", selectedTables);
+      console.log("Selected Tables:", tableLists);
     } else {
       // If individual selection not enabled, backend handles selection based on password
       console.log("Individual Spreadsheet Selection not enabled.");
@@ -247,8 +456,18 @@ document
           .forEach((valueCheckbox) => {
             selectedValues.push(valueCheckbox.value);
           });
-        if (selectedValues.length > 0) {
-          instances.push({ name: instanceName, values: selectedValues });
+        // Range bounds of numeric instances, e.g. density 1.5–1.7
+        const bounds = {};
+        ["min", "max"].forEach((bound) => {
+          const input = document.getElementById(`${instanceName}_${bound}`);
+          bounds[bound] = input && input.value !== "" ? parseFloat(input.value) : null;
+        });
+        if (
+          selectedValues.length > 0 ||
+          bounds.min !== null ||
+          bounds.max !== null
+        ) {
+          instances.push({ name: instanceName, values: selectedValues, ...bounds });
         }
       });
     console.log("Collected Instances:", instances);
@@ -308,9 +527,10 @@ document
 
     // Include selected tables and instances in form data
     if (document.getElementById("select-individual").checked) {
-      selectedTables.forEach((table) => formData.append("table_name[]", table));
+      Object.values(tableLists).forEach((list) => list.appendSelection(formData));
     }
     formData.append("instances_json", JSON.stringify(instances));
+    formData.append("stats_json", JSON.stringify(statFilters));
 
     // Include preset, x_axis, and y_axis in form data
     formData.append("preset-options", preset);
@@ -323,34 +543,37 @@ document
     const decryptPassword = document.getElementById("decrypt_password").value;
     formData.append("decrypt_password", decryptPassword);
 
+    if (document.getElementById("ensemble").checked) {
+      await plotEnsemble(formData);
+      return;
+    }
+
+    // Traces arrive per spreadsheet as NDJSON lines, see stream_plot() in main.py
+    formData.append("stream", "true");
+
     try {
       const response = await fetch("/plot", {
         method: "POST",
         body: formData,
       });
-      const data = await response.json();
 
       // Clear all three divs before proceeding
       document.getElementById("file-passing").innerHTML = ""; // Clear file passing messages
 
-      console.log("Response from /plot:", data);
-      if (data.graph_json) {
-        const plotData = JSON.parse(data.graph_json);
-        Plotly.react("plot-container", plotData.data, plotData.layout);
-
-        // Display all messages in the popup
-        if (data.plot_messages && data.plot_messages.length > 0) {
-          showPopup(data.plot_messages);
-        }
-      } else if (data.error) {
-        await showMessage(data.error, false, "plot-message-area");
-      } else {
+      const contentType = response.headers.get("Content-Type") || "";
+      if (!contentType.includes("application/x-ndjson")) {
+        // Validation errors and the lock are reported as a single JSON object
+        const data = await response.json();
+        console.log("Response from /plot:", data);
         await showMessage(
-          "An unknown error occurred.",
+          data.error || data.message || "An unknown error occurred.",
           false,
           "plot-message-area",
         );
+        return;
       }
+
+      await readPlotStream(response);
     } catch (error) {
       console.error("Error:", error);
       await showMessage(
@@ -361,6 +584,177 @@ document
     }
   });
 
+// Summarise the selection as mean/median/percentile envelopes on a common x grid
+async function plotEnsemble(formData) {
+  try {
+    const response = await fetch("/ensemble", {
+      method: "POST",
+      body: formData,
+    });
+    const data = await response.json();
+
+    document.getElementById("file-passing").innerHTML = ""; // Clear file passing messages
+
+    console.log("Response from /ensemble:", data);
+    if (data.graph) {
+      Plotly.react("plot-container", data.graph.data, data.graph.layout);
+      if (data.plot_messages && data.plot_messages.length > 0) {
+        showPopup(data.plot_messages);
+      }
+    } else {
+      await showMessage(
+        data.error || data.message || "An unknown error occurred.",
+        false,
+        "plot-message-area",
+      );
+    }
+  } catch (error) {
+    console.error("Error:", error);
+    await showMessage(
+      "An error occurred while generating the ensemble.",
+      false,
+      "plot-message-area",
+    );
+  }
+}
+
+// Draw a streamed /plot response, adding each spreadsheet's traces as soon as its line arrives
+async function readPlotStream(response) {
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffered = "";
+
+  const handleLine = async (line) => {
+    if (!line.trim()) return;
+    const data = JSON.parse(line);
+    if (data.layout) {
+      await Plotly.newPlot("plot-container", [], data.layout);
+    } else if (data.traces) {
+      // Traces turn WebGL (scattergl) once the figure gets dense; convert the SVG ones drawn so far
+      // too, so the whole overlay pans and zooms on the GPU
+      const plotDiv = document.getElementById("plot-container");
+      if (data.traces.some((trace) => trace.type === "scattergl")) {
+        const svgTraces = plotDiv.data
+          .map((trace, index) => ((trace.type || "scatter") === "scatter" ? index : -1))
+          .filter((index) => index >= 0);
+        if (svgTraces.length > 0) {
+          await Plotly.restyle(plotDiv, { type: "scattergl" }, svgTraces);
+        }
+      }
+      await Plotly.addTraces(plotDiv, data.traces);
+    } else if (data.error) {
+      await showMessage(data.error, false, "plot-message-area");
+      if (data.plot_messages && data.plot_messages.length > 0) {
+        showPopup(data.plot_messages);
+      }
+    } else if (data.done) {
+      console.log("Streamed plot complete:", data.plot_messages);
+      if (data.plot_messages && data.plot_messages.length > 0) {
+        showPopup(data.plot_messages);
+      }
+    }
+  };
+
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffered += decoder.decode(value, { stream: true });
+    const lines = buffered.split("\n");
+    buffered = lines.pop(); // Keep the incomplete last line for the next chunk
+    for (const line of lines) {
+      await handleLine(line);
+    }
+  }
+  await handleLine(buffered + decoder.decode());
+}
+
+// Data filters on the per-spreadsheet statistics, e.g. { stat: "qmax", min: 300, max: null }
+let statFilters = [];
+
+async function fetchStatisticNames() {
+  try {
+    const response = await fetch("/spreadsheet-stats");
+    const data = await response.json();
+    const select = document.getElementById("stat-name");
+    const current = select.value;
+    select.innerHTML = "";
+    data.statistics.forEach((name) => {
+      const option = document.createElement("option");
+      option.value = name;
+      option.textContent = name.replaceAll("_", " ");
+      select.appendChild(option);
+    });
+    if (current) select.value = current;
+  } catch (error) {
+    console.error("Error fetching statistic names:", error);
+  }
+}
+
+async function renderStatFilters() {
+  const list = document.getElementById("stat-filters");
+  list.innerHTML = "";
+  statFilters.forEach((filter, index) => {
+    const item = document.createElement("li");
+    const lower = filter.min === null ? "" : `${filter.min} ≤ `;
+    const upper = filter.max === null ? "" : ` ≤ ${filter.max}`;
+    item.textContent = `${lower}${filter.stat.replaceAll("_", " ")}${upper} `;
+
+    const remove = document.createElement("button");
+    remove.type = "button";
+    remove.textContent = "Remove";
+    remove.onclick = function () {
+      statFilters.splice(index, 1);
+      renderStatFilters();
+    };
+    item.appendChild(remove);
+    list.appendChild(item);
+  });
+
+  // Preview which spreadsheets the filters keep, without loading any rows
+  const matches = document.getElementById("stat-matches");
+  if (statFilters.length === 0) {
+    matches.textContent = "";
+    return;
+  }
+  try {
+    const params = new URLSearchParams({
+      predicates: JSON.stringify(statFilters),
+    });
+    const response = await fetch(`/spreadsheet-stats?${params}`);
+    const data = await response.json();
+    if (data.error) {
+      matches.textContent = data.error;
+      return;
+    }
+    const names = data.spreadsheets.map((s) => s.spreadsheet_name);
+    matches.textContent = `${names.length} spreadsheet(s) match: ${names.join(", ")}`;
+  } catch (error) {
+    console.error("Error filtering by statistics:", error);
+  }
+}
+
+document
+  .getElementById("add-stat-filter")
+  .addEventListener("click", function () {
+    const stat = document.getElementById("stat-name").value;
+    const min = document.getElementById("stat-min").value;
+    const max = document.getElementById("stat-max").value;
+    if (!stat || (min === "" && max === "")) {
+      showMessage(
+        "Choose a statistic and a minimum and/or maximum.",
+        false,
+        "plot-message-area",
+      );
+      return;
+    }
+    statFilters.push({
+      stat: stat,
+      min: min === "" ? null : Number(min),
+      max: max === "" ? null : Number(max),
+    });
+    renderStatFilters();
+  });
+
 // Function to toggle visibility of instance value checklists
 function toggleValueChecklist(checkbox) {
   const valueChecklist =
@@ -398,13 +792,12 @@ document
     const individualSelection = document.getElementById("individual-selection");
     if (this.checked) {
       individualSelection.style.display = "block";
+      // The lists could not measure their height while hidden
+      Object.values(tableLists).forEach((list) => list.render());
     } else {
       individualSelection.style.display = "none";
       // Reset selections to plot all
-      const allCheckboxes = document.querySelectorAll(
-        '#individual-selection input[type="checkbox"]',
-      );
-      allCheckboxes.forEach((checkbox) => (checkbox.checked = true));
+      Object.values(tableLists).forEach((list) => list.setAll(true));
     }
   });
 
@@ -425,23 +818,14 @@ document.getElementById("custom-graph").addEventListener("change", function () {
 
 // Clear all public selections
 document.getElementById("clear-public").addEventListener("click", function () {
-  const publicCheckboxes = document.querySelectorAll(
-    '#public-tables input[type="checkbox"]',
-  );
-  publicCheckboxes.forEach((checkbox) => {
-    checkbox.checked = false; // Uncheck the checkbox
-    checkbox.removeAttribute("checked"); // Remove the 'checked' attribute
-  });
+  tableLists.public.setAll(false);
 });
 
 // Clear all encrypted selections
 document
   .getElementById("clear-encrypted")
   .addEventListener("click", function () {
-    const encryptedCheckboxes = document.querySelectorAll(
-      '#encrypted-tables input[type="checkbox"]',
-    );
-    encryptedCheckboxes.forEach((checkbox) => (checkbox.checked = false));
+    tableLists.encrypted.setAll(false);
   });
 
 // Automatically select all encrypted tables if password is provided upon form submission
@@ -450,9 +834,6 @@ document
   .addEventListener("submit", function (event) {
     const decryptPassword = document.getElementById("decrypt_password").value;
     if (decryptPassword) {
-      const encryptedCheckboxes = document.querySelectorAll(
-        '#encrypted-tables input[type="checkbox"]',
-      );
-      encryptedCheckboxes.forEach((checkbox) => (checkbox.checked = true));
+      tableLists.encrypted.setAll(true);
     }
   });
@@ -0,0 +1,207 @@
+# app/watch_folder.py
+
+"""`flask ingest`: ingest the workbooks of a folder (e.g. the IRDS share) and optionally keep watching it.
+
+The folder is polled: every pass lists the .xlsx files below it and compares
+their size and mtime with the ingest_checkpoints table of the project, so
+only new or changed workbooks are touched and a restarted command resumes
+where it stopped. Changed workbooks are hashed and parsed in worker processes,
+then stored batch by batch under the project lock, through the same
+ingest_workbook() path as POST /upload. A checkpoint is written in the same
+transaction as the workbook's data, so a crash never marks a file as done
+without its data.
+"""
+
+import concurrent.futures
+import multiprocessing
+import os
+import time
+from datetime import datetime
+
+import click
+from flask.cli import with_appcontext
+from werkzeug.utils import secure_filename
+
+from app.blueprints.main import acquire_lock, release_lock
+from app.database import activate_project, IngestCheckpoint, db
+from app.ingestion import commit_upload_group, ingest_workbook, parse_workbook_path
+
+import logging
+logger = logging.getLogger(__name__)
+
+# Workbooks Excel still has open on the share ("~$name.xlsx" owner files)
+TEMPORARY_PREFIX = '~$'
+
+def scan_folder(folder):
+    """Yield (path, size, mtime) of every workbook below folder."""
+    directories = [folder]
+    while directories:
+        try:
+            with os.scandir(directories.pop()) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        directories.append(entry.path)
+                    elif (entry.is_file() and entry.name.lower().endswith('.xlsx')
+                          and not entry.name.startswith(TEMPORARY_PREFIX)):
+                        stat = entry.stat()
+                        yield os.path.abspath(entry.path), stat.st_size, stat.st_mtime
+        except OSError as e:
+            logger.warning(f"Could not list '{e.filename}': {e}")
+
+def find_changed_workbooks(folder, settle):
+    """Workbooks whose size or mtime differ from their checkpoint, oldest first.
+
+    Files modified less than `settle` seconds ago are left for a later pass,
+    they may still be being copied onto the share.
+    """
+    checkpoints = {path: (size, mtime) for path, size, mtime in
+                   db.session.query(IngestCheckpoint.path, IngestCheckpoint.size, IngestCheckpoint.mtime)}
+    now = time.time()
+    changed = [
+        (path, size, mtime) for path, size, mtime in scan_folder(folder)
+        if checkpoints.get(path) != (size, mtime) and now - mtime >= settle
+    ]
+    return sorted(changed, key=lambda workbook: workbook[2])
+
+def spreadsheet_name(path):
+    return secure_filename(os.path.basename(path)).rsplit('.', 1)[0]
+
+def save_checkpoint(path, size, mtime, file_digest, status, name=None, message=None):
+    checkpoint = IngestCheckpoint.query.filter_by(path=path).first()
+    if checkpoint is None:
+        checkpoint = IngestCheckpoint(path=path)
+        db.session.add(checkpoint)
+    checkpoint.size = size
+    checkpoint.mtime = mtime
+    checkpoint.file_digest = file_digest
+    checkpoint.status = status
+    checkpoint.spreadsheet_name = name
+    checkpoint.message = message
+    checkpoint.ingested_at = datetime.utcnow()
+
+def name_taken_by(path, name):
+    """Another watched workbook already stored under the same spreadsheet name, if any."""
+    return IngestCheckpoint.query.filter(
+        IngestCheckpoint.spreadsheet_name == name,
+        IngestCheckpoint.path != path,
+        IngestCheckpoint.status.in_(('stored', 'updated'))
+    ).first()
+
+def store_batch(batch, parsed_batch, password, update_existing, counts):
+    """Store parsed workbooks and their checkpoints in one transaction, a savepoint per workbook."""
+    pending = []
+    for (path, size, mtime), parsed in zip(batch, parsed_batch):
+        name = spreadsheet_name(path)
+        file_start = time.perf_counter()
+        owner = None if 'error' in parsed or parsed.get('unchanged') else name_taken_by(path, name)
+        if 'error' in parsed:
+            outcome = {'status': 'failed', 'reason': parsed['error']}
+        elif parsed.get('unchanged'):
+            outcome = {'status': 'unchanged'}
+        elif owner is not None:
+            outcome = {'status': 'failed', 'reason': f"Spreadsheet name '{name}' is already used by '{owner.path}'."}
+        else:
+            savepoint = db.session.begin_nested()
+            try:
+                outcome = ingest_workbook(None, name, password, update_existing,
+                                          file_digest=parsed['file_digest'], parsed=parsed)
+            except Exception as e:
+                logger.exception(f"Unexpected error while ingesting '{path}': {e}")
+                outcome = {'status': 'failed', 'reason': 'An unexpected error occurred.'}
+            if outcome['status'] == 'failed':
+                savepoint.rollback()
+            else:
+                savepoint.commit()
+
+        counts[outcome['status']] = counts.get(outcome['status'], 0) + 1
+        if outcome['status'] == 'unchanged':
+            # Touched but identical bytes: only the size and mtime of the checkpoint move
+            checkpoint = IngestCheckpoint.query.filter_by(path=path).first()
+            checkpoint.size, checkpoint.mtime = size, mtime
+            continue
+        if outcome['status'] == 'failed':
+            logger.warning(f"Failed to ingest '{path}': {outcome['reason']}")
+        else:
+            logger.info(f"Ingested '{path}' as '{name}' ({outcome['status']}).")
+        stored_as = None if outcome['status'] == 'failed' else outcome.get('duplicate_of', name)
+        save_checkpoint(path, size, mtime, parsed.get('file_digest'), outcome['status'],
+                        stored_as, outcome.get('reason') or outcome.get('message'))
+        if outcome['status'] in ('stored', 'updated'):
+            pending.append((outcome['spreadsheet'], outcome['df'], time.perf_counter() - file_start))
+    commit_upload_group(pending)
+
+def ingest_pass(folder, executor, password, update_existing, batch_size, settle):
+    """Ingest every new or changed workbook of folder once. Returns the number of workbooks per outcome."""
+    changed = find_changed_workbooks(folder, settle)
+    counts = {}
+    if not changed:
+        return counts
+    logger.info(f"Found {len(changed)} new or changed workbooks in '{folder}'.")
+    known_digests = {path: digest for path, digest in db.session.query(
+        IngestCheckpoint.path, IngestCheckpoint.file_digest).filter(IngestCheckpoint.status != 'failed')}
+
+    for start in range(0, len(changed), batch_size):
+        batch = changed[start:start + batch_size]
+        # Parsing needs no lock; only storing the parsed batch does
+        parsed_batch = list(executor.map(
+            parse_workbook_path, [path for path, _, _ in batch], [known_digests.get(path) for path, _, _ in batch]
+        ))
+        if not acquire_lock():
+            logger.warning("Lock acquisition failed; the remaining workbooks are retried on the next pass.")
+            break
+        try:
+            store_batch(batch, parsed_batch, password, update_existing, counts)
+        except Exception:
+            db.session.rollback()
+            raise
+        finally:
+            release_lock()
+    return counts
+
+class InlineExecutor:
+    """executor.map in the calling process, for --workers 1."""
+    def map(self, func, *iterables):
+        return map(func, *iterables)
+
+    def shutdown(self, wait=True):
+        pass
+
+@click.command('ingest')
+@click.argument('folder', required=False, envvar='INGEST_FOLDER')
+@click.option('--project', help='Project to ingest into (default: the default project).')
+@click.option('--watch', is_flag=True, help='Keep polling the folder instead of exiting after one pass.')
+@click.option('--interval', type=float, default=60.0, show_default=True, help='Seconds between polls with --watch.')
+@click.option('--workers', type=int, default=lambda: os.cpu_count() or 1, help='Processes parsing workbooks in parallel.')
+@click.option('--batch-size', type=int, default=10, show_default=True, help='Workbooks stored per lock and commit.')
+@click.option('--settle', type=float, default=10.0, show_default=True,
+              help='Skip workbooks modified less than this many seconds ago.')
+@click.option('--encrypt-password', envvar='INGEST_ENCRYPT_PASSWORD', help='Encrypt the ingested spreadsheets.')
+@click.option('--update/--no-update', 'update_existing', default=True, show_default=True,
+              help='Incrementally update spreadsheets whose workbook changed.')
+@with_appcontext
+def ingest_command(folder, project, watch, interval, workers, batch_size, settle, encrypt_password, update_existing):
+    """Ingest new or changed .xlsx workbooks below FOLDER (or INGEST_FOLDER)."""
+    if not folder:
+        raise click.UsageError('Pass FOLDER or set INGEST_FOLDER.')
+    if not os.path.isdir(folder):
+        raise click.UsageError(f"'{folder}' is not a directory.")
+    try:
+        activate_project(project)
+    except LookupError as e:
+        raise click.ClickException(str(e))
+
+    # Worker processes are spawned rather than forked: they need none of this process's engines or threads
+    executor = (concurrent.futures.ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn'))
+                if workers > 1 else InlineExecutor())
+    try:
+        while True:
+            counts = ingest_pass(folder, executor, encrypt_password, update_existing, max(batch_size, 1), settle)
+            if counts:
+                click.echo(', '.join(f'{count} {status}' for status, count in sorted(counts.items())))
+            if not watch:
+                break
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        executor.shutdown()
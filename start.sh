@@ -475,7 +475,7 @@ echo "DATABASE_PATH is set to: $DATABASE_PATH"
 
 wait_for_flask() {
     echo "Waiting for Flask to start..."
-    until curl -s http://127.0.0.1:5123 > /dev/null; do
+    until curl -s http://127.0.0.1:5123/healthz > /dev/null; do
         sleep 2
         echo -n "."
     done
@@ -0,0 +1,231 @@
+# tests/benchmarks/run_benchmarks.py
+
+"""Time the ingest and plot paths against a temporary SQLite database.
+
+Generates synthetic workbooks (see workbook_generator.py), then times
+data_extractor, find_instances, insert_data_to_db (plain and encrypted),
+POST /plot and the time to the first trace of a streamed /plot for every
+preset. Results are written as JSON, tagged with the git commit, so runs can
+be compared across commits:
+
+    python -m tests.benchmarks.run_benchmarks --preset small --output before.json
+    python -m tests.benchmarks.run_benchmarks --preset small --compare before.json
+"""
+
+import argparse
+import io
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, REPO_ROOT)
+
+from tests.benchmarks.workbook_generator import generate_workbook
+
+# rows per workbook, number of workbooks, timed repetitions of each /plot request
+PRESETS = {
+    'smoke': dict(rows=200, files=2, repeat=1),
+    'small': dict(rows=1000, files=5, repeat=3),
+    'medium': dict(rows=10000, files=10, repeat=3),
+    'large': dict(rows=50000, files=20, repeat=3),
+}
+
+PLOT_PRESETS = ['non_calc_1', 'non_calc_2', 'non_calc_3', 'calc_1', 'calc_2', 'calc_3']
+
+PASSWORD = 'benchmark-password'
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def summarise(stage, samples, rows=None):
+    result = {
+        'stage': stage,
+        'samples': samples,
+        'min': min(samples),
+        'median': statistics.median(samples),
+        'mean': statistics.mean(samples),
+        'max': max(samples),
+    }
+    if rows:
+        result['rows'] = rows
+        result['rows_per_second'] = rows / sum(samples) if sum(samples) else None
+    return result
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    value = func(*args, **kwargs)
+    return time.perf_counter() - start, value
+
+def run(rows, files, repeat, series_store=False):
+    workdir = tempfile.mkdtemp(prefix='soil-bench-')
+    # Must be set before the app is imported: main.py reads LOCKFILE_PATH at import time
+    os.environ['DATABASE_PATH'] = os.path.join(workdir, 'soil_tests.db')
+    os.environ['LOCKFILE_PATH'] = os.path.join(workdir, 'lock.lock')
+    if series_store:
+        os.environ['SERIES_STORE_PATH'] = os.path.join(workdir, 'series')
+    else:
+        os.environ.pop('SERIES_STORE_PATH', None)
+
+    from werkzeug.datastructures import FileStorage
+    from app import create_app
+    from app.database import derive_key, new_data_key, db, Spreadsheet, data_extractor, find_instances, insert_data_to_db, insert_instances_to_db
+
+    app = create_app()
+    client = app.test_client()
+    results = []
+
+    workbooks = [generate_workbook(rows, seed=seed) for seed in range(files)]
+
+    def upload(index, data):
+        return FileStorage(io.BytesIO(data), filename=f'synthetic_{index:04d}.xlsx')
+
+    extract_samples, frames = [], []
+    for index, data in enumerate(workbooks):
+        elapsed, df = timed(data_extractor, upload(index, data), '03 - Shearing')
+        extract_samples.append(elapsed)
+        frames.append(df)
+    results.append(summarise('data_extractor', extract_samples, sum(len(df) for df in frames)))
+
+    instance_samples, instances = [], []
+    for index, data in enumerate(workbooks):
+        elapsed, found = timed(find_instances, upload(index, data))
+        instance_samples.append(elapsed)
+        instances.append(found)
+    results.append(summarise('find_instances', instance_samples))
+
+    with app.app_context():
+        plain_samples = []
+        for index, df in enumerate(frames):
+            name = f'public_{index:04d}'
+            start = time.perf_counter()
+            insert_data_to_db(name, df)
+            db.session.commit()
+            plain_samples.append(time.perf_counter() - start)
+            insert_instances_to_db(name, instances[index])
+            db.session.commit()
+        results.append(summarise('insert_data_to_db', plain_samples, sum(len(df) for df in frames)))
+
+        # Key derivation is deliberately outside the timed region, it is measured by the plot below
+        kek_salt = os.urandom(16)
+        kek = derive_key(PASSWORD, kek_salt)
+        encrypted_samples = []
+        for index, df in enumerate(frames):
+            name = f'encrypted_{index:04d}'
+            iv = os.urandom(16)
+            key, wrapped_key = new_data_key(kek)
+            spreadsheet = Spreadsheet(
+                spreadsheet_name=name, public=False, encrypted=True, iv=iv,
+                kek_salt=kek_salt, wrapped_key=wrapped_key
+            )
+            db.session.add(spreadsheet)
+            db.session.flush()
+            start = time.perf_counter()
+            insert_data_to_db(name, df, spreadsheet=spreadsheet, encrypt=True, encryption_key=key, iv=iv)
+            db.session.commit()
+            encrypted_samples.append(time.perf_counter() - start)
+        results.append(summarise('insert_data_to_db[encrypted]', encrypted_samples, sum(len(df) for df in frames)))
+
+    encrypted_names = [f'encrypted_{index:04d}' for index in range(files)]
+    for plot_preset in PLOT_PRESETS:
+        for label, form in (
+            ('public', {'preset-options': plot_preset, 'instances_json': '[]'}),
+            ('encrypted', {'preset-options': plot_preset, 'instances_json': '[]',
+                           'decrypt_password': PASSWORD, 'table_name[]': encrypted_names}),
+        ):
+            client.post('/plot', data=form)  # Warm-up, also fills the series store when enabled
+            samples, size = [], 0
+            for _ in range(repeat):
+                elapsed, response = timed(client.post, '/plot', data=form)
+                if response.status_code != 200:
+                    raise RuntimeError(f'/plot {plot_preset} ({label}) returned {response.status_code}')
+                samples.append(elapsed)
+                size = len(response.data)
+            result = summarise(f'plot[{plot_preset},{label}]', samples, rows * files)
+            result['response_bytes'] = size
+            results.append(result)
+
+            # Streamed mode: time until the first spreadsheet's traces reach the client
+            first_trace_samples = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                response = client.post('/plot', data={**form, 'stream': 'true'}, buffered=False)
+                for line in response.response:
+                    if b'"traces"' in line:
+                        first_trace_samples.append(time.perf_counter() - start)
+                        break
+                response.close()
+            if first_trace_samples:
+                results.append(summarise(f'plot_stream_first_trace[{plot_preset},{label}]', first_trace_samples))
+
+    return results
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = {result['stage']: result for result in json.load(f)['results']}
+    print(f"\n{'stage':<36}{'baseline':>12}{'current':>12}{'ratio':>8}")
+    for result in results:
+        before = baseline.get(result['stage'])
+        if before is None:
+            continue
+        ratio = result['median'] / before['median'] if before['median'] else float('nan')
+        print(f"{result['stage']:<36}{before['median']:>12.4f}{result['median']:>12.4f}{ratio:>8.2f}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--preset', choices=sorted(PRESETS), default='small')
+    parser.add_argument('--rows', type=int, help='Override the shearing rows per workbook')
+    parser.add_argument('--files', type=int, help='Override the number of workbooks')
+    parser.add_argument('--repeat', type=int, help='Override the timed repetitions of each plot request')
+    parser.add_argument('--series-store', action='store_true', help='Enable the memory-mapped series store')
+    parser.add_argument('--output', help='Write the JSON results to this file instead of stdout')
+    parser.add_argument('--compare', help='Print median ratios against an earlier JSON result file')
+    parser.add_argument('--verbose', action='store_true', help='Keep the application logs')
+    args = parser.parse_args()
+
+    config = dict(PRESETS[args.preset])
+    for option in ('rows', 'files', 'repeat'):
+        if getattr(args, option) is not None:
+            config[option] = getattr(args, option)
+
+    if not args.verbose:
+        logging.disable(logging.WARNING)
+
+    results = run(config['rows'], config['files'], config['repeat'], series_store=args.series_store)
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'preset': args.preset,
+            'series_store': args.series_store,
+            **config,
+        },
+        'results': results,
+    }
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    if args.compare:
+        compare(results, args.compare)
+
+if __name__ == '__main__':
+    main()
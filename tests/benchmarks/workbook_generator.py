@@ -0,0 +1,125 @@
+# tests/benchmarks/workbook_generator.py
+
+"""Generate synthetic lab workbooks in the '01 - Inputs' / '03 - Shearing' layout.
+
+The generated files have the same header rows, anchors and instance cells as the
+real lab templates, with cached numeric values instead of formulas so that
+pandas/openpyxl can read them without Excel recalculating anything.
+
+    python -m tests.benchmarks.workbook_generator --rows 5000 --files 10 --out /tmp/workbooks
+"""
+
+import argparse
+import io
+import os
+
+import numpy as np
+import openpyxl
+
+INSTANCE_CHOICES = {
+    'Drainage': ['drained', 'undrained'],
+    'Shearing': ['compression', 'extension'],
+    'Anisotropy': ['isotropic', 'anisotropic'],
+    'Consolidation (10-1000)': [50, 100, 200, 357, 500, 1000],
+    'Availability': ['public'],
+    'Density': ['loose', 'medium', 'dense'],
+    'Plasticity': ['unknown', 'low', 'high'],
+    'PSD': ['sand', 'silt', 'clay'],
+}
+
+# Membrane correction table: axial strain (%) against the standard correction (kPa)
+MEMBRANE_CORRECTION = [(0, 0), (5, 0.7), (10, 1.2), (15, 1.6), (20, 2)]
+
+def _append_grid(sheet, cells):
+    """Write {(row, column): value} cells into a write-only sheet, row by row."""
+    last_row = max(row for row, _ in cells)
+    for row in range(1, last_row + 1):
+        columns = {column: value for (r, column), value in cells.items() if r == row}
+        width = max(columns) if columns else 0
+        sheet.append([columns.get(column) for column in range(1, width + 1)])
+
+def inputs_cells(rng, instances):
+    cells = {
+        (7, 3): 'General inputs and calculations', (7, 7): 'Sample dimensions', (7, 13): 'Membrane correction',
+        (9, 3): 'Soil Gs', (9, 4): round(float(rng.uniform(2.6, 2.8)), 3),
+        (10, 3): 'Liquid SG', (10, 4): 1,
+        (11, 3): 'Membrane thickness', (11, 4): 0.2, (11, 5): 'mm',
+        (28, 3): 'Initial sample height', (28, 4): 144, (28, 5): 'mm',
+        (9, 15): 'Actual Diameter', (9, 16): round(float(rng.uniform(69, 71)), 2), (9, 17): 'mm',
+        (10, 15): 'Actual Membrane Thickness', (10, 16): 0.2, (10, 17): 'mm',
+        (11, 15): 'Mutiple Correction by', (11, 16): 0.54,
+        (13, 13): 'Axial Strain', (13, 14): 'St Correction', (13, 15): 'Correction for this test',
+        (15, 17): 'kPa/strain', (15, 18): 0.1,
+    }
+    for offset, (strain, correction) in enumerate(MEMBRANE_CORRECTION):
+        cells[(14 + offset, 13)] = strain
+        cells[(14 + offset, 14)] = correction
+        cells[(14 + offset, 15)] = round(correction * 0.54, 4)
+    for offset, (name, value) in enumerate(instances.items()):
+        cells[(40 + offset, 3)] = name
+        cells[(40 + offset, 4)] = value
+    if instances.get('Anisotropy') == 'anisotropic':
+        cells[(7, 4)] = 'from 0.3 - 1.0'
+        cells[(7, 5)] = round(float(rng.uniform(0.3, 1.0)), 2)
+    return cells
+
+def shearing_rows(rng, rows, drained):
+    """Realistic-looking shearing stage: hyperbolic q, p' following the stress path, decreasing e."""
+    axial_strain = np.linspace(0, 0.2, rows)
+    q_peak = rng.uniform(150, 600)
+    q = q_peak * (1 - np.exp(-axial_strain * rng.uniform(20, 60))) + rng.normal(0, q_peak * 0.005, rows)
+    p0 = rng.uniform(50, 500)
+    pwp = np.zeros(rows) if drained else q_peak * 0.3 * np.tanh(axial_strain * 30)
+    p = p0 + q / 3 - pwp
+    vol_strain = axial_strain * rng.uniform(0.1, 0.4) if drained else np.zeros(rows)
+    e0 = rng.uniform(0.5, 0.9)
+    e = e0 - vol_strain * (1 + e0)
+    time = np.arange(rows) * 10.0
+    return np.column_stack([time, pwp, axial_strain, vol_strain, pwp, p, q, e])
+
+def generate_workbook(rows=1000, seed=0, instances=None):
+    """Return the bytes of a synthetic lab workbook with the given number of shearing rows."""
+    rng = np.random.default_rng(seed)
+    if instances is None:
+        instances = {name: choices[int(rng.integers(len(choices)))] for name, choices in INSTANCE_CHOICES.items()}
+
+    workbook = openpyxl.Workbook(write_only=True)
+    test_info = workbook.create_sheet('00 - Test info')
+    test_info.append(['Synthetic workbook', f'seed {seed}'])
+
+    _append_grid(workbook.create_sheet('01 - Inputs'), inputs_cells(rng, instances))
+    workbook.create_sheet('02 - Consolidation').append(['Consolidation'])
+
+    shearing = workbook.create_sheet('03 - Shearing')
+    for _ in range(10):
+        shearing.append([])
+    shearing.append(['Stage no.', 'Time start of test ', 'Time start of stage ', 'Cell Pressure'] + [None] * 19
+                    + ['Shear induced PWP'])
+    shearing.append([None, '(Sec)', '(Sec)', '(kPa)'] + [None] * 20
+                    + ['Axial strain', 'Vol strain', 'Induced PWP', "p'", 'q', 'e'])
+    cell_pressure = float(rng.uniform(100, 1000))
+    for time, shear_pwp, strain, vol, pwp, p, q, e in shearing_rows(rng, rows, instances['Drainage'] == 'drained'):
+        shearing.append([10, 1000 + time, time, cell_pressure] + [None] * 19
+                        + [shear_pwp, strain, vol, pwp, p, q, e])
+
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1000, help='Shearing rows per workbook')
+    parser.add_argument('--files', type=int, default=1, help='Number of workbooks')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the first workbook')
+    parser.add_argument('--out', required=True, help='Output directory')
+    args = parser.parse_args()
+
+    os.makedirs(args.out, exist_ok=True)
+    for index in range(args.files):
+        path = os.path.join(args.out, f'synthetic_{args.seed + index:04d}.xlsx')
+        with open(path, 'wb') as f:
+            f.write(generate_workbook(args.rows, seed=args.seed + index))
+        print(path)
+
+if __name__ == '__main__':
+    main()
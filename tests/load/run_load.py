@@ -0,0 +1,291 @@
+# tests/load/run_load.py
+
+"""Fire a concurrent mix of requests at the app and report throughput, latency, 423s and lock wait.
+
+Starts the app in a threaded local server against a temporary database and
+lockfile (DATABASE_PATH, LOCKFILE_PATH), seeds it with synthetic workbooks (see
+tests/benchmarks/workbook_generator.py), then runs --concurrency clients for
+--duration seconds. Each client picks its next request from the weighted
+--mix of /upload, /plot, /get-tables and /get-instances. Lock wait is read from
+the lock_wait entry of each response's Server-Timing header. Results are
+written as JSON, tagged with the git commit, so runs can be compared:
+
+    python -m tests.load.run_load --preset small --output before.json
+    python -m tests.load.run_load --preset small --compare before.json
+"""
+
+import argparse
+import io
+import json
+import logging
+import os
+import platform
+import random
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+from datetime import datetime, timezone
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, REPO_ROOT)
+
+from tests.benchmarks.run_benchmarks import git_commit
+from tests.benchmarks.workbook_generator import generate_workbook
+
+# concurrent clients, seconds of load, rows per workbook, workbooks stored before the run,
+# distinct workbooks available to /upload
+PRESETS = {
+    'smoke': dict(concurrency=4, duration=5, rows=200, seed_files=3, upload_pool=10),
+    'small': dict(concurrency=8, duration=20, rows=1000, seed_files=5, upload_pool=40),
+    'medium': dict(concurrency=16, duration=60, rows=5000, seed_files=10, upload_pool=100),
+}
+
+DEFAULT_MIX = 'upload=1,plot=4,get-tables=4,get-instances=1'
+
+PLOT_PRESETS = ['non_calc_1', 'non_calc_2', 'non_calc_3', 'calc_1', 'calc_2', 'calc_3']
+
+REQUEST_TIMEOUT = 300
+
+def parse_mix(text):
+    """Parse 'upload=1,plot=4' into {'upload': 1.0, 'plot': 4.0}. Raises ValueError on malformed input."""
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        if name not in ('upload', 'plot', 'get-tables', 'get-instances'):
+            raise ValueError(f"Unknown request type '{name}' in the mix.")
+        mix[name] = float(weight or 1)
+    if not any(weight > 0 for weight in mix.values()):
+        raise ValueError('The mix needs at least one request type with a positive weight.')
+    return mix
+
+def multipart(fields, files):
+    """Encode form fields and (name, filename, data) files as multipart/form-data."""
+    boundary = uuid.uuid4().hex
+    body = io.BytesIO()
+    for name, value in fields.items():
+        body.write(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    for name, filename, data in files:
+        body.write(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+            'Content-Type: application/vnd.openxmlformats-officedocument.spreadsheetml.sheet\r\n\r\n'.encode()
+        )
+        body.write(data)
+        body.write(b'\r\n')
+    body.write(f'--{boundary}--\r\n'.encode())
+    return body.getvalue(), f'multipart/form-data; boundary={boundary}'
+
+def lock_wait(server_timing):
+    """Seconds of the lock_wait entry of a Server-Timing header, or None."""
+    for entry in (server_timing or '').split(','):
+        name, _, duration = entry.strip().partition(';dur=')
+        if name == 'lock_wait':
+            return float(duration) / 1000
+    return None
+
+def send(url, data=None, content_type=None):
+    """(status, seconds, lock wait) of one request; HTTP errors are results, not exceptions."""
+    request = urllib.request.Request(url, data=data, headers={'Content-Type': content_type} if content_type else {})
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=REQUEST_TIMEOUT) as response:
+            response.read()
+            status, headers = response.status, response.headers
+    except urllib.error.HTTPError as e:
+        e.read()
+        status, headers = e.code, e.headers
+    except OSError:
+        return None, time.perf_counter() - start, None  # Connection failures and timeouts
+    return status, time.perf_counter() - start, lock_wait(headers.get('Server-Timing'))
+
+class Workload:
+    """Builds the requests of the mix; upload workbooks are handed out once each, then reused."""
+
+    def __init__(self, base_url, rows, upload_pool, seed):
+        self.base_url = base_url
+        self.workbooks = [generate_workbook(rows, seed=seed + index) for index in range(upload_pool)]
+        self._uploads = 0
+        self._lock = threading.Lock()
+
+    def upload(self):
+        with self._lock:
+            index = self._uploads
+            self._uploads += 1
+        # Past the pool, names stay unique but the bytes repeat and are skipped as duplicates
+        data = self.workbooks[index % len(self.workbooks)]
+        body, content_type = multipart({}, [('excel_files', f'load_{index:05d}.xlsx', data)])
+        return send(f'{self.base_url}/upload', body, content_type)
+
+    def plot(self, rng):
+        form = {'preset-options': rng.choice(PLOT_PRESETS), 'instances_json': '[]'}
+        return send(f'{self.base_url}/plot', urllib.parse.urlencode(form).encode(), 'application/x-www-form-urlencoded')
+
+    def get_tables(self):
+        return send(f'{self.base_url}/get-tables')
+
+    def get_instances(self):
+        return send(f'{self.base_url}/get-instances')
+
+    def run(self, name, rng):
+        if name == 'upload':
+            return self.upload()
+        if name == 'plot':
+            return self.plot(rng)
+        if name == 'get-tables':
+            return self.get_tables()
+        return self.get_instances()
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+def summarise(name, samples, elapsed):
+    """samples: [(status, seconds, lock wait)] of one request type."""
+    latencies = [seconds for _, seconds, _ in samples]
+    waits = [wait for _, _, wait in samples if wait is not None]
+    rejected = sum(1 for status, _, _ in samples if status == 423)
+    errors = sum(1 for status, _, _ in samples if status is None or (status >= 400 and status != 423))
+    return {
+        'request': name,
+        'count': len(samples),
+        'throughput': len(samples) / elapsed,
+        'p50': percentile(latencies, 0.5),
+        'p90': percentile(latencies, 0.9),
+        'p99': percentile(latencies, 0.99),
+        'max': max(latencies),
+        'rejected_423': rejected,
+        'rate_423': rejected / len(samples),
+        'errors': errors,
+        'lock_wait_mean': sum(waits) / len(waits) if waits else None,
+        'lock_wait_p90': percentile(waits, 0.9) if waits else None,
+    }
+
+def run(concurrency, duration, rows, seed_files, upload_pool, mix, seed=0):
+    workdir = tempfile.mkdtemp(prefix='soil-load-')
+    # Must be set before the app is imported: main.py reads LOCKFILE_PATH at import time
+    os.environ['DATABASE_PATH'] = os.path.join(workdir, 'soil_tests.db')
+    os.environ['LOCKFILE_PATH'] = os.path.join(workdir, 'lock.lock')
+
+    from werkzeug.serving import make_server
+    from app import create_app
+
+    app = create_app()
+    client = app.test_client()
+    seed_upload = {'excel_files': [
+        (io.BytesIO(generate_workbook(rows, seed=1000 + index)), f'seed_{index:04d}.xlsx') for index in range(seed_files)
+    ]}
+    response = client.post('/upload', data=seed_upload, content_type='multipart/form-data')
+    if response.status_code != 200:
+        raise RuntimeError(f'Seeding the database failed: {response.status_code} {response.get_json()}')
+
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    server_thread = threading.Thread(target=server.serve_forever, daemon=True)
+    server_thread.start()
+    workload = Workload(f'http://127.0.0.1:{server.server_port}', rows, upload_pool, seed)
+
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    samples = {name: [] for name in names}
+    samples_lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def client_loop(index):
+        rng = random.Random(seed * 1000 + index)
+        while time.perf_counter() < deadline:
+            name = rng.choices(names, weights)[0]
+            result = workload.run(name, rng)
+            with samples_lock:
+                samples[name].append(result)
+
+    start = time.perf_counter()
+    clients = [threading.Thread(target=client_loop, args=(index,)) for index in range(concurrency)]
+    for thread in clients:
+        thread.start()
+    for thread in clients:
+        thread.join()
+    elapsed = time.perf_counter() - start  # Includes the requests still running at the deadline
+    server.shutdown()
+
+    results = [summarise(name, samples[name], elapsed) for name in names if samples[name]]
+    everything = [sample for name in names for sample in samples[name]]
+    if everything:
+        results.append(summarise('total', everything, elapsed))
+    return results
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = {result['request']: result for result in json.load(f)['results']}
+    print(f"\n{'request':<16}{'req/s':>16}{'p90 (s)':>18}{'423 rate':>18}")
+    for result in results:
+        before = baseline.get(result['request'])
+        if before is None:
+            continue
+        print(f"{result['request']:<16}"
+              f"{before['throughput']:>8.2f}{result['throughput']:>8.2f}"
+              f"{before['p90']:>9.3f}{result['p90']:>9.3f}"
+              f"{before['rate_423']:>9.2%}{result['rate_423']:>9.2%}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--preset', choices=sorted(PRESETS), default='small')
+    parser.add_argument('--concurrency', type=int, help='Override the number of concurrent clients')
+    parser.add_argument('--duration', type=float, help='Override the seconds of load')
+    parser.add_argument('--rows', type=int, help='Override the shearing rows per workbook')
+    parser.add_argument('--seed-files', type=int, help='Override the workbooks stored before the run')
+    parser.add_argument('--upload-pool', type=int, help='Override the distinct workbooks /upload sends')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help=f'Weighted request mix (default: {DEFAULT_MIX})')
+    parser.add_argument('--lock-timeout', type=float,
+                        help='Seconds a request waits for the lock before a 423 (LOCK_TIMEOUT, app default 30)')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed of the request mix and workbooks')
+    parser.add_argument('--output', help='Write the JSON results to this file instead of stdout')
+    parser.add_argument('--compare', help='Print throughput, p90 and 423 rate against an earlier JSON result file')
+    parser.add_argument('--verbose', action='store_true', help='Keep the application logs')
+    args = parser.parse_args()
+
+    try:
+        mix = parse_mix(args.mix)
+    except ValueError as e:
+        parser.error(str(e))
+
+    config = dict(PRESETS[args.preset])
+    for option in ('concurrency', 'duration', 'rows', 'seed_files', 'upload_pool'):
+        if getattr(args, option) is not None:
+            config[option] = getattr(args, option)
+    if args.lock_timeout is not None:
+        os.environ['LOCK_TIMEOUT'] = str(args.lock_timeout)  # Read when main.py is imported
+
+    if not args.verbose:
+        logging.disable(logging.WARNING)
+
+    results = run(config['concurrency'], config['duration'], config['rows'], config['seed_files'],
+                  config['upload_pool'], mix, seed=args.seed)
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'preset': args.preset,
+            'mix': mix,
+            'lock_timeout': args.lock_timeout,
+            **config,
+        },
+        'results': results,
+    }
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    if args.compare:
+        compare(results, args.compare)
+
+if __name__ == '__main__':
+    main()
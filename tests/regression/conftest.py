@@ -0,0 +1,39 @@
+# tests/regression/conftest.py
+
+import os
+import tempfile
+
+import pytest
+
+# app.blueprints.main reads these on import, so they are set before the app is imported
+_LOCK_DIR = tempfile.mkdtemp(prefix='regression-lock-')
+os.environ['LOCKFILE_PATH'] = os.path.join(_LOCK_DIR, 'lock.lock')
+os.environ['LOCK_TIMEOUT'] = '0.5'
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+from app import create_app  # noqa: E402
+from app.database import db  # noqa: E402
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """A fresh app on an empty database under tmp_path, without a series store."""
+    monkeypatch.setenv('DATABASE_PATH', str(tmp_path / 'db' / 'soil_tests.db'))
+    monkeypatch.delenv('SERIES_STORE_PATH', raising=False)
+    app = create_app()
+    app.config['TESTING'] = True
+    yield app
+    app.extensions['health'].stop()
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@pytest.fixture
+def lockfile():
+    """Path of the upload lockfile of the default project."""
+    yield os.environ['LOCKFILE_PATH']
+    if os.path.exists(os.environ['LOCKFILE_PATH']):
+        os.remove(os.environ['LOCKFILE_PATH'])
@@ -0,0 +1,83 @@
+# tests/regression/test_add_data.py
+
+import json
+import sqlite3
+
+from app import create_app
+from app.database import (
+    db, DataMigration, Spreadsheet, SpreadsheetRow, get_columns, get_extra_series_names, load_spreadsheet_frame
+)
+
+def custom_input():
+    return Spreadsheet.query.filter_by(spreadsheet_name='custom_input').one()
+
+def test_add_data_appends_rows_and_extra_series(app, client):
+    first = client.post('/add-data', data={'csv_data': 'axial_strain,q,bar,baz\n0.1,1,a,1.5\n0.2,2,b,2.5\n'})
+    second = client.post('/add-data', data={'csv_data': 'axial_strain,q,baz\n0.3,3,3.5\n'})
+    assert first.status_code == 302 and second.status_code == 302
+
+    with app.app_context():
+        spreadsheet = custom_input()
+        rows = SpreadsheetRow.query.filter_by(spreadsheet_id=spreadsheet.spreadsheet_id).order_by(
+            SpreadsheetRow.row_index).all()
+        assert [row.row_index for row in rows] == [0, 1, 2]
+        assert all(row.extra_data is None for row in rows)
+
+        df = load_spreadsheet_frame(spreadsheet, ['axial_strain', 'q', 'baz'])
+        assert df['q'].tolist() == [1.0, 2.0, 3.0]
+        assert df['baz'].tolist() == [1.5, 2.5, 3.5]
+
+        # 'bar' is kept, but only numeric series are offered as plot columns
+        assert get_extra_series_names() == ['bar', 'baz']
+        assert 'baz' in get_columns() and 'bar' not in get_columns()
+
+def test_add_data_is_refused_while_locked(app, client, lockfile):
+    with open(lockfile, 'w') as f:
+        f.write('held by another upload')
+    response = client.post('/add-data', data={'csv_data': 'axial_strain,q\n0.1,1\n'})
+    assert response.status_code == 423
+    assert response.get_json()['success'] is False
+
+    with app.app_context():
+        assert Spreadsheet.query.filter_by(spreadsheet_name='custom_input').first() is None
+
+def test_legacy_extra_data_is_migrated_once(app, client):
+    path = app.config['DEFAULT_DATABASE_PATH']
+    with app.app_context():
+        db.session.query(DataMigration).delete()  # A database from before extra series existed
+        db.session.commit()
+    connection = sqlite3.connect(path)
+    connection.execute("INSERT INTO spreadsheets (spreadsheet_id, spreadsheet_name, encrypted, public, data_version) "
+                       "VALUES (7, 'custom_input', 0, 1, 1)")
+    for i in range(3):
+        # Stored without a row_index, as /add-data did before
+        connection.execute("INSERT INTO spreadsheet_rows (spreadsheet_id, axial_strain, q, extra_data) VALUES (7, ?, ?, ?)",
+                           (str(i / 10), str(i), json.dumps({'custom': i * 2, 'label': f'x{i}'})))
+    connection.commit()
+
+    migrated = create_app()
+    with migrated.app_context():
+        spreadsheet = db.session.get(Spreadsheet, 7)
+        df = load_spreadsheet_frame(spreadsheet, ['q', 'custom'])
+        assert df['row_index'].tolist() == [0, 1, 2]
+        assert df['custom'].tolist() == [0.0, 2.0, 4.0]
+        assert get_columns()[-1:] == ['custom']
+        assert db.session.get(DataMigration, 'extra_series') is not None
+        version = spreadsheet.data_version
+    assert connection.execute("SELECT COUNT(*) FROM spreadsheet_rows WHERE extra_data IS NOT NULL").fetchone() == (0,)
+
+    # Appended rows stay aligned with the migrated series
+    client.post('/add-data', data={'csv_data': 'axial_strain,q,custom\n0.5,5,99\n'})
+    with migrated.app_context():
+        df = load_spreadsheet_frame(db.session.get(Spreadsheet, 7), ['q', 'custom'])
+        assert df['q'].tolist() == [0.0, 1.0, 2.0, 5.0]
+        assert df['custom'].tolist() == [0.0, 2.0, 4.0, 99.0]
+
+    # Later startups do not migrate again
+    connection.execute("UPDATE spreadsheet_rows SET extra_data = ? WHERE row_index = 0", (json.dumps({'custom': -1}),))
+    connection.commit()
+    with create_app().app_context():
+        spreadsheet = db.session.get(Spreadsheet, 7)
+        assert spreadsheet.data_version == version + 1
+        assert -1.0 not in load_spreadsheet_frame(spreadsheet, ['custom'])['custom'].tolist()
+    connection.close()
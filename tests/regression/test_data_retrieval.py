@@ -0,0 +1,39 @@
+# tests/regression/test_data_retrieval.py
+
+import os
+
+import pytest
+
+from app.database import db, Spreadsheet, SpreadsheetRow, load_spreadsheet_frame
+
+@pytest.fixture
+def shuffled(app):
+    """A public spreadsheet whose rows were inserted out of row_index order."""
+    with app.app_context():
+        spreadsheet = Spreadsheet(spreadsheet_name='shuffled', encrypted=False)
+        db.session.add(spreadsheet)
+        db.session.flush()
+        for row_index in (3, 0, 2, 1):
+            db.session.add(SpreadsheetRow(spreadsheet_id=spreadsheet.spreadsheet_id, row_index=row_index,
+                                          axial_strain=str(row_index / 10), q=str(row_index * 10)))
+        db.session.commit()
+        return spreadsheet.spreadsheet_id
+
+def load(app, spreadsheet_id):
+    with app.app_context():
+        return load_spreadsheet_frame(db.session.get(Spreadsheet, spreadsheet_id), ['axial_strain', 'q'])
+
+def test_sqlite_rows_come_back_in_row_order(app, shuffled):
+    df = load(app, shuffled)
+    assert df['row_index'].tolist() == [0, 1, 2, 3]
+    assert df['axial_strain'].tolist() == [0.0, 0.1, 0.2, 0.3]
+    assert df['q'].tolist() == [0.0, 10.0, 20.0, 30.0]
+
+def test_series_store_rows_come_back_in_row_order(app, shuffled, tmp_path, monkeypatch):
+    monkeypatch.setenv('SERIES_STORE_PATH', str(tmp_path / 'series'))
+    df = load(app, shuffled)  # Builds the series file from SQLite, then reads it
+    assert os.listdir(tmp_path / 'series')
+    assert df['row_index'].tolist() == [0, 1, 2, 3]
+    assert df['axial_strain'].tolist() == [0.0, 0.1, 0.2, 0.3]
+    assert df['q'].tolist() == [0.0, 10.0, 20.0, 30.0]
+    assert load(app, shuffled).equals(df)  # Read back from the file
@@ -0,0 +1,41 @@
+# tests/regression/test_ensemble.py
+
+import os
+
+import pytest
+
+def ensemble_form(**extra):
+    return {'preset-options': 'None', 'x_axis': 'p', 'y_axis': 'q', 'table_name[]': 'custom_input',
+            'instances_json': '[]', **extra}
+
+def add_rows(client, csv_data):
+    assert client.post('/add-data', data={'csv_data': csv_data}).status_code == 302
+
+@pytest.fixture
+def ramp(client):
+    """custom_input with p from 0 to 3."""
+    add_rows(client, 'p,q\n0,0\n1,10\n2,20\n3,30\n')
+    return client
+
+def test_ensemble_over_the_data_range(ramp):
+    response = ramp.post('/ensemble', data=ensemble_form())
+    assert response.status_code == 200
+    assert response.get_json()['tests'] == 1
+
+@pytest.mark.parametrize('bounds, message', [
+    ({'x_min': '2', 'x_max': '2'}, 'x_min must be smaller than x_max.'),
+    ({'x_min': '3', 'x_max': '1'}, 'x_min must be smaller than x_max.'),
+    ({'x_min': '5'}, 'The x range [5, 3] is empty; adjust x_min or x_max.'),
+    ({'x_max': '-1'}, 'The x range [0, -1] is empty; adjust x_min or x_max.'),
+])
+def test_ensemble_rejects_an_empty_x_range(ramp, lockfile, bounds, message):
+    response = ramp.post('/ensemble', data=ensemble_form(**bounds))
+    assert response.status_code == 400
+    assert response.get_json() == {'error': message}
+    assert not os.path.exists(lockfile)  # Released on the error path too
+
+def test_ensemble_rejects_data_of_zero_width(client):
+    add_rows(client, 'p,q\n1,10\n1,20\n')
+    response = client.post('/ensemble', data=ensemble_form())
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'The x range [1, 1] is empty; adjust x_min or x_max.'}
@@ -0,0 +1,42 @@
+# tests/regression/test_plot.py
+
+import json
+
+import pytest
+
+NO_DATA = 'No data found for the selected spreadsheets or incorrect password.'
+
+def plot_form(x_axis, y_axis, **extra):
+    return {'preset-options': 'None', 'x_axis': x_axis, 'y_axis': y_axis, 'table_name[]': 'custom_input',
+            'instances_json': '[]', **extra}
+
+def stream_lines(response):
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+@pytest.fixture
+def no_strain(client):
+    """custom_input with q and p values but no axial_strain at all."""
+    client.post('/add-data', data={'csv_data': 'q,p\n1,2\n3,4\n'})
+    return client
+
+def test_plot_skips_spreadsheets_without_x_values(no_strain):
+    response = no_strain.post('/plot', data=plot_form('axial_strain', 'q'))
+    assert response.status_code == 404
+    assert response.get_json() == {
+        'error': NO_DATA,
+        'plot_messages': ["No plottable rows in spreadsheet 'custom_input' (no axial_strain values)."]
+    }
+
+def test_streamed_plot_agrees_with_plot(no_strain):
+    expected = no_strain.post('/plot', data=plot_form('axial_strain', 'q')).get_json()
+    lines = stream_lines(no_strain.post('/plot', data=plot_form('axial_strain', 'q', stream='true')))
+    assert 'layout' in lines[0]
+    assert lines[1] == {'message': expected['plot_messages'][0]}
+    assert lines[-1] == expected
+
+def test_plot_reports_plotted_spreadsheets(no_strain):
+    response = no_strain.post('/plot', data=plot_form('p', 'q'))
+    assert response.status_code == 200
+    assert response.get_json()['plot_messages'] == ["Spreadsheet 'custom_input' plotted successfully."]
+    lines = stream_lines(no_strain.post('/plot', data=plot_form('p', 'q', stream='true')))
+    assert lines[-1] == {'done': True, 'plot_messages': ["Spreadsheet 'custom_input' plotted successfully."]}